@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import random
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# Extensions and lines of the synthetic files of each language
+LANGUAGES = {
+    "python": (".py", ["def {name}(value):", "    return value + {n}", "{name} = {n}"]),
+    "javascript": (
+        ".js",
+        ["function {name}(value) {{", "  return value + {n};", "}}"],
+    ),
+    "go": (".go", ["func {name}(value int) int {{", "\treturn value + {n}", "}}"]),
+    "yaml": (".yaml", ["{name}:", "  value: {n}", "  enabled: true"]),
+    "markdown": (".md", ["## {name}", "", "The value is {n}."]),
+}
+
+PROJECT_ID = 1
+MERGE_REQUEST_IID = 1
+COMMIT_SHA = "0123456789abcdef0123456789abcdef01234567"
+BASE_SHA = "fedcba9876543210fedcba9876543210fedcba98"
+
+
+def make_diffs(
+    files: int = 20,
+    hunks: int = 3,
+    hunk_lines: int = 10,
+    languages: Optional[List[str]] = None,
+    seed: int = 0,
+    context_lines: int = 3,
+) -> List[Dict[str, Any]]:
+    """Generate the diffs of a synthetic merge request in the GitLab format.
+
+    Like GitLab, each hunk has ``context_lines`` unchanged lines before and
+    after the changes.
+    """
+    rng = random.Random(seed)
+    languages = languages or list(LANGUAGES)
+    diffs = []
+    for i in range(files):
+        extension, templates = LANGUAGES[languages[i % len(languages)]]
+        path = f"src/module{i % 10}/file{i}{extension}"
+        diff = ""
+        line_number = 1
+        for _ in range(hunks):
+            removed = [
+                rng.choice(templates).format(name=f"old_{i}_{j}", n=rng.randint(0, 999))
+                for j in range(hunk_lines // 2)
+            ]
+            added = [
+                rng.choice(templates).format(name=f"new_{i}_{j}", n=rng.randint(0, 999))
+                for j in range(hunk_lines - len(removed))
+            ]
+            context = [
+                rng.choice(templates).format(name=f"ctx_{i}_{j}", n=rng.randint(0, 999))
+                for j in range(2 * context_lines)
+            ]
+            diff += (
+                f"@@ -{line_number},{len(removed) + len(context)} "
+                f"+{line_number},{len(added) + len(context)} @@\n"
+                + "".join(f" {line}\n" for line in context[:context_lines])
+                + "".join(f"-{line}\n" for line in removed)
+                + "".join(f"+{line}\n" for line in added)
+                + "".join(f" {line}\n" for line in context[context_lines:])
+            )
+            line_number += hunk_lines * 10
+        diffs.append(
+            {
+                "old_path": path,
+                "new_path": path,
+                "a_mode": "100644",
+                "b_mode": "100644",
+                "new_file": False,
+                "renamed_file": False,
+                "deleted_file": False,
+                "diff": diff,
+            }
+        )
+    return diffs
+
+
+class FakeGitlabServer:
+    """GitLab API stand-in serving one synthetic merge request.
+
+    Only the endpoints used by the review are implemented: the project, the
+    merge request with its diffs and commits, the diffs of a commit, the
+    comparison of commits, and the notes. Every request is counted in
+    ``api_calls``.
+    """
+
+    def __init__(self, diffs: List[Dict[str, Any]], per_page_limit: int = 50):
+        self.diffs = diffs
+        self.per_page_limit = per_page_limit
+        self.api_calls = 0
+        self.notes: List[Dict[str, Any]] = []
+        # Commits of the merge request, the latest first
+        self.commits = [COMMIT_SHA]
+        # The diffs endpoint of merge requests is missing before GitLab 15.7
+        self.merge_request_diffs_api = True
+        # (from, to) of every comparison of commits
+        self.comparisons: List[Tuple[str, str]] = []
+        # User of the token, who writes the notes
+        self.user = {"id": 1, "username": "coderev"}
+        self.merge_request = {
+            "id": 100,
+            "iid": MERGE_REQUEST_IID,
+            "project_id": PROJECT_ID,
+            "title": "Synthetic merge request",
+            "state": "opened",
+            "description": "Benchmark",
+            "author": {"name": "benchmark"},
+            "sha": COMMIT_SHA,
+            "diff_refs": {
+                "base_sha": BASE_SHA,
+                "head_sha": COMMIT_SHA,
+                "start_sha": BASE_SHA,
+            },
+        }
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeGitlabServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self) -> type:
+        server = self
+        prefix = f"/api/v4/projects/{PROJECT_ID}"
+        merge_request_path = f"{prefix}/merge_requests/{MERGE_REQUEST_IID}"
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _send(self, body: Any, headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body).encode("utf_8")
+                self.send_response(200 if body is not None else 404)
+                self.send_header("Content-Type", "application/json")
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _read(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length", 0))
+                data = self.rfile.read(length) if length else b""
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    return json.loads(data or b"{}")
+                return {k: v[0] for k, v in parse_qs(data.decode("utf_8")).items()}
+
+            def _paginate(self, items: List[Any], query: Dict[str, List[str]]):
+                page = int(query.get("page", ["1"])[0])
+                per_page = min(
+                    int(query.get("per_page", ["20"])[0]), server.per_page_limit
+                )
+                start = (page - 1) * per_page
+                headers = {"X-Page": str(page), "X-Total": str(len(items))}
+                if start + per_page < len(items):
+                    next_query = f"page={page + 1}&per_page={per_page}"
+                    next_url = f"{server.url}{urlparse(self.path).path}?{next_query}"
+                    headers["X-Next-Page"] = str(page + 1)
+                    headers["Link"] = f'<{next_url}>; rel="next"'
+                else:
+                    headers["X-Next-Page"] = ""
+                self._send(items[start : start + per_page], headers)
+
+            def do_GET(self) -> None:
+                with server._lock:
+                    server.api_calls += 1
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path == "/api/v4/user":
+                    return self._send(server.user)
+                if url.path == prefix:
+                    return self._send({"id": PROJECT_ID, "path": "benchmark"})
+                if url.path == merge_request_path:
+                    return self._send(server.merge_request)
+                if url.path == f"{merge_request_path}/diffs":
+                    if not server.merge_request_diffs_api:
+                        return self._send(None)
+                    return self._paginate(server.diffs, query)
+                if url.path == f"{merge_request_path}/commits":
+                    commits = [{"id": sha} for sha in server.commits]
+                    return self._paginate(commits, query)
+                if url.path == f"{merge_request_path}/notes":
+                    return self._paginate(server.notes[::-1], query)
+                if re.fullmatch(f"{prefix}/repository/commits/[^/]+", url.path):
+                    return self._send({"id": COMMIT_SHA, "short_id": COMMIT_SHA[:8]})
+                if re.fullmatch(
+                    f"{prefix}/repository/commits/[^/]+/merge_requests", url.path
+                ):
+                    # Only the open merge requests are requested
+                    opened = server.merge_request["state"] == "opened"
+                    return self._send([server.merge_request] if opened else [])
+                if re.fullmatch(f"{prefix}/repository/commits/[^/]+/diff", url.path):
+                    return self._paginate(server.diffs, query)
+                if url.path == f"{prefix}/repository/compare":
+                    with server._lock:
+                        server.comparisons.append((query["from"][0], query["to"][0]))
+                    return self._send({"diffs": server.diffs})
+                self._send(None)
+
+            def do_POST(self) -> None:
+                with server._lock:
+                    server.api_calls += 1
+                    if urlparse(self.path).path != f"{merge_request_path}/notes":
+                        return self._send(None)
+                    note = {
+                        "id": len(server.notes) + 1,
+                        "author": server.user,
+                        **self._read(),
+                    }
+                    server.notes.append(note)
+                self._send(note)
+
+            def do_PUT(self) -> None:
+                with server._lock:
+                    server.api_calls += 1
+                    path = urlparse(self.path).path
+                    body = self._read()
+                    if path == merge_request_path:
+                        server.merge_request.update(body)
+                        return self._send(server.merge_request)
+                    match = re.fullmatch(f"{merge_request_path}/notes/(\\d+)", path)
+                    if match is None or int(match.group(1)) > len(server.notes):
+                        return self._send(None)
+                    note = server.notes[int(match.group(1)) - 1]
+                    note.update(body)
+                self._send(note)
+
+        return Handler
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_motex.utils.token_utils import estimate_tokens
+
+
+class FakeOllamaServer:
+    """Ollama API stand-in with a configurable speed.
+
+    Each chat response streams ``response_tokens`` tokens with
+    ``token_latency`` seconds per token. At most ``max_concurrency``
+    requests are generated at once, and the others wait like the queue of
+    Ollama. Every chat and embedding request is counted.
+
+    Like the slots of Ollama, the last ``max_concurrency`` prompts are
+    cached, and only the tokens after the longest cached prefix are
+    evaluated. A request changing the ``num_ctx`` of a model reloads it,
+    and drops its cache.
+    """
+
+    def __init__(
+        self,
+        token_latency: float = 0.001,
+        response_tokens: int = 50,
+        max_concurrency: int = 4,
+        prompt_token_latency: float = 0.0,
+    ):
+        self.token_latency = token_latency
+        self.response_tokens = response_tokens
+        self.prompt_token_latency = prompt_token_latency
+        self.llm_calls = 0
+        self.embedding_calls = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.model_reloads = 0
+        self.models: Dict[str, int] = {}
+        self.max_cached_prompts = max_concurrency
+        self._cached_prompts: List[Tuple[str, str]] = []
+        self._num_ctx: Dict[str, Optional[int]] = {}
+        self._semaphore = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def get_cached_tokens(self, model: str, num_ctx: Optional[int], prompt: str) -> int:
+        """Get the tokens of the prompt found in the cache, and cache it.
+
+        Like the slots of llama.cpp, the prompt sharing at least half of a
+        cached prompt takes its slot, and another prompt takes the least
+        recently used slot.
+        """
+        with self._lock:
+            if model in self._num_ctx and self._num_ctx[model] != num_ctx:
+                self.model_reloads += 1
+                self._cached_prompts = [
+                    cached for cached in self._cached_prompts if cached[0] != model
+                ]
+            self._num_ctx[model] = num_ctx
+            prefix, slot = "", None
+            for i, (cached_model, cached) in enumerate(self._cached_prompts):
+                common = os.path.commonprefix([prompt, cached])
+                if cached_model == model and len(common) > len(prefix):
+                    prefix, slot = common, i
+            if slot is not None and 2 * len(prefix) >= len(
+                self._cached_prompts[slot][1]
+            ):
+                del self._cached_prompts[slot]
+            self._cached_prompts.append((model, prompt))
+            del self._cached_prompts[: -self.max_cached_prompts]
+        return estimate_tokens(prefix)
+
+    def touch_cached_prompt(self, prompt: str) -> None:
+        """Mark the slot of the prompt as used when its response ends."""
+        with self._lock:
+            for i, cached in enumerate(self._cached_prompts):
+                if cached[1] is prompt:
+                    self._cached_prompts.append(self._cached_prompts.pop(i))
+                    return
+
+    def get_response(self, request: Dict[str, Any]) -> str:
+        prompt = "\n".join(message["content"] for message in request["messages"])
+        if request.get("format") != "json":
+            return " ".join(["レビュー"] * self.response_tokens)
+        # Packed files are answered with the paths found in the prompt
+        file_paths = re.findall(r"^### ファイル: (.+)$", prompt, flags=re.MULTILINE)
+        if file_paths:
+            return json.dumps(
+                {
+                    "files": [
+                        {"file_path": path, "summary": "要約", "review": "レビュー"}
+                        for path in file_paths
+                    ]
+                },
+                ensure_ascii=False,
+            )
+        return json.dumps({"summary": "要約", "review": "レビュー"}, ensure_ascii=False)
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _read(self) -> Dict[str, Any]:
+                length = int(self.headers.get("Content-Length", 0))
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def _send_json(self, body: Any) -> None:
+                data = json.dumps(body).encode("utf_8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_chunk(self, body: Dict[str, Any]) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf_8") + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_POST(self) -> None:
+                request = self._read()
+                if self.path in ("/api/embeddings", "/api/embed"):
+                    return self._embed(request)
+                # Loading a model without a prompt
+                if self.path == "/api/generate" and not request.get("prompt"):
+                    return self._send_json(
+                        {
+                            "model": request.get("model", ""),
+                            "response": "",
+                            "done": True,
+                        }
+                    )
+                if self.path != "/api/chat":
+                    self.send_response(404)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                prompt = "\n".join(m["content"] for m in request["messages"])
+                prompt_tokens = estimate_tokens(prompt)
+                model = request.get("model", "")
+                with server._lock:
+                    server.llm_calls += 1
+                    server.prompt_tokens += prompt_tokens
+                    server.models[model] = server.models.get(model, 0) + 1
+
+                with server._semaphore:
+                    started_at = time.monotonic()
+                    num_ctx = (request.get("options") or {}).get("num_ctx")
+                    cached_tokens = server.get_cached_tokens(model, num_ctx, prompt)
+                    with server._lock:
+                        server.cached_tokens += cached_tokens
+                    # Only the tokens after the cached prefix are evaluated
+                    prompt_tokens -= cached_tokens
+                    time.sleep(prompt_tokens * server.prompt_token_latency)
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    tokens = self._tokenize(server.get_response(request))
+                    for token in tokens:
+                        time.sleep(server.token_latency)
+                        self._send_chunk(
+                            {
+                                "model": model,
+                                "message": {"role": "assistant", "content": token},
+                                "done": False,
+                            }
+                        )
+                    duration = int((time.monotonic() - started_at) * 1e9)
+                    self._send_chunk(
+                        {
+                            "model": model,
+                            "message": {"role": "assistant", "content": ""},
+                            "done": True,
+                            "total_duration": duration,
+                            "prompt_eval_count": prompt_tokens,
+                            "eval_count": len(tokens),
+                            "eval_duration": duration,
+                        }
+                    )
+                    self.wfile.write(b"0\r\n\r\n")
+                    server.touch_cached_prompt(prompt)
+
+            def _embed(self, request: Dict[str, Any]) -> None:
+                inputs = request.get("input", request.get("prompt", ""))
+                texts = inputs if isinstance(inputs, list) else [inputs]
+                with server._lock:
+                    server.embedding_calls += 1
+                embeddings = [self._vector(text) for text in texts]
+                if self.path == "/api/embed":
+                    return self._send_json({"embeddings": embeddings})
+                self._send_json({"embedding": embeddings[0]})
+
+            @staticmethod
+            def _vector(text: str) -> List[float]:
+                digest = hashlib.sha256(text.encode("utf_8")).digest()
+                return [byte / 255 for byte in digest] * 2
+
+            @staticmethod
+            def _tokenize(text: str) -> List[str]:
+                # Split the text after spaces, and JSON into a few pieces
+                if not text.startswith("{"):
+                    return [part + " " for part in text.split(" ")]
+                size = max(1, len(text) // 8)
+                return [text[i : i + size] for i in range(0, len(text), size)]
+
+        return Handler
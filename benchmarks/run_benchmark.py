@@ -0,0 +1,199 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.fake_gitlab import (
+    COMMIT_SHA,
+    LANGUAGES,
+    MERGE_REQUEST_IID,
+    PROJECT_ID,
+    FakeGitlabServer,
+    make_diffs,
+)
+from benchmarks.fake_ollama import FakeOllamaServer
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_benchmark(
+    args: argparse.Namespace, extra_env: Dict[str, str]
+) -> Dict[str, Any]:
+    """Run the review against the fake servers, and return its measurements."""
+    diffs = make_diffs(
+        args.files,
+        args.hunks,
+        args.hunk_lines,
+        args.languages.split(","),
+        args.seed,
+        args.context_lines,
+    )
+    gitlab_server = FakeGitlabServer(diffs, args.page_size).start()
+    ollama_servers = [
+        FakeOllamaServer(
+            args.token_latency,
+            args.response_tokens,
+            args.ollama_concurrency,
+            args.prompt_token_latency,
+        ).start()
+        for _ in range(args.ollama_hosts)
+    ]
+    env = os.environ | {
+        "PYTHONPATH": os.pathsep.join(
+            filter(None, [ROOT_DIR, os.getenv("PYTHONPATH")])
+        ),
+        "CI_SERVER_URL": gitlab_server.url,
+        "CI_PROJECT_ID": str(PROJECT_ID),
+        "CI_MERGE_REQUEST_IID": str(MERGE_REQUEST_IID),
+        "CI_COMMIT_SHA": COMMIT_SHA,
+        "GITLAB_PERSONAL_ACCESS_TOKEN": "benchmark",
+        "OLLAMA_URL": ",".join(server.url for server in ollama_servers),
+        # Every run calls the LLMs
+        "CODEREV_CACHE_DIR": "",
+        "CODEREV_LOCAL_DIFF": "false",
+    }
+    env |= extra_env
+
+    # The review runs in a child process, so that its memory is measured alone
+    command = [sys.executable, "-m", "langchain_motex.cli", f"review-{args.mode}"]
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            started_at = time.perf_counter()
+            process = subprocess.run(
+                command, cwd=work_dir, env=env, capture_output=True, text=True
+            )
+            wall_time = time.perf_counter() - started_at
+    finally:
+        gitlab_server.stop()
+        for server in ollama_servers:
+            server.stop()
+    if process.returncode != 0:
+        print(process.stdout + process.stderr, file=sys.stderr)
+        raise RuntimeError(f"The review failed with {process.returncode}")
+    max_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    prefill_tokens = sum(
+        server.prompt_tokens - server.cached_tokens for server in ollama_servers
+    )
+
+    return {
+        "mode": args.mode,
+        "files": args.files,
+        "hunks": args.hunks,
+        "hunk_lines": args.hunk_lines,
+        "wall_time": round(wall_time, 3),
+        "api_calls": gitlab_server.api_calls,
+        "llm_calls": sum(server.llm_calls for server in ollama_servers),
+        "host_llm_calls": [server.llm_calls for server in ollama_servers],
+        "embedding_calls": sum(server.embedding_calls for server in ollama_servers),
+        "prompt_tokens": sum(server.prompt_tokens for server in ollama_servers),
+        # Prompt tokens evaluated by the models, after the cached prefixes
+        "prefill_tokens": prefill_tokens,
+        "prefill_tokens_per_file": round(prefill_tokens / max(1, args.files), 1),
+        "prefill_seconds_per_file": round(
+            prefill_tokens * args.prompt_token_latency / max(1, args.files), 3
+        ),
+        "cached_prompt_tokens": sum(server.cached_tokens for server in ollama_servers),
+        "model_reloads": sum(server.model_reloads for server in ollama_servers),
+        "models": {
+            model: sum(server.models.get(model, 0) for server in ollama_servers)
+            for model in {m for server in ollama_servers for m in server.models}
+        },
+        # Kilobytes on Linux
+        "peak_memory_mb": round(max_rss / 1024, 1),
+        "notes": len(gitlab_server.notes),
+    }
+
+
+def check_limits(result: Dict[str, Any], args: argparse.Namespace) -> List[str]:
+    limits = {
+        "wall_time": args.max_wall_time,
+        "api_calls": args.max_api_calls,
+        "llm_calls": args.max_llm_calls,
+        "peak_memory_mb": args.max_memory_mb,
+    }
+    return [
+        f"{key}: {result[key]} > {limit}"
+        for key, limit in limits.items()
+        if limit is not None and result[key] > limit
+    ]
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        description="Benchmark the review with local GitLab and Ollama stand-ins."
+    )
+    parser.add_argument("--mode", choices=["mr", "commit"], default="mr")
+    parser.add_argument("--files", type=int, default=20)
+    parser.add_argument("--hunks", type=int, default=3, help="hunks per file")
+    parser.add_argument("--hunk-lines", type=int, default=10)
+    parser.add_argument(
+        "--context-lines", type=int, default=3, help="unchanged lines around hunks"
+    )
+    parser.add_argument(
+        "--languages",
+        default=",".join(LANGUAGES),
+        help="comma separated languages of the files: " + ", ".join(LANGUAGES),
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--page-size", type=int, default=50, help="maximum items per API page"
+    )
+    parser.add_argument(
+        "--token-latency", type=float, default=0.005, help="seconds per token"
+    )
+    parser.add_argument(
+        "--prompt-token-latency",
+        type=float,
+        default=0.0,
+        help="seconds per prompt token before the first token",
+    )
+    parser.add_argument("--response-tokens", type=int, default=50)
+    parser.add_argument(
+        "--ollama-concurrency",
+        type=int,
+        default=4,
+        help="requests generated at once by each fake Ollama",
+    )
+    parser.add_argument(
+        "--ollama-hosts", type=int, default=1, help="number of fake Ollama hosts"
+    )
+    parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="environment variable of the review, e.g. CODEREV_PACK_TOKENS=4000",
+    )
+    parser.add_argument("--output", help="JSON file to write the results")
+    parser.add_argument("--max-wall-time", type=float)
+    parser.add_argument("--max-api-calls", type=int)
+    parser.add_argument("--max-llm-calls", type=int)
+    parser.add_argument("--max-memory-mb", type=float)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = get_parser().parse_args(argv)
+    extra_env = dict(item.split("=", 1) for item in args.env)
+    result = run_benchmark(args, extra_env) | {"env": extra_env}
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, mode="w", encoding="utf_8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+
+    errors = check_limits(result, args)
+    for error in errors:
+        print("Regression: " + error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
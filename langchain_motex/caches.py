@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from langchain_core.caches import RETURN_VAL_TYPE, BaseCache
+from langchain_core.load import dumps, loads
+
+
+class SQLiteLRUCache(BaseCache):
+    """Disk-backed LLM cache with size and age eviction.
+
+    Entries are keyed on the SHA-256 of the prompt and of the LLM string.
+    The prompt contains the rendered template together with the diff, and
+    the LLM string contains the model name and its parameters, so a cached
+    output is reused only for exactly the same request.
+    """
+
+    def __init__(
+        self,
+        database_path: str = ".cache/coderev/llm_cache.db",
+        max_entries: int = 10000,
+        max_age: float = 30 * 24 * 60 * 60,
+    ):
+        self.database_path = database_path
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+
+        dirname = os.path.dirname(database_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                prompt_hash TEXT NOT NULL,
+                llm_hash TEXT NOT NULL,
+                return_val TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (prompt_hash, llm_hash)
+            )
+            """
+        )
+        self._connection.commit()
+        # Entries written since the last count, which is refreshed by evict()
+        self._entries = 0
+        self.evict()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[RETURN_VAL_TYPE]:
+        key = (self._hash(prompt), self._hash(llm_string))
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT return_val, created_at FROM llm_cache"
+                " WHERE prompt_hash = ? AND llm_hash = ?",
+                key,
+            ).fetchone()
+            if row is None or time.time() - row[1] > self.max_age:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE llm_cache SET accessed_at = ?"
+                " WHERE prompt_hash = ? AND llm_hash = ?",
+                (time.time(), *key),
+            )
+            self._connection.commit()
+            self.hits += 1
+        return loads(row[0])
+
+    def update(self, prompt: str, llm_string: str, return_val: RETURN_VAL_TYPE) -> None:
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?, ?)",
+                (
+                    self._hash(prompt),
+                    self._hash(llm_string),
+                    dumps(return_val),
+                    now,
+                    now,
+                ),
+            )
+            self._connection.commit()
+            # A replaced entry is counted too, so this evicts a bit early
+            self._entries += 1
+            over_limit = self._entries > self.max_entries
+        # Scanning the table on every write would slow down the reviews
+        if over_limit:
+            self.evict()
+
+    def evict(self) -> None:
+        """Drop expired entries, then the least recently used ones."""
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (time.time() - self.max_age,),
+            )
+            self._connection.execute(
+                """
+                DELETE FROM llm_cache WHERE rowid NOT IN (
+                    SELECT rowid FROM llm_cache
+                    ORDER BY accessed_at DESC LIMIT ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            self._connection.commit()
+            self._entries = self._connection.execute(
+                "SELECT COUNT(*) FROM llm_cache"
+            ).fetchone()[0]
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM llm_cache")
+            self._connection.commit()
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+
+def get_model_name(kwargs: Dict[str, Any]) -> str:
+    # The keyword arguments of on_llm_start and on_chat_model_start
+    return kwargs.get("invocation_params", {}).get("model") or (
+        kwargs.get("metadata") or {}
+    ).get("ls_model_name", "")
+
+
+class ModelLatencyCallbackHandler(BaseCallbackHandler):
+    """Record the number of calls and the latency of each model.
+
+    Give it as ``callbacks`` of the models, so that every call is recorded
+    wherever the model is used. Calls served from the LLM cache are
+    counted as well, with their short latency.
+    """
+
+    def __init__(self) -> None:
+        self.calls: Dict[str, int] = {}
+        self.seconds: Dict[str, float] = {}
+        self.errors: Dict[str, int] = {}
+        self._runs: Dict[UUID, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        with self._lock:
+            self._runs[run_id] = (get_model_name(kwargs), time.monotonic())
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+        self._start(kwargs["run_id"], kwargs)
+
+    def on_chat_model_start(
+        self, serialized: Any, messages: Any, **kwargs: Any
+    ) -> None:
+        self._start(kwargs["run_id"], kwargs)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        with self._lock:
+            if kwargs["run_id"] not in self._runs:
+                return
+            model, started_at = self._runs.pop(kwargs["run_id"])
+            self.calls[model] = self.calls.get(model, 0) + 1
+            self.seconds[model] = (
+                self.seconds.get(model, 0.0) + time.monotonic() - started_at
+            )
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        with self._lock:
+            if kwargs["run_id"] not in self._runs:
+                return
+            model, _ = self._runs.pop(kwargs["run_id"])
+            self.errors[model] = self.errors.get(model, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                model: {
+                    "calls": self.calls.get(model, 0),
+                    "seconds": round(self.seconds.get(model, 0.0), 3),
+                    "mean_seconds": round(
+                        self.seconds.get(model, 0.0) / max(1, self.calls.get(model, 0)),
+                        3,
+                    ),
+                    "errors": self.errors.get(model, 0),
+                }
+                for model in {**self.calls, **self.errors}
+            }
+
+
+class OllamaMetricsCallbackHandler(BaseCallbackHandler):
+    """Record the timing and the token counts of every LLM call.
+
+    The stage and the file of a call are taken from the ``stage`` and
+    ``file_path`` keys of the metadata of the run, which are given with the
+    config of the chains. The token counts and the generation time come
+    from the final response of Ollama, so calls served from the LLM cache
+    report the counts of the original call.
+    """
+
+    def __init__(self) -> None:
+        self.records: List[Dict[str, Any]] = []
+        self.retries: Dict[str, int] = {}
+        self._runs: Dict[UUID, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id: UUID, kwargs: Dict[str, Any]) -> None:
+        metadata = kwargs.get("metadata") or {}
+        with self._lock:
+            self._runs[run_id] = {
+                "stage": metadata.get("stage", ""),
+                "file_path": metadata.get("file_path"),
+                "model": get_model_name(kwargs),
+                "started_at": time.monotonic(),
+            }
+
+    def on_llm_start(self, serialized: Any, prompts: Any, **kwargs: Any) -> None:
+        self._start(kwargs["run_id"], kwargs)
+
+    def on_chat_model_start(
+        self, serialized: Any, messages: Any, **kwargs: Any
+    ) -> None:
+        self._start(kwargs["run_id"], kwargs)
+
+    def _end(self, run_id: UUID, **values: Any) -> None:
+        with self._lock:
+            if run_id not in self._runs:
+                return
+            record = self._runs.pop(run_id)
+            record["seconds"] = round(time.monotonic() - record.pop("started_at"), 3)
+            self.records.append(record | values)
+
+    def on_llm_end(self, response: LLMResult, **kwargs: Any) -> None:
+        info: Dict[str, Any] = {}
+        if response.generations and response.generations[0]:
+            info = response.generations[0][0].generation_info or {}
+        eval_count = info.get("eval_count")
+        eval_duration = info.get("eval_duration")
+        tokens_per_second: Optional[float] = None
+        if eval_count and eval_duration:
+            tokens_per_second = round(eval_count / (eval_duration / 1e9), 1)
+        self._end(
+            kwargs["run_id"],
+            prompt_eval_count=info.get("prompt_eval_count"),
+            prompt_eval_duration=info.get("prompt_eval_duration"),
+            eval_count=eval_count,
+            eval_duration=eval_duration,
+            tokens_per_second=tokens_per_second,
+        )
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self._end(kwargs["run_id"], error=f"{type(error).__name__}: {error}")
+
+    def on_retry(self, retry_state: Any, **kwargs: Any) -> None:
+        # The callback managers do not give the metadata to on_retry
+        with self._lock:
+            run = self._runs.get(kwargs["run_id"])
+            stage = run["stage"] if run is not None else ""
+            self.retries[stage] = self.retries.get(stage, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Totals of the calls of each stage."""
+        stages: Dict[str, Dict[str, Any]] = {}
+        with self._lock:
+            for record in self.records:
+                stats = stages.setdefault(
+                    record["stage"],
+                    {
+                        "calls": 0,
+                        "errors": 0,
+                        "retries": self.retries.get(record["stage"], 0),
+                        "seconds": 0.0,
+                        "prompt_eval_count": 0,
+                        "eval_count": 0,
+                        "eval_duration": 0,
+                    },
+                )
+                stats["calls"] += 1
+                stats["errors"] += "error" in record
+                stats["seconds"] += record["seconds"]
+                for key in ("prompt_eval_count", "eval_count", "eval_duration"):
+                    stats[key] += record.get(key) or 0
+        for stats in stages.values():
+            stats["seconds"] = round(stats["seconds"], 3)
+            stats["tokens_per_second"] = (
+                round(stats["eval_count"] / (stats["eval_duration"] / 1e9), 1)
+                if stats["eval_duration"]
+                else None
+            )
+        return stages
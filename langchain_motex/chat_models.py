@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+import requests
+from langchain_community.chat_models.ollama import ChatOllama
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGenerationChunk
+from tenacity import RetryCallState
+
+
+class OllamaEndpointPool:
+    """Ollama hosts shared by the chat models, with their load and health.
+
+    ``acquire`` returns the healthy host with the fewest requests in flight,
+    then the lowest mean latency. A host failing a request is not chosen
+    again for ``cooldown`` seconds, unless every host has failed.
+
+    Requests with the same ``affinity`` key go to the same healthy host, so
+    that prompts sharing a prefix reuse the KV cache of that host.
+    """
+
+    # Number of the affinity keys remembered
+    max_affinities = 1024
+
+    def __init__(self, base_urls: List[str], cooldown: float = 60):
+        if not base_urls:
+            raise ValueError("No Ollama host is given")
+        self.base_urls = [url.rstrip("/") for url in base_urls]
+        self.cooldown = cooldown
+        self.in_flight = {url: 0 for url in self.base_urls}
+        self.calls = {url: 0 for url in self.base_urls}
+        self.errors = {url: 0 for url in self.base_urls}
+        self.latency: Dict[str, Optional[float]] = {url: None for url in self.base_urls}
+        self.failed_at: Dict[str, float] = {}
+        self.affinities: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def is_healthy(self, url: str) -> bool:
+        failed_at = self.failed_at.get(url)
+        return failed_at is None or time.monotonic() - failed_at > self.cooldown
+
+    def acquire(
+        self, exclude: Optional[List[str]] = None, affinity: Optional[str] = None
+    ) -> Optional[str]:
+        """Take the host for a request, or None if every host is excluded."""
+        with self._lock:
+            urls = [url for url in self.base_urls if url not in (exclude or [])]
+            if not urls:
+                return None
+            url = self.affinities.get(affinity) if affinity is not None else None
+            if url not in urls or not self.is_healthy(url):
+                # Hosts in the cooldown are tried last
+                url = min(
+                    urls,
+                    key=lambda url: (
+                        not self.is_healthy(url),
+                        self.in_flight[url],
+                        self.latency[url] or 0.0,
+                    ),
+                )
+            if affinity is not None:
+                self.affinities[affinity] = url
+                self.affinities.move_to_end(affinity)
+                if len(self.affinities) > self.max_affinities:
+                    self.affinities.popitem(last=False)
+            self.in_flight[url] += 1
+            return url
+
+    def release(self, url: str, seconds: float, error: bool = False) -> None:
+        with self._lock:
+            self.in_flight[url] -= 1
+            if error:
+                self.errors[url] += 1
+                self.failed_at[url] = time.monotonic()
+                return
+            self.calls[url] += 1
+            self.failed_at.pop(url, None)
+            # Exponential moving average of the latency
+            latency = self.latency[url]
+            self.latency[url] = (
+                seconds if latency is None else 0.8 * latency + 0.2 * seconds
+            )
+
+    def warmup(self, models: List[str], keep_alive: str, timeout: float = 300) -> None:
+        """Load the models on every host, and keep them for ``keep_alive``."""
+
+        def _warmup(url: str, model: str) -> None:
+            started_at = time.monotonic()
+            try:
+                # A request without a prompt only loads the model
+                response = requests.post(
+                    f"{url}/api/generate",
+                    json={"model": model, "keep_alive": keep_alive},
+                    timeout=timeout,
+                )
+                response.raise_for_status()
+            except requests.RequestException as e:
+                print(f"Ollama: failed to load {model} on {url}: {e}")
+                with self._lock:
+                    self.errors[url] += 1
+                    self.failed_at[url] = time.monotonic()
+                return
+            elapsed = time.monotonic() - started_at
+            print(f"Ollama: loaded {model} on {url} in {elapsed:.1f}s")
+
+        with ThreadPoolExecutor(
+            max_workers=len(self.base_urls) * len(models)
+        ) as executor:
+            for url in self.base_urls:
+                for model in models:
+                    executor.submit(_warmup, url, model)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            return {
+                url: {
+                    "calls": self.calls[url],
+                    "errors": self.errors[url],
+                    "mean_seconds": (
+                        round(self.latency[url], 3)
+                        if self.latency[url] is not None
+                        else None
+                    ),
+                }
+                for url in self.base_urls
+            }
+
+
+def get_retry_state(attempts: int, error: Exception) -> RetryCallState:
+    # State of the callbacks on_retry, after the failed attempts
+    retry_state = RetryCallState(None, None, (), {})
+    retry_state.attempt_number = attempts
+    retry_state.set_exception((type(error), error, error.__traceback__))
+    return retry_state
+
+
+class PooledChatOllama(ChatOllama):
+    """ChatOllama sending each request to a host of an ``OllamaEndpointPool``.
+
+    A request failing before its first token, by a timeout, a refused
+    connection or an error status, is sent again to another host. Errors
+    in the middle of a response are raised, since the tokens have already
+    been passed to the callbacks. ``base_url`` is not used.
+
+    With ``affinity_chars``, the prompts with the same file diff are sent to
+    the same host, e.g. the summary and the review of a file. Only the prompt
+    up to the end of its first code block, the diff of the prefixed
+    templates, is compared, since the instructions after it differ.
+
+    Each request sent again is reported to ``on_retry`` of the callbacks.
+    """
+
+    pool: OllamaEndpointPool
+    affinity_chars: int = 0
+
+    # ChatOllama does not give the run manager to _create_chat_stream, so it
+    # is passed in the keyword arguments. The stream methods of the chat
+    # models have no run manager, so their retries are not reported.
+    def _chat_stream_with_aggregation(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[CallbackManagerForLLMRun] = None,
+        verbose: bool = False,
+        **kwargs: Any,
+    ) -> ChatGenerationChunk:
+        return super()._chat_stream_with_aggregation(
+            messages,
+            stop,
+            run_manager,
+            verbose,
+            retry_run_manager=run_manager,
+            **kwargs,
+        )
+
+    async def _achat_stream_with_aggregation(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        verbose: bool = False,
+        **kwargs: Any,
+    ) -> ChatGenerationChunk:
+        return await super()._achat_stream_with_aggregation(
+            messages,
+            stop,
+            run_manager,
+            verbose,
+            retry_run_manager=run_manager,
+            **kwargs,
+        )
+
+    def _get_affinity(self, messages: List[BaseMessage]) -> Optional[str]:
+        if self.affinity_chars <= 0 or not messages:
+            return None
+        content = str(messages[0].content)
+        # The diff lines start with a space, + or -, so the first code block
+        # ends at the first fence at the start of a line after it opens
+        start = content.find("```")
+        end = content.find("\n```", start + 3) if start >= 0 else -1
+        if end >= 0:
+            content = content[: end + 4]
+        prefix = f"{self.model}\n{content}"[: self.affinity_chars]
+        return hashlib.sha256(prefix.encode("utf_8")).hexdigest()
+
+    def _create_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> Iterator[str]:
+        payload = {
+            "model": self.model,
+            "messages": self._convert_messages_to_ollama_messages(messages),
+        }
+        affinity = self._get_affinity(messages)
+        run_manager = kwargs.pop("retry_run_manager", None)
+        tried: List[str] = []
+        error: Exception = ValueError("No Ollama host is available")
+        while True:
+            url = self.pool.acquire(exclude=tried, affinity=affinity)
+            if url is None:
+                raise error
+            if tried and run_manager is not None:
+                run_manager.on_retry(get_retry_state(len(tried), error))
+            tried.append(url)
+            started_at = time.monotonic()
+            try:
+                lines = self._create_stream(
+                    payload=payload, stop=stop, api_url=f"{url}/api/chat", **kwargs
+                )
+                first_line = next(lines, None)
+            except Exception as e:
+                self.pool.release(url, time.monotonic() - started_at, error=True)
+                error = e
+                continue
+            break
+
+        try:
+            if first_line is not None:
+                yield first_line
+            yield from lines
+        except GeneratorExit:
+            self.pool.release(url, time.monotonic() - started_at)
+            raise
+        except BaseException:
+            self.pool.release(url, time.monotonic() - started_at, error=True)
+            raise
+        self.pool.release(url, time.monotonic() - started_at)
+
+    async def _acreate_chat_stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[str]:
+        payload = {
+            "model": self.model,
+            "messages": self._convert_messages_to_ollama_messages(messages),
+        }
+        affinity = self._get_affinity(messages)
+        run_manager = kwargs.pop("retry_run_manager", None)
+        tried: List[str] = []
+        error: Exception = ValueError("No Ollama host is available")
+        while True:
+            url = self.pool.acquire(exclude=tried, affinity=affinity)
+            if url is None:
+                raise error
+            if tried and run_manager is not None:
+                await run_manager.on_retry(get_retry_state(len(tried), error))
+            tried.append(url)
+            started_at = time.monotonic()
+            # The request is sent when the first line is awaited
+            lines = self._acreate_stream(
+                payload=payload, stop=stop, api_url=f"{url}/api/chat", **kwargs
+            )
+            try:
+                first_line = await anext(lines, None)
+            except Exception as e:
+                self.pool.release(url, time.monotonic() - started_at, error=True)
+                error = e
+                continue
+            break
+
+        try:
+            if first_line is not None:
+                yield first_line
+            async for line in lines:
+                yield line
+        except GeneratorExit:
+            self.pool.release(url, time.monotonic() - started_at)
+            raise
+        except BaseException:
+            self.pool.release(url, time.monotonic() - started_at, error=True)
+            raise
+        self.pool.release(url, time.monotonic() - started_at)
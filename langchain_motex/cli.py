@@ -0,0 +1,877 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Only the standard library is imported at the top of this module, so that
+# the command starts fast. LangChain, python-gitlab and the models are
+# imported and built when a subcommand needs them.
+
+import argparse
+import functools
+import json
+import math
+import os
+import shutil
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+DEFAULT_MODEL = "llama3.1:8b"
+STRONG_MODEL = "deepseek-coder-v2:16b"
+
+
+def get_flag(name: str) -> bool:
+    return os.getenv(name, "false").lower() == "true"
+
+
+def build_llms(
+    ollama_url: str,
+    callbacks: List[Any],
+    json_mode: bool,
+    routing: bool,
+    pool: Optional[Any] = None,
+    affinity_chars: int = 0,
+    **options: Any,
+) -> Dict[str, Any]:
+    """Build only the chat models used by the selected options.
+
+    ``llm_code`` is always built, ``llm_code_json`` only for the combined or
+    packed calls, and the bigger model only for the routing. With a
+    ``pool`` the requests are spread over its hosts instead of ``ollama_url``,
+    and the prompts with the same diff, up to ``affinity_chars`` characters,
+    go to the same host.
+    """
+    from langchain_community.chat_models.ollama import ChatOllama
+    from langchain_core.runnables import ConfigurableField
+
+    def _chat(model: str, **kwargs: Any) -> ChatOllama:
+        if pool is not None:
+            from langchain_motex.chat_models import PooledChatOllama
+
+            return PooledChatOllama(
+                model=model,
+                pool=pool,
+                affinity_chars=affinity_chars,
+                callbacks=callbacks,
+                **options,
+                **kwargs,
+            )
+        return ChatOllama(
+            model=model, base_url=ollama_url, callbacks=callbacks, **options, **kwargs
+        )
+
+    llms = {"llm_code": _chat(DEFAULT_MODEL)}
+    if json_mode:
+        llms["llm_code_json"] = _chat(DEFAULT_MODEL, format="json")
+    # Review simple diffs with the fast model, and complex code with the bigger one
+    if routing:
+        llms["llm_code"] = llms["llm_code"].configurable_alternatives(
+            ConfigurableField(id="llm_code"),
+            default_key="fast",
+            strong=_chat(STRONG_MODEL),
+        )
+        if json_mode:
+            llms["llm_code_json"] = llms["llm_code_json"].configurable_alternatives(
+                ConfigurableField(id="llm_code_json"),
+                default_key="fast",
+                strong=_chat(STRONG_MODEL, format="json"),
+            )
+    return llms
+
+
+@functools.lru_cache(maxsize=None)
+def get_ollama_pool(
+    ollama_urls: Tuple[str, ...], models: Tuple[str, ...], keep_alive: str
+) -> Any:
+    """Pool of the Ollama hosts, shared by the reviews of a process.
+
+    The models are loaded on every host in the background when the pool is
+    built, while the diffs are being fetched.
+    """
+    from langchain_motex.chat_models import OllamaEndpointPool
+
+    pool = OllamaEndpointPool(list(ollama_urls))
+    threading.Thread(
+        target=pool.warmup, args=(list(models), keep_alive), daemon=True
+    ).start()
+    return pool
+
+
+@functools.lru_cache(maxsize=None)
+def get_llm_cache(database_path: str) -> Any:
+    from langchain_motex.caches import SQLiteLRUCache
+
+    return SQLiteLRUCache(database_path)
+
+
+def review(
+    merge_request: bool,
+    gitlab_context: Optional[Any] = None,
+    log_dir: str = "./logs",
+    cancel_event: Optional[threading.Event] = None,
+) -> None:
+    """Summarize and review the changes, and feed them back to GitLab.
+
+    With ``merge_request`` the whole merge request is reviewed and the
+    summary is written into its description. Otherwise the latest commit
+    is reviewed and the results are commented on the merge request. The
+    merge request and the commit come from the CI variables, unless
+    ``gitlab_context`` is given. Once ``cancel_event`` is set, the remaining
+    files are skipped and nothing is written to GitLab.
+    """
+    import asyncio
+
+    from langchain_core.globals import set_debug, set_llm_cache
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.runnables import RunnableBranch, RunnableLambda
+
+    from langchain_motex.callbacks import (
+        ModelLatencyCallbackHandler,
+        OllamaMetricsCallbackHandler,
+    )
+    from langchain_motex.document_loaders.git_diff_loader import GitDiffLoader
+    from langchain_motex.document_loaders.gitlab_commit_loader import GitlabCommitLoader
+    from langchain_motex.document_loaders.gitlab_merge_request_loader import (
+        GitlabMergeRequestLoader,
+    )
+    from langchain_motex.document_transformers.hierarchical_summary import (
+        HierarchicalSummaryTransformer,
+    )
+    from langchain_motex.output_parsers import (
+        JsonKeysOutputParser,
+        JsonObjectOutputParser,
+    )
+    from langchain_motex.templates import (
+        TEMPLATE_CODE_REVIEW,
+        TEMPLATE_CODE_REVIEW_CONTEXT,
+        TEMPLATE_CODE_REVIEW_CONTEXT_PREFIXED,
+        TEMPLATE_CODE_REVIEW_PREFIXED,
+        TEMPLATE_CODE_REVIEW_REDUCE,
+        TEMPLATE_CODE_SUMMARY,
+        TEMPLATE_CODE_SUMMARY_PREFIXED,
+        TEMPLATE_CODE_SUMMARY_REDUCE,
+        TEMPLATE_CODE_SUMMARY_REVIEW,
+        TEMPLATE_CODE_SUMMARY_REVIEW_PACK,
+        TEMPLATE_DIRECTORY_SUMMARY,
+        TEMPLATE_MR_SUMMARY,
+    )
+    from langchain_motex.text_splitters.diff_text_splitter import DiffTextSplitter
+    from langchain_motex.utils.chain_utils import (
+        ainvoke_chains,
+        invoke_chains,
+        map_reduce_chain,
+        sequential_chains,
+        streaming_chain,
+    )
+    from langchain_motex.utils.dedup_utils import HunkDeduplicator
+    from langchain_motex.utils.gitlab_utils import (
+        MergeRequestNotFoundError,
+        ProgressiveNote,
+        comment_merge_request_note,
+        dump_review_state,
+        get_body_merge_request,
+        get_gitlab_context,
+        get_review_state_merge_request,
+        merge_review_state,
+        update_merge_request_summary,
+    )
+    from langchain_motex.utils.metrics_utils import RunReport, timed_chain
+    from langchain_motex.utils.packing_utils import (
+        apack_documents,
+        is_packed_document,
+        pack_documents,
+        packed_chain,
+        unpack_documents,
+    )
+    from langchain_motex.utils.routing_utils import ModelRouter, routing_chain
+    from langchain_motex.utils.schedule_utils import (
+        Deadline,
+        aschedule_documents,
+        deadline_chain,
+        schedule_documents,
+    )
+    from langchain_motex.utils.token_utils import estimate_tokens
+    from langchain_motex.utils.triage_utils import (
+        load_triage_rules,
+        match_triage_rule,
+        triage_chain,
+    )
+
+    # Initialize
+    set_debug(False)
+    # Wall time of the stages and the files, written to logs/run_report.json
+    run_report = RunReport()
+    # Stop dispatching files when the time budget of the job is nearly spent
+    time_budget = float(os.getenv("CODEREV_TIME_BUDGET", "0"))
+    deadline = None
+    if time_budget > 0:
+        deadline = Deadline(
+            time_budget, float(os.getenv("CODEREV_TIME_RESERVE", "60")), cancel_event
+        )
+    elif cancel_event is not None:
+        deadline = Deadline(math.inf, 0, cancel_event)
+    # Review only the files changed since the last reviewed commit
+    flag_incremental = get_flag("CODEREV_INCREMENTAL")
+    # Get the summary and the review of a file from one structured response
+    flag_combined = get_flag("CODEREV_COMBINED")
+    # Overlap fetching diffs, LLM calls and write-back in an asyncio pipeline
+    flag_async = get_flag("CODEREV_ASYNC")
+    # Edit the review note in place while the files are being reviewed
+    flag_progressive = get_flag("CODEREV_PROGRESSIVE")
+    # Choose the model of each file from the complexity of its diff
+    flag_routing = get_flag("CODEREV_ROUTING")
+    # Take the diffs from the local checkout instead of the GitLab API
+    flag_local_diff = get_flag("CODEREV_LOCAL_DIFF")
+    # Review the hunks repeated across files only once
+    flag_dedup = get_flag("CODEREV_DEDUP")
+    # Add the histogram of the latency of the files to the run report
+    flag_latency_histogram = get_flag("CODEREV_LATENCY_HISTOGRAM")
+    # Put the diff first, so that the review of a file reuses the prompt
+    # prefix cached by Ollama for its summary
+    flag_prefix_cache = get_flag("CODEREV_PREFIX_CACHE")
+
+    # ----------------------------
+    # Prompt
+    # ----------------------------
+    prompt_code_summary = PromptTemplate(
+        template=(
+            TEMPLATE_CODE_SUMMARY_PREFIXED
+            if flag_prefix_cache
+            else TEMPLATE_CODE_SUMMARY
+        ),
+        input_variables=["name", "language", "content"],
+    )
+    prompt_code_review = PromptTemplate(
+        template=(
+            TEMPLATE_CODE_REVIEW_PREFIXED if flag_prefix_cache else TEMPLATE_CODE_REVIEW
+        ),
+        input_variables=["name", "language", "content"],
+    )
+    prompt_code_review_context = PromptTemplate(
+        template=(
+            TEMPLATE_CODE_REVIEW_CONTEXT_PREFIXED
+            if flag_prefix_cache
+            else TEMPLATE_CODE_REVIEW_CONTEXT
+        ),
+        input_variables=["name", "language", "content", "context"],
+    )
+    prompt_mr_review = PromptTemplate(
+        template=TEMPLATE_MR_SUMMARY, input_variables=["metadata", "code_summaries"]
+    )
+    prompt_code_summary_review = PromptTemplate(
+        template=TEMPLATE_CODE_SUMMARY_REVIEW,
+        input_variables=["name", "language", "content"],
+    )
+    prompt_code_summary_review_pack = PromptTemplate(
+        template=TEMPLATE_CODE_SUMMARY_REVIEW_PACK, input_variables=["files"]
+    )
+    prompt_directory_summary = PromptTemplate(
+        template=TEMPLATE_DIRECTORY_SUMMARY,
+        input_variables=["directory", "code_summaries"],
+    )
+    prompt_code_summary_reduce = PromptTemplate(
+        template=TEMPLATE_CODE_SUMMARY_REDUCE, input_variables=["name", "content"]
+    )
+    prompt_code_review_reduce = PromptTemplate(
+        template=TEMPLATE_CODE_REVIEW_REDUCE, input_variables=["name", "content"]
+    )
+
+    # ----------------------------
+    # LLM
+    # ----------------------------
+    # Several hosts separated by commas are used as a pool
+    ollama_urls = os.getenv("OLLAMA_URL", "http://localhost:11434").split(",")
+    ollama_url = ollama_urls[0]
+    # Concurrent requests to each host
+    max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "4")) * len(ollama_urls)
+    # Token budget of a diff chunk, which must fit in the context window of the model
+    chunk_tokens = int(os.getenv("CODEREV_CHUNK_TOKENS", "1500"))
+    # Token budget of a prompt packing small diffs, or 0 not to pack them
+    pack_tokens = int(os.getenv("CODEREV_PACK_TOKENS", "0"))
+    # Number of calls and latency of each model
+    model_latency = ModelLatencyCallbackHandler()
+    # Token counts and generation time of each call, reported per stage
+    llm_metrics = OllamaMetricsCallbackHandler()
+    ollama_pool = None
+    llm_options = {}
+    if len(ollama_urls) > 1:
+        # Retry on another host when a host does not respond
+        llm_options["timeout"] = int(os.getenv("OLLAMA_TIMEOUT", "300"))
+        llm_options["keep_alive"] = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+        ollama_pool = get_ollama_pool(
+            tuple(ollama_urls),
+            (DEFAULT_MODEL, STRONG_MODEL) if flag_routing else (DEFAULT_MODEL,),
+            llm_options["keep_alive"],
+        )
+    elif os.getenv("OLLAMA_KEEP_ALIVE"):
+        llm_options["keep_alive"] = os.getenv("OLLAMA_KEEP_ALIVE")
+    if os.getenv("OLLAMA_NUM_CTX"):
+        llm_options["num_ctx"] = int(os.getenv("OLLAMA_NUM_CTX"))
+    if flag_prefix_cache:
+        # Ollama reloads the model, and drops the cache, when num_ctx changes
+        # or the keep_alive expires, so every request sends the same values
+        llm_options.setdefault("num_ctx", 4096)
+        llm_options.setdefault("keep_alive", "30m")
+    llms = build_llms(
+        ollama_url,
+        [model_latency, llm_metrics],
+        json_mode=flag_combined or pack_tokens > 0,
+        routing=flag_routing,
+        pool=ollama_pool,
+        # The prompts of a file start with its path and diff
+        affinity_chars=1024 if flag_prefix_cache else 0,
+        **llm_options,
+    )
+    llm_code = llms["llm_code"]
+    router = None
+    if flag_routing:
+        router = ModelRouter(float(os.getenv("CODEREV_ROUTING_THRESHOLD", "4")))
+
+    # ----------------------------
+    # Cache
+    # - Reuse outputs of the previous pipelines for unchanged diffs
+    # ----------------------------
+    cache_dir = os.getenv("CODEREV_CACHE_DIR", ".cache/coderev")
+    llm_cache = None
+    if cache_dir:
+        llm_cache = get_llm_cache(os.path.join(cache_dir, "llm_cache.db"))
+        set_llm_cache(llm_cache)
+        # The cache is shared by the reviews of a worker, so count from here
+        cache_hits, cache_misses = llm_cache.hits, llm_cache.misses
+
+    # ----------------------------
+    # Embedding models
+    # - Snippets of the repository related to the diff are given to the review
+    # ----------------------------
+    context_k = int(os.getenv("CODEREV_CONTEXT_K", "0"))
+    repository_index = None
+    if context_k > 0:
+        from langchain_community.embeddings import OllamaEmbeddings
+
+        from langchain_motex.indexes.repository_index import RepositoryIndex
+
+        embed = OllamaEmbeddings(model="nomic-embed-text:latest", base_url=ollama_url)
+        # The review goes on without the context if the index cannot be built
+        with run_report.stage("index"):
+            try:
+                repository_index = RepositoryIndex(
+                    os.path.join(cache_dir or ".cache/coderev", "repository_index"),
+                    embed,
+                    project=os.getenv("CI_PROJECT_ID", ""),
+                )
+                print(f"Repository index: {repository_index.update()} blobs")
+            except Exception as e:
+                print(f"Failed: indexing the repository: {type(e).__name__}: {e}")
+                repository_index = None
+
+    # ----------------------------
+    # Document Loader
+    # ----------------------------
+    with run_report.stage("load"):
+        if gitlab_context is None:
+            try:
+                gitlab_context = get_gitlab_context()
+            except MergeRequestNotFoundError as e:
+                print(f"Skipped: {e}")
+                return
+        review_state = None
+        if flag_incremental and not merge_request:
+            review_state = get_review_state_merge_request(gitlab_context)
+        if merge_request:
+            docs_loader = GitlabMergeRequestLoader(gitlab_context)
+            local_base_sha = None
+        elif flag_incremental and review_state is None:
+            # Nothing is reviewed yet, so review the whole merge request
+            docs_loader = GitlabMergeRequestLoader(gitlab_context)
+            local_base_sha = None
+        elif flag_incremental:
+            docs_loader = GitlabCommitLoader(
+                gitlab_context, base_sha=review_state["sha"]
+            )
+            local_base_sha = review_state["sha"]
+        else:
+            docs_loader = GitlabCommitLoader(gitlab_context)
+            local_base_sha = gitlab_context.commit_sha + "^"
+        # Shallow clones may lack the base commit, then the API is used instead
+        if flag_local_diff:
+            local_docs_loader = GitDiffLoader(gitlab_context, base_sha=local_base_sha)
+            if local_docs_loader.is_available():
+                docs_loader = local_docs_loader
+            else:
+                print("Local diff: commits not found, using the GitLab API")
+    # Documents are yielded while the following diffs are still being fetched
+    if flag_async:
+        docs = run_report.atimed_iter(docs_loader.alazy_load(), "load")
+    else:
+        docs = run_report.timed_iter(docs_loader.lazy_load(), "load")
+
+    # ----------------------------
+    # Code Summary & Review Chain
+    # - Large diffs are split into chunks of hunks, and the outputs are reduced
+    # ----------------------------
+    code_inputs = {
+        "name": RunnableLambda(lambda x: x.metadata["file_path"]),
+        "language": RunnableLambda(lambda x: x.metadata["file_type"]),
+        "content": RunnableLambda(lambda x: x.page_content),
+    }
+    chain_code_summary = (
+        code_inputs | prompt_code_summary | llm_code | StrOutputParser()
+    ).with_config(metadata={"stage": "code_summary"})
+    chain_code_review = (
+        code_inputs | prompt_code_review | llm_code | StrOutputParser()
+    ).with_config(metadata={"stage": "code_review"})
+    if repository_index is not None:
+        from langchain_motex.indexes.repository_index import (
+            format_repository_context,
+            get_diff_query,
+        )
+
+        chain_code_review = (
+            {
+                **code_inputs,
+                "context": RunnableLambda(
+                    lambda x: format_repository_context(
+                        repository_index.search(
+                            get_diff_query(x.page_content),
+                            context_k,
+                            exclude_path=x.metadata["file_path"],
+                        )
+                    )
+                ),
+            }
+            | prompt_code_review_context
+            | llm_code
+            | StrOutputParser()
+        ).with_config(metadata={"stage": "code_review"})
+    # Post a placeholder note, and write the reviews into it as they are generated
+    progressive_note = None
+    if flag_progressive and not merge_request:
+        with run_report.stage("gitlab_write"):
+            progressive_note = ProgressiveNote(
+                gitlab_context,
+                "## コードレビュー (レビュー中)\n\n",
+                float(os.getenv("CODEREV_NOTE_INTERVAL", "10")),
+                # The edits overlap the code stage, and are timed as the write-back
+                on_save=lambda seconds: run_report.add_time("gitlab_write", seconds),
+            )
+
+        def update_note(doc, review: str, generating: bool = False) -> None:
+            # A group of shared hunks has its own section, apart from its first file
+            if "dedup_group" in doc.metadata:
+                key = doc.metadata["dedup_group"]
+                title = f"共通の変更 ({len(doc.metadata['dedup_files'])}ファイルに適用)"
+            else:
+                key = title = doc.metadata["file_path"]
+            if generating:
+                title += " (生成中)"
+            progressive_note.update(key, "- " + title + "\n" + review)
+
+        chain_code_review = streaming_chain(
+            chain_code_review, lambda doc, text: update_note(doc, text, True)
+        )
+    chain_code_summary_reduce = (
+        code_inputs | prompt_code_summary_reduce | llm_code | StrOutputParser()
+    ).with_config(metadata={"stage": "code_summary_reduce"})
+    chain_code_review_reduce = (
+        code_inputs | prompt_code_review_reduce | llm_code | StrOutputParser()
+    ).with_config(metadata={"stage": "code_review_reduce"})
+    text_splitter = DiffTextSplitter(chunk_size=chunk_tokens)
+    chain_code = sequential_chains(
+        {
+            "summary": map_reduce_chain(
+                chain_code_summary, chain_code_summary_reduce, text_splitter
+            ),
+            "review": map_reduce_chain(
+                chain_code_review, chain_code_review_reduce, text_splitter
+            ),
+        }
+    )
+    # Summarize and review a file in one call, and fall back to two calls on failure
+    if flag_combined:
+        chain_code_summary_review = (
+            code_inputs
+            | prompt_code_summary_review
+            | llms["llm_code_json"]
+            | JsonKeysOutputParser(keys=["summary", "review"])
+        ).with_config(metadata={"stage": "code_summary_review"})
+        chain_code = RunnableBranch(
+            (
+                lambda x: len(text_splitter.split_text(x.page_content)) <= 1,
+                chain_code_summary_review.with_fallbacks([chain_code]),
+            ),
+            chain_code,
+        )
+    if router is not None:
+        chain_code = routing_chain(chain_code, router, ["llm_code", "llm_code_json"])
+    # Trivial diffs (deletions, renames, lockfiles, ...) get canned outputs
+    triage_rules = load_triage_rules(os.getenv("CODEREV_TRIAGE_RULES", ""))
+    chain_code = triage_chain(chain_code, triage_rules)
+
+    deduplicator = None
+    if flag_dedup:
+        deduplicator = HunkDeduplicator()
+        docs = (deduplicator.adedup if flag_async else deduplicator.dedup)(docs)
+
+    # Important and long diffs first, so the workers end with the short ones.
+    # The diffs are ordered on the fly within a window, not buffered all
+    if time_budget > 0:
+        docs = (aschedule_documents if flag_async else schedule_documents)(
+            docs, int(os.getenv("CODEREV_SCHEDULE_WINDOW", "32"))
+        )
+
+    # Small diffs are summarized and reviewed together in one call
+    if pack_tokens > 0:
+        chain_code_pack = (
+            {"files": RunnableLambda(lambda x: x.page_content)}
+            | prompt_code_summary_review_pack
+            | llms["llm_code_json"]
+            | JsonObjectOutputParser()
+        ).with_config(metadata={"stage": "code_pack"})
+        chain_code = RunnableBranch(
+            (is_packed_document, packed_chain(chain_code_pack, chain_code)),
+            chain_code,
+        )
+        docs = (apack_documents if flag_async else pack_documents)(
+            docs,
+            pack_tokens,
+            can_pack=lambda doc: match_triage_rule(doc, triage_rules) is None,
+        )
+    chain_code = timed_chain(chain_code, run_report)
+    if deadline is not None:
+        chain_code = deadline_chain(chain_code, deadline)
+
+    def count_llm_calls(doc) -> int:
+        # Calls the chains above make for the document
+        if pack_tokens > 0 and estimate_tokens(doc.page_content) <= pack_tokens // 4:
+            # Sent with other files in one call
+            return 0
+        chunks = len(text_splitter.split_text(doc.page_content))
+        if chunks <= 1:
+            return 1 if flag_combined else 2
+        # The summary and the review of each chunk, then their reductions
+        return 2 * (chunks + 1)
+
+    def print_finished(doc):
+        if "error" in doc.metadata:
+            print("Failed: " + doc.metadata["file_path"] + ": " + doc.metadata["error"])
+        elif doc.metadata.get("skipped"):
+            print("Skipped: " + doc.metadata["file_path"])
+            return
+        else:
+            print("Finished: " + doc.metadata["file_path"])
+        if progressive_note is not None:
+            for finished_doc in unpack_documents([doc]):
+                update_note(
+                    finished_doc,
+                    finished_doc.metadata.get("review", "レビューに失敗しました。"),
+                )
+
+    # Files are processed concurrently, up to the number of requests Ollama can serve
+    with run_report.stage("code"):
+        if flag_async:
+            docs = asyncio.run(
+                ainvoke_chains(
+                    chain_code, docs, max_concurrency, on_finish=print_finished
+                )
+            )
+        else:
+            docs = invoke_chains(
+                chain_code, docs, max_concurrency, on_finish=print_finished
+            )
+    docs = unpack_documents(docs)
+    # A newer job replaces this one, so the stale results are not posted
+    if cancel_event is not None and cancel_event.is_set():
+        print("Cancelled: superseded by a newer review")
+        if progressive_note is not None:
+            progressive_note.finish(
+                "## コードレビュー\n\n"
+                "新しいコミットがプッシュされたため、このレビューは中止しました。\n"
+            )
+        return
+    dedup_groups = []
+    if deduplicator is not None:
+        dedup_groups = deduplicator.get_groups()
+        docs = deduplicator.attribute(docs)
+        print(
+            f"Dedup: {len(dedup_groups)} shared hunks, "
+            f"{sum(1 for doc in docs if doc.metadata.get('dedup_covered'))}"
+            " files covered"
+        )
+    for doc in docs:
+        if "error" in doc.metadata:
+            doc.metadata.setdefault("summary", "")
+            doc.metadata.setdefault("review", "レビューに失敗しました。")
+    raw_diff_tokens = sum(doc.metadata.get("raw_diff_tokens", 0) for doc in docs)
+    diff_tokens = sum(doc.metadata.get("diff_tokens", 0) for doc in docs)
+    if raw_diff_tokens:
+        print(
+            f"Diff: {raw_diff_tokens} -> {diff_tokens} tokens "
+            f"({100 * (diff_tokens - raw_diff_tokens) / raw_diff_tokens:+.1f}%)"
+        )
+    triaged_docs = [doc for doc in docs if "triage" in doc.metadata]
+    print(
+        f"Triage: {len(triaged_docs)} files skipped, "
+        f"{sum(count_llm_calls(doc) for doc in triaged_docs)} LLM calls saved"
+    )
+
+    # Carry over the results of the files unchanged since the last review
+    docs = merge_review_state(review_state, docs)
+    skipped_docs = [doc for doc in docs if doc.metadata.get("skipped")]
+    docs = [doc for doc in docs if not doc.metadata.get("skipped")]
+    if skipped_docs:
+        print(f"Deadline: {len(skipped_docs)} files skipped")
+
+    # ----------------------------
+    # Transformers
+    # - Summaries Aggregation, reduced per directory if they are too long
+    # ----------------------------
+    chain_directory_summary = (
+        {
+            "directory": RunnableLambda(lambda x: x.metadata["directory"]),
+            "code_summaries": RunnableLambda(lambda x: x.page_content),
+        }
+        | prompt_directory_summary
+        | llm_code
+        | StrOutputParser()
+    ).with_config(metadata={"stage": "directory_summary"})
+    summary_transformer = HierarchicalSummaryTransformer(
+        chain_directory_summary, chunk_tokens, max_concurrency
+    )
+    with run_report.stage("directory_summary"):
+        doc_summarized = summary_transformer.transform_documents(
+            docs, body=get_body_merge_request(gitlab_context)
+        )[0]
+
+    # ----------------------------
+    # Merge Request Summary chain
+    # ----------------------------
+    chain_mr_review = (
+        {
+            "title": RunnableLambda(lambda x: x.metadata["title"]),
+            "description": RunnableLambda(lambda x: x.metadata["description"]),
+            "code_summaries": RunnableLambda(lambda x: x.page_content),
+        }
+        | prompt_mr_review
+        | llm_code
+        | StrOutputParser()
+    ).with_config(metadata={"stage": "mr_summary"})
+    with run_report.stage("mr_summary"):
+        doc_summarized.metadata["summary"] = chain_mr_review.invoke(doc_summarized)
+    print(doc_summarized.metadata["summary"])
+    if llm_cache is not None:
+        cache_hits = llm_cache.hits - cache_hits
+        cache_misses = llm_cache.misses - cache_misses
+        print(f"Cache: {cache_hits} hits, {cache_misses} misses")
+    if router is not None:
+        print(f"Routing: {router.counts()}")
+    for model, stats in model_latency.summary().items():
+        print(f"Model: {model}: {stats['calls']} calls, {stats['mean_seconds']}s/call")
+    if ollama_pool is not None:
+        for url, stats in ollama_pool.summary().items():
+            print(
+                f"Ollama: {url}: {stats['calls']} calls, {stats['errors']} errors, "
+                f"{stats['mean_seconds']}s/call"
+            )
+
+    # ----------------------------
+    # Feedback to GitLab
+    # ----------------------------
+    with run_report.stage("gitlab_write"):
+        if merge_request:
+            # MR要約とコードごとの要約をdescriptionに追記し、MRの分類をtitleの先頭に追記
+            code_summaries = doc_summarized.page_content
+            if skipped_docs:
+                code_summaries += (
+                    "\n\n時間切れのためレビューを省略したファイル:\n"
+                    + "\n".join(
+                        "- " + doc.metadata["file_path"] for doc in skipped_docs
+                    )
+                )
+            update_merge_request_summary(
+                gitlab_context, doc_summarized.metadata["summary"], code_summaries
+            )
+        else:
+            # コミットされるたびに、コードの要約とレビューをコメント
+            comment = (
+                "## コード要約\n\n"
+                + doc_summarized.page_content
+                + "\n\n## コードレビュー\n\n"
+            )
+            for doc in docs:
+                # Files only with the shared hunks are shown under the shared changes
+                if doc.metadata.get("dedup_covered"):
+                    continue
+                comment += "- " + doc.metadata["file_path"]
+                if doc.metadata.get("carried_over"):
+                    comment += " (前回から変更なし)"
+                comment += "\n" + doc.metadata["review"] + "\n\n"
+            for group in dedup_groups:
+                if group.metadata.get("skipped"):
+                    continue
+                file_paths = group.metadata["dedup_files"]
+                comment += (
+                    f"- 共通の変更 ({len(file_paths)}ファイルに適用: "
+                    + ", ".join(file_paths[:5])
+                    + (", ..." if len(file_paths) > 5 else "")
+                    + ")\n"
+                    + group.metadata.get("review", "レビューに失敗しました。")
+                    + "\n\n"
+                )
+            if skipped_docs:
+                comment += "## 時間切れのためレビューを省略したファイル\n\n"
+                for doc in skipped_docs:
+                    comment += "- " + doc.metadata["file_path"] + "\n"
+                comment += "\n"
+            # Keep the last reviewed commit, so that the skipped and the failed
+            # files are reviewed again later. A run reviewing only the diff of
+            # the commit leaves no state, since the earlier commits are unseen.
+            if not flag_incremental:
+                reviewed_sha = None
+            elif skipped_docs or any("error" in doc.metadata for doc in docs):
+                reviewed_sha = review_state["sha"] if review_state else None
+            else:
+                reviewed_sha = gitlab_context.commit_sha
+            if reviewed_sha is not None:
+                comment += dump_review_state(reviewed_sha, docs)
+            if progressive_note is not None:
+                progressive_note.finish(comment)
+            else:
+                comment_merge_request_note(gitlab_context, comment)
+    print(f"GitLab API: {gitlab_context.api_calls} calls")
+
+    write_logs(docs, doc_summarized, router, model_latency, log_dir)
+    run_report.write(
+        log_dir,
+        llm_metrics.records,
+        {
+            "gitlab_api_calls": gitlab_context.api_calls,
+            "diff_tokens": {"raw": raw_diff_tokens, "rendered": diff_tokens},
+            "cache": (
+                {"hits": cache_hits, "misses": cache_misses}
+                if llm_cache is not None
+                else None
+            ),
+            "llm": llm_metrics.summary(),
+            "ollama_hosts": (
+                ollama_pool.summary() if ollama_pool is not None else None
+            ),
+        },
+        histogram=flag_latency_histogram,
+    )
+
+
+def write_logs(
+    docs: List[Any],
+    doc_summarized: Any,
+    router: Any,
+    model_latency: Any,
+    log_dir: str = "./logs",
+) -> None:
+    # Clear previous logs
+    if os.path.isdir(log_dir):
+        shutil.rmtree(log_dir)
+    os.makedirs(log_dir, exist_ok=True)
+
+    # Log outputs
+    for doc in docs:
+        with open(
+            os.path.join(log_dir, "outputs_code_review.txt"), mode="a", encoding="utf_8"
+        ) as f:
+            f.write("## " + doc.metadata["file_path"] + "\n")
+            f.write(doc.metadata["summary"])
+            f.write("\n")
+        with open(
+            os.path.join(log_dir, "outputs_code_summary.txt"),
+            mode="a",
+            encoding="utf_8",
+        ) as f:
+            f.write("## " + doc.metadata["file_path"] + "\n")
+            f.write(doc.metadata["review"])
+            f.write("\n")
+    if router is not None:
+        with open(
+            os.path.join(log_dir, "routing.jsonl"), mode="a", encoding="utf_8"
+        ) as f:
+            for decision in router.decisions:
+                f.write(json.dumps(decision, ensure_ascii=False) + "\n")
+    with open(
+        os.path.join(log_dir, "model_latency.json"), mode="w", encoding="utf_8"
+    ) as f:
+        json.dump(model_latency.summary(), f, ensure_ascii=False, indent=2)
+    with open(
+        os.path.join(log_dir, "outputs_mr_review.txt"), mode="a", encoding="utf_8"
+    ) as f:
+        f.write(doc_summarized.metadata["summary"])
+    for directory, summary in doc_summarized.metadata["directory_summaries"].items():
+        with open(
+            os.path.join(log_dir, "outputs_directory_summary.txt"),
+            mode="a",
+            encoding="utf_8",
+        ) as f:
+            f.write("## " + (directory or "/") + "\n")
+            f.write(summary)
+            f.write("\n")
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="coderev", description="Summarize and review GitLab changes with LLMs."
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.add_parser(
+        "review-mr",
+        help="review the whole merge request, and update its description",
+    )
+    subparsers.add_parser(
+        "review-commit",
+        help="review the latest commit, and comment on the merge request",
+    )
+    serve_parser = subparsers.add_parser(
+        "serve", help="run a worker reviewing the changes notified by webhooks"
+    )
+    serve_parser.add_argument("--host", default="0.0.0.0")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument(
+        "--jobs", type=int, default=2, help="number of reviews run at once"
+    )
+    serve_parser.add_argument(
+        "--database",
+        default=".cache/coderev/jobs.db",
+        help="SQLite database of the queue of the jobs",
+    )
+    serve_parser.add_argument(
+        "--insecure",
+        action="store_true",
+        help="accept the webhooks without CODEREV_WEBHOOK_TOKEN",
+    )
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = get_parser().parse_args(argv)
+    if os.path.isfile(".env"):
+        from dotenv import load_dotenv
+
+        load_dotenv()
+    # Without a subcommand, choose it from the event of the pipeline
+    command = args.command
+    if command is None:
+        if os.getenv("CI_PIPELINE_SOURCE") == "merge_request_event":
+            command = "review-mr"
+        else:
+            command = "review-commit"
+    if command == "serve":
+        from langchain_motex.worker import serve
+
+        try:
+            serve(args.host, args.port, args.jobs, args.database, args.insecure)
+        except ValueError as e:
+            print(f"Failed to start the worker: {e}")
+            return 1
+        return 0
+    review(merge_request=command == "review-mr")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
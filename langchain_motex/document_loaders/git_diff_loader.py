@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+from typing import Iterator, Optional
+
+from dotenv import load_dotenv
+from langchain_core.document_loaders import BaseLoader
+from langchain_core.documents import Document
+
+from langchain_motex.utils.git_utils import get_merge_base, has_commit, iter_diffs_git
+from langchain_motex.utils.gitlab_utils import (
+    GitlabContext,
+    get_body_merge_request,
+    get_gitlab_context,
+    iter_documents,
+)
+
+
+class GitDiffLoader(BaseLoader):
+    """Load the changes from the local checkout instead of the GitLab API.
+
+    The diffs are taken by ``git diff`` from the merge base of ``base_sha``
+    and ``commit_sha``. Without ``base_sha``, the base of the merge request
+    is used, so GitLab is only asked for the metadata of the merge request.
+    """
+
+    gitlab_context: GitlabContext
+    commit_sha: str
+
+    def __init__(
+        self,
+        gitlab_context: GitlabContext,
+        base_sha: Optional[str] = None,
+        commit_sha: Optional[str] = None,
+        repo_path: str = ".",
+    ):
+        self.gitlab_context = gitlab_context
+        self.commit_sha = commit_sha or gitlab_context.commit_sha or "HEAD"
+        self.base_sha = base_sha
+        self.repo_path = repo_path
+
+    def get_base_sha(self) -> str:
+        if self.base_sha:
+            return self.base_sha
+        # Set in merge request pipelines, otherwise ask GitLab
+        base_sha = os.getenv("CI_MERGE_REQUEST_DIFF_BASE_SHA", "")
+        if not base_sha:
+            base_sha = self.gitlab_context.merge_request.diff_refs["base_sha"]
+        return base_sha
+
+    def is_available(self) -> bool:
+        """Whether the checkout has both commits, e.g. not a too shallow clone."""
+        return has_commit(self.get_base_sha(), self.repo_path) and has_commit(
+            self.commit_sha, self.repo_path
+        )
+
+    def lazy_load(self) -> Iterator[Document]:
+        """Yield each document as soon as git outputs its diff."""
+        body = get_body_merge_request(self.gitlab_context)
+        base_sha = get_merge_base(self.get_base_sha(), self.commit_sha, self.repo_path)
+        diffs = iter_diffs_git(base_sha, self.commit_sha, self.repo_path)
+        yield from iter_documents(body, diffs)
+
+
+if __name__ == "__main__":
+    if os.path.isfile(".env"):
+        load_dotenv()
+
+    gitlab_context = get_gitlab_context()
+    docs_loader = GitDiffLoader(gitlab_context)
+    docs = docs_loader.load()
+
+    for doc in docs:
+        print("Title: ", doc.metadata["title"])
+        print("Description: ", doc.metadata["description"])
+        print("Author: ", doc.metadata["author"]["name"])
+        print("Filepath: ", doc.metadata["file_path"])
+        print("Status: ", doc.metadata["diff_status"])
+        print("Add_lines: ", doc.metadata["add_count"])
+        print("Delete_lines: ", doc.metadata["delete_count"])
+        print("\n")
+        if False:
+            print("Diffs: ", doc.page_content)
@@ -2,50 +2,59 @@
 # -*- coding: utf-8 -*-
 
 import os
-from typing import Iterator
+from typing import AsyncIterator, Iterator, Optional
 
 from dotenv import load_dotenv
-from gitlab import Gitlab
 from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document
 
-from langchain_motex.utils.gitlab_utils import get_documents_commit, get_gitlab_client
+from langchain_motex.utils.gitlab_async_utils import (
+    AsyncGitlabContext,
+    aiter_documents_commit,
+)
+from langchain_motex.utils.gitlab_utils import (
+    GitlabContext,
+    get_gitlab_context,
+    iter_documents_commit,
+)
 
 
 class GitlabCommitLoader(BaseLoader):
-    gitlab_client: Gitlab
-    project_id: int
-    merge_request_iid: int
+    gitlab_context: GitlabContext
+    commit_sha: str
 
     def __init__(
         self,
-        gitlab_client: Gitlab,
-        project_id: int,
-        merge_request_iid: int,
-        commit_sha: str,
+        gitlab_context: GitlabContext,
+        commit_sha: Optional[str] = None,
+        base_sha: Optional[str] = None,
     ):
-        self.gitlab_client = gitlab_client
-        self.project_id = project_id
-        self.merge_request_iid = merge_request_iid
-        self.commit_sha = commit_sha
+        self.gitlab_context = gitlab_context
+        self.commit_sha = commit_sha or gitlab_context.commit_sha
+        # If given, load the changes from base_sha to commit_sha instead
+        self.base_sha = base_sha
 
     def lazy_load(self) -> Iterator[Document]:
-        """Load and return documents from the JSON file."""
-        docs = get_documents_commit(
-            self.gitlab_client, self.project_id, self.merge_request_iid, self.commit_sha
+        """Yield each document as soon as its diff is fetched and parsed."""
+        yield from iter_documents_commit(
+            self.gitlab_context, self.commit_sha, self.base_sha
         )
-        for doc in docs:
-            yield doc
+
+    async def alazy_load(self) -> AsyncIterator[Document]:
+        """Yield each document while the following diffs are fetched with httpx."""
+        async with AsyncGitlabContext(self.gitlab_context) as async_gitlab_context:
+            async for doc in aiter_documents_commit(
+                async_gitlab_context, self.commit_sha, self.base_sha
+            ):
+                yield doc
 
 
 if __name__ == "__main__":
     if os.path.isfile(".env"):
         load_dotenv()
 
-    (gitlab_client, project_id, merge_request_iid, commit_sha) = get_gitlab_client()
-    docs_loader = GitlabCommitLoader(
-        gitlab_client, project_id, merge_request_iid, commit_sha
-    )
+    gitlab_context = get_gitlab_context()
+    docs_loader = GitlabCommitLoader(gitlab_context)
     docs = docs_loader.load()
 
     for doc in docs:
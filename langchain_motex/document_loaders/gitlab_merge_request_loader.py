@@ -2,49 +2,46 @@
 # -*- coding: utf-8 -*-
 
 import os
-from typing import Iterator
+from typing import AsyncIterator, Iterator
 
 from dotenv import load_dotenv
-from gitlab import Gitlab
 from langchain_core.document_loaders import BaseLoader
 from langchain_core.documents import Document
 
+from langchain_motex.utils.gitlab_async_utils import (
+    AsyncGitlabContext,
+    aiter_documents_merge_request,
+)
 from langchain_motex.utils.gitlab_utils import (
-    get_documents_merge_request,
-    get_gitlab_client,
+    GitlabContext,
+    get_gitlab_context,
+    iter_documents_merge_request,
 )
 
 
 class GitlabMergeRequestLoader(BaseLoader):
-    gitlab_client: Gitlab
-    project_id: int
-    merge_request_iid: int
-
-    def __init__(
-        self,
-        gitlab_client: Gitlab,
-        project_id: int,
-        merge_request_iid: int,
-    ):
-        self.gitlab_client = gitlab_client
-        self.project_id = project_id
-        self.merge_request_iid = merge_request_iid
+    gitlab_context: GitlabContext
+
+    def __init__(self, gitlab_context: GitlabContext):
+        self.gitlab_context = gitlab_context
 
     def lazy_load(self) -> Iterator[Document]:
-        """Load and return documents from the JSON file."""
-        docs = get_documents_merge_request(
-            self.gitlab_client, self.project_id, self.merge_request_iid
-        )
-        for doc in docs:
-            yield doc
+        """Yield each document as soon as its diff is fetched and parsed."""
+        yield from iter_documents_merge_request(self.gitlab_context)
+
+    async def alazy_load(self) -> AsyncIterator[Document]:
+        """Yield each document while the following diffs are fetched with httpx."""
+        async with AsyncGitlabContext(self.gitlab_context) as async_gitlab_context:
+            async for doc in aiter_documents_merge_request(async_gitlab_context):
+                yield doc
 
 
 if __name__ == "__main__":
     if os.path.isfile(".env"):
         load_dotenv()
 
-    (gitlab_client, project_id, merge_request_iid, commit_sha) = get_gitlab_client()
-    docs_loader = GitlabMergeRequestLoader(gitlab_client, project_id, merge_request_iid)
+    gitlab_context = get_gitlab_context()
+    docs_loader = GitlabMergeRequestLoader(gitlab_context)
     docs = docs_loader.load()
 
     for doc in docs:
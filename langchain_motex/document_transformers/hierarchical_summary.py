@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import posixpath
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from langchain_core.documents import BaseDocumentTransformer, Document
+from langchain_core.runnables import Runnable
+
+from langchain_motex.utils.gitlab_utils import get_document_code_summaries
+from langchain_motex.utils.token_utils import estimate_tokens
+
+FILE_SUMMARY = "- ファイル: {name}\n{summary}\n"
+DIRECTORY_SUMMARY = "- ディレクトリ: {name}\n{summary}\n"
+
+
+class HierarchicalSummaryTransformer(BaseDocumentTransformer):
+    """Aggregate the summaries of the files into the code summaries of the MR.
+
+    If the joined summaries of the files fit in ``token_budget``, they are
+    joined as is. Otherwise the summaries are reduced per directory with
+    ``reduce_chain``, then per parent directory, and so on until they fit.
+    The directories of a level are reduced in parallel. The intermediate
+    summaries are exposed in ``metadata["directory_summaries"]``.
+
+    ``reduce_chain`` takes a document whose content is the summaries to
+    reduce and whose ``metadata["directory"]`` is the directory.
+
+    The ``body`` keyword argument of ``transform_documents`` is the body of
+    the merge request, whose title and description are used when there are
+    no documents.
+    """
+
+    def __init__(
+        self, reduce_chain: Runnable, token_budget: int = 3000, max_concurrency: int = 1
+    ):
+        self.reduce_chain = reduce_chain
+        self.token_budget = token_budget
+        self.max_concurrency = max_concurrency
+
+    def transform_documents(
+        self, documents: Sequence[Document], **kwargs: Any
+    ) -> Sequence[Document]:
+        doc_summarized = get_document_code_summaries(
+            list(documents), kwargs.get("body")
+        )
+        doc_summarized.metadata["directory_summaries"] = {}
+        if estimate_tokens(doc_summarized.page_content) <= self.token_budget:
+            return [doc_summarized]
+
+        # Leaves of the tree: (directory, entry, summary) of each file
+        nodes = [
+            (
+                posixpath.dirname(doc.metadata["file_path"]),
+                FILE_SUMMARY.format(
+                    name=doc.metadata["file_path"], summary=doc.metadata["summary"]
+                ),
+                None,
+            )
+            for doc in documents
+            if doc.metadata["diff_status"] in ["add", "modify"]
+        ]
+        directory_summaries: Dict[str, str] = {}
+        while True:
+            summaries, reduced = self._reduce(nodes)
+            # A directory may be reduced at several levels, e.g. with its own
+            # files, then with its subdirectories: keep every summary
+            for directory, summary in reduced:
+                if directory in directory_summaries:
+                    directory_summaries[directory] += "\n" + summary
+                else:
+                    directory_summaries[directory] = summary
+            content = "".join(
+                DIRECTORY_SUMMARY.format(name=directory or "/", summary=summary)
+                for directory, summary in summaries.items()
+            )
+            if estimate_tokens(content) <= self.token_budget or list(summaries) == [""]:
+                break
+            # Reduce the summaries again per parent directory
+            nodes = [
+                (
+                    posixpath.dirname(directory),
+                    DIRECTORY_SUMMARY.format(name=directory or "/", summary=summary),
+                    summary,
+                )
+                for directory, summary in summaries.items()
+            ]
+
+        doc_summarized.page_content = content
+        doc_summarized.metadata["directory_summaries"] = directory_summaries
+        return [doc_summarized]
+
+    def _reduce(
+        self, nodes: List[Tuple[str, str, Optional[str]]]
+    ) -> Tuple[Dict[str, str], List[Tuple[str, str]]]:
+        # Return the summaries per directory, and the (directory, summary) of
+        # the batches which have been reduced, not carried over
+        # Group the entries by directory, in batches within the token budget
+        batches: List[List[Tuple[str, str, Optional[str]]]] = []
+        last_batch: Dict[str, int] = {}
+        for node in nodes:
+            index = last_batch.get(node[0])
+            if index is not None:
+                text = "".join(entry for _, entry, _ in batches[index]) + node[1]
+            if index is None or estimate_tokens(text) > self.token_budget:
+                last_batch[node[0]] = len(batches)
+                batches.append([node])
+            else:
+                batches[index].append(node)
+
+        # A summary alone in its parent directory is carried over as is
+        reduced_batches = [
+            batch for batch in batches if len(batch) > 1 or batch[0][2] is None
+        ]
+        outputs = iter(
+            self.reduce_chain.batch(
+                [
+                    Document(
+                        page_content="".join(entry for _, entry, _ in batch),
+                        metadata={"directory": batch[0][0] or "/"},
+                    )
+                    for batch in reduced_batches
+                ],
+                config={"max_concurrency": self.max_concurrency},
+            )
+        )
+        summaries: Dict[str, str] = {}
+        reduced: List[Tuple[str, str]] = []
+        for batch in batches:
+            directory = batch[0][0]
+            if len(batch) > 1 or batch[0][2] is None:
+                output = next(outputs)
+                reduced.append((directory, output))
+            else:
+                output = batch[0][2]
+            if directory in summaries:
+                summaries[directory] += "\n" + output
+            else:
+                summaries[directory] = output
+        return summaries, reduced
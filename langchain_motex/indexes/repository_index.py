@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from langchain_motex.utils.git_utils import list_blobs, read_blobs
+from langchain_motex.utils.token_utils import estimate_tokens
+
+REPOSITORY_CONTEXT = """### {file_path}
+```
+{content}
+```
+"""
+
+
+class RepositoryIndex:
+    """FAISS index of the chunks of the files in the repository.
+
+    The chunks are keyed on the blob SHA of their file, so ``update`` embeds
+    only the blobs which are not indexed yet, and drops the blobs which are
+    no longer in the tree. The index is saved in ``index_path`` to be
+    reused by the next pipelines.
+
+    The saved docstore is a pickle, and loading it runs code of whoever
+    wrote it. ``index_path`` must be writable only by the jobs of this
+    project, as the CI cache of GitLab is by default. An index of another
+    ``project`` or embedding model is not loaded, and is built again.
+    """
+
+    def __init__(
+        self,
+        index_path: str,
+        embeddings: Embeddings,
+        chunk_tokens: int = 300,
+        batch_size: int = 64,
+        max_file_bytes: int = 100_000,
+        project: str = "",
+    ):
+        self.index_path = index_path
+        self.embeddings = embeddings
+        self.project = project
+        self.batch_size = batch_size
+        self.max_file_bytes = max_file_bytes
+        self.text_splitter = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_tokens, chunk_overlap=0, length_function=estimate_tokens
+        )
+        self.model = getattr(embeddings, "model", "")
+        self.vectorstore: Optional[FAISS] = None
+        # Ids of the chunks of each blob, including blobs without chunks
+        self.blobs: Dict[str, List[str]] = {}
+        self.load()
+
+    @property
+    def blobs_path(self) -> str:
+        return os.path.join(self.index_path, "blobs.json")
+
+    def load(self) -> None:
+        if not os.path.isfile(self.blobs_path):
+            return
+        with open(self.blobs_path, encoding="utf_8") as f:
+            state = json.load(f)
+        # Vectors of another embedding model cannot be mixed, and the index of
+        # another project may come from a cache shared with untrusted jobs
+        if state["model"] != self.model or state.get("project", "") != self.project:
+            return
+        if any(state["blobs"].values()):
+            self.vectorstore = FAISS.load_local(
+                self.index_path, self.embeddings, allow_dangerous_deserialization=True
+            )
+        self.blobs = state["blobs"]
+
+    def save(self) -> None:
+        os.makedirs(self.index_path, exist_ok=True)
+        if self.vectorstore is not None:
+            self.vectorstore.save_local(self.index_path)
+        with open(self.blobs_path, mode="w", encoding="utf_8") as f:
+            json.dump(
+                {"project": self.project, "model": self.model, "blobs": self.blobs}, f
+            )
+
+    def update(self, repo_path: str = ".", tree: str = "HEAD") -> Dict[str, int]:
+        """Index the files of the tree, and return the numbers of changed blobs."""
+        blobs = list_blobs(tree, repo_path, self.max_file_bytes)
+        removed_shas = [sha for sha in self.blobs if sha not in blobs]
+        removed_ids = [
+            chunk_id for sha in removed_shas for chunk_id in self.blobs.pop(sha)
+        ]
+        if removed_ids and self.vectorstore is not None:
+            self.vectorstore.delete(removed_ids)
+
+        # A renamed or copied file has the same blob, only its path changes
+        if self.vectorstore is not None:
+            for sha, chunk_ids in self.blobs.items():
+                for chunk_id in chunk_ids:
+                    doc = self.vectorstore.docstore.search(chunk_id)
+                    if isinstance(doc, Document):
+                        doc.metadata["file_path"] = blobs[sha]
+
+        added_shas = [sha for sha in blobs if sha not in self.blobs]
+        chunks: List[Tuple[str, str, Dict[str, Any]]] = []
+        for i in range(0, len(added_shas), self.batch_size):
+            contents = read_blobs(added_shas[i : i + self.batch_size], repo_path)
+            for sha, content in contents.items():
+                self.blobs[sha] = []
+                # Binary files are not indexed
+                if b"\0" in content:
+                    continue
+                text = content.decode("utf_8", errors="replace")
+                for j, chunk in enumerate(self.text_splitter.split_text(text)):
+                    chunk_id = f"{sha}:{j}"
+                    self.blobs[sha].append(chunk_id)
+                    chunks.append(
+                        (chunk_id, chunk, {"file_path": blobs[sha], "blob": sha})
+                    )
+                while len(chunks) >= self.batch_size:
+                    self._add(chunks[: self.batch_size])
+                    chunks = chunks[self.batch_size :]
+        if chunks:
+            self._add(chunks)
+        self.save()
+        return {"added": len(added_shas), "removed": len(removed_shas)}
+
+    def _add(self, chunks: List[Tuple[str, str, Dict[str, Any]]]) -> None:
+        # One call of the embeddings for a batch of chunks
+        ids = [chunk_id for chunk_id, _, _ in chunks]
+        texts = [text for _, text, _ in chunks]
+        metadatas = [metadata for _, _, metadata in chunks]
+        vectors = self.embeddings.embed_documents(texts)
+        if self.vectorstore is None:
+            self.vectorstore = FAISS.from_embeddings(
+                list(zip(texts, vectors)), self.embeddings, metadatas, ids
+            )
+        else:
+            self.vectorstore.add_embeddings(list(zip(texts, vectors)), metadatas, ids)
+
+    def search(
+        self, query: str, k: int = 4, exclude_path: Optional[str] = None
+    ) -> List[Document]:
+        if self.vectorstore is None or not query.strip():
+            return []
+        return self.vectorstore.similarity_search(
+            query,
+            k=k,
+            filter=lambda metadata: metadata["file_path"] != exclude_path,
+            fetch_k=5 * k,
+        )
+
+
+def get_diff_query(diff_content: str, max_chars: int = 2000) -> str:
+    # The code after the change, without the headers and the deleted lines
+    lines = [
+        line[1:]
+        for line in diff_content.splitlines()
+        if line[:1] in ("+", " ") and not line.startswith("+++ ")
+    ]
+    return "\n".join(lines)[:max_chars]
+
+
+def format_repository_context(docs: List[Document]) -> str:
+    if not docs:
+        return "なし"
+    return "\n".join(
+        REPOSITORY_CONTEXT.format(
+            file_path=doc.metadata["file_path"], content=doc.page_content
+        )
+        for doc in docs
+    )
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Any, List
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import Generation
+
+
+class JsonObjectOutputParser(JsonOutputParser):
+    """Parse a JSON object from the output of the LLM.
+
+    Besides a bare object or one in a markdown code block, an object
+    surrounded by other text is also accepted.
+    """
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        try:
+            output = super().parse_result(result, partial=partial)
+        except OutputParserException:
+            # Retry with the outermost braces, e.g. "Here is the JSON: {...}"
+            text = result[0].text
+            start, end = text.find("{"), text.rfind("}")
+            if start < 0 or end < start:
+                raise
+            output = super().parse_result([Generation(text=text[start : end + 1])])
+        if not partial and not isinstance(output, dict):
+            raise OutputParserException(f"Expected a JSON object: {output}")
+        return output
+
+
+class JsonKeysOutputParser(JsonObjectOutputParser):
+    """Parse a JSON object which must have the given keys with string values."""
+
+    keys: List[str]
+
+    def parse_result(self, result: List[Generation], *, partial: bool = False) -> Any:
+        output = super().parse_result(result, partial=partial)
+        if partial:
+            return output
+        for key in self.keys:
+            if not isinstance(output.get(key), str):
+                raise OutputParserException(f"Missing string value of '{key}'")
+        return {key: output[key] for key in self.keys}
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+TEMPLATE_CODE_SUMMARY = """あなたは優秀なプログラマーです。
+以下に示すコードの差分を元に、簡単に要約してください。
+要約は、レビュー担当者がこの変更で何が行われたかをより迅速かつ簡単に理解できるような文章にしてください。
+
+要約は、完全に客観的なものに限定し、意見や提案は含みません。
+要約の例は次の通りです。:
+```このdiffには関数`create_database`,`delete_database`に変更があり、
+これらの関数にパラメータ`force`が追加されています。```
+
+ファイル{name}のコードの差分は、次の通りです。:
+```{language}
+{content}
+```
+"""
+
+TEMPLATE_CODE_REVIEW = """あなたは優秀なプログラマーかつコードレビュー担当者です。
+以下に示すコードの差分を元に、コードレビューしてください。
+また、コードの変更が正しいかどうかを確認して、編集者に対して提案を行ってください。
+
+ファイル{name}のコードの差分は、次の通りです。:
+```{language}
+{content}
+```
+"""
+
+TEMPLATE_CODE_REVIEW_CONTEXT = """あなたは優秀なプログラマーかつコードレビュー担当者です。
+以下に示すコードの差分を元に、コードレビューしてください。
+また、コードの変更が正しいかどうかを確認して、編集者に対して提案を行ってください。
+リポジトリ内の関連するコードも参考にし、呼び出し元や既存の実装との整合性も確認してください。
+
+ファイル{name}のコードの差分は、次の通りです。:
+```{language}
+{content}
+```
+
+リポジトリ内の関連するコードは、次の通りです。:
+{context}
+"""
+
+TEMPLATE_MR_SUMMARY = """あなたは優秀なプログラマーです。
+コードレビュー担当者がプルリクエスト(PR)の内容を素早く把握するために、以下のPRについての情報を提供してください。
+
+提供していただきたい項目は次の通りです。
+- このPRの変更内容を記述してください。
+- このPRの目的を記述してください。
+- このPRを次に示す属性の一つに分類してください。:feature, fix, refactor, perf, test, doc, ci, style, chore
+  分類は、回答の最後の行に「分類: fix」のように属性のみを記述してください。
+
+以下はこのPRに関する情報です。:
+PRのタイトル: {title}
+PRの説明: {description}
+
+以下は変更されたファイルとその変更内容の要約です。:
+```text
+{code_summaries}
+```
+"""
+
+TEMPLATE_CODE_SUMMARY_REDUCE = """あなたは優秀なプログラマーです。
+ファイル{name}のコードの差分は大きいため、分割して要約しました。
+以下に示す部分ごとの要約を元に、ファイル全体の変更の要約を一つにまとめてください。
+
+要約は、完全に客観的なものに限定し、意見や提案は含みません。
+
+部分ごとの要約は、次の通りです。:
+```text
+{content}
+```
+"""
+
+TEMPLATE_CODE_REVIEW_REDUCE = """あなたは優秀なプログラマーかつコードレビュー担当者です。
+ファイル{name}のコードの差分は大きいため、分割してコードレビューしました。
+以下に示す部分ごとのコードレビューを元に、ファイル全体のコードレビューを一つにまとめてください。
+重複する指摘はまとめ、重要な指摘から順に記述してください。
+
+部分ごとのコードレビューは、次の通りです。:
+```text
+{content}
+```
+"""
+
+TEMPLATE_CODE_SUMMARY_REVIEW = """あなたは優秀なプログラマーかつコードレビュー担当者です。
+以下に示すコードの差分を元に、変更の要約とコードレビューを作成してください。
+
+要約は、レビュー担当者がこの変更で何が行われたかをより迅速かつ簡単に理解できるような文章にしてください。
+要約は、完全に客観的なものに限定し、意見や提案は含みません。
+コードレビューでは、コードの変更が正しいかどうかを確認して、編集者に対して提案を行ってください。
+
+回答は、次の形式のJSONのみとし、それ以外の文章は含めないでください。:
+{{"summary": "変更の要約", "review": "コードレビュー"}}
+
+ファイル{name}のコードの差分は、次の通りです。:
+```{language}
+{content}
+```
+"""
+
+TEMPLATE_CODE_SUMMARY_REVIEW_PACK = """あなたは優秀なプログラマーかつコードレビュー担当者です。
+以下に示す複数のファイルのコードの差分を元に、ファイルごとに変更の要約とコードレビューを作成してください。
+
+要約は、レビュー担当者がこの変更で何が行われたかをより迅速かつ簡単に理解できるような文章にしてください。
+要約は、完全に客観的なものに限定し、意見や提案は含みません。
+コードレビューでは、コードの変更が正しいかどうかを確認して、編集者に対して提案を行ってください。
+
+回答は、次の形式のJSONのみとし、それ以外の文章は含めないでください。
+"file_path"には、各ファイルのパスをそのまま記述してください。:
+{{"files": [{{"file_path": "ファイルのパス", "summary": "変更の要約", "review": "コードレビュー"}}]}}
+
+各ファイルのコードの差分は、次の通りです。:
+{files}
+"""
+
+TEMPLATE_DIRECTORY_SUMMARY = """あなたは優秀なプログラマーです。
+以下は、ディレクトリ{directory}で変更されたファイルとその変更内容の要約です。
+これらを元に、このディレクトリでの変更内容を簡潔に要約してください。
+
+要約は、完全に客観的なものに限定し、意見や提案は含みません。
+
+変更されたファイルとその変更内容の要約は、次の通りです。:
+```text
+{code_summaries}
+```
+"""
+
+# Templates with the diff first, so that the summary and the review of a file
+# share the prompt prefix, and Ollama reuses its KV cache for the review
+TEMPLATE_CODE_DIFF = """ファイル{name}のコードの差分は、次の通りです。:
+```{language}
+{content}
+```
+"""
+
+TEMPLATE_CODE_SUMMARY_PREFIXED = (
+    TEMPLATE_CODE_DIFF
+    + """
+あなたは優秀なプログラマーです。
+上に示したコードの差分を元に、簡単に要約してください。
+要約は、レビュー担当者がこの変更で何が行われたかをより迅速かつ簡単に理解できるような文章にしてください。
+
+要約は、完全に客観的なものに限定し、意見や提案は含みません。
+要約の例は次の通りです。:
+```このdiffには関数`create_database`,`delete_database`に変更があり、
+これらの関数にパラメータ`force`が追加されています。```
+"""
+)
+
+TEMPLATE_CODE_REVIEW_PREFIXED = (
+    TEMPLATE_CODE_DIFF
+    + """
+あなたは優秀なプログラマーかつコードレビュー担当者です。
+上に示したコードの差分を元に、コードレビューしてください。
+また、コードの変更が正しいかどうかを確認して、編集者に対して提案を行ってください。
+"""
+)
+
+TEMPLATE_CODE_REVIEW_CONTEXT_PREFIXED = (
+    TEMPLATE_CODE_DIFF
+    + """
+リポジトリ内の関連するコードは、次の通りです。:
+{context}
+
+あなたは優秀なプログラマーかつコードレビュー担当者です。
+上に示したコードの差分を元に、コードレビューしてください。
+また、コードの変更が正しいかどうかを確認して、編集者に対して提案を行ってください。
+リポジトリ内の関連するコードも参考にし、呼び出し元や既存の実装との整合性も確認してください。
+"""
+)
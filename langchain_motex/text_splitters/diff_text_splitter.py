@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+from typing import Any, List
+
+import unidiff
+from langchain_text_splitters import TextSplitter
+
+from langchain_motex.utils.token_utils import estimate_tokens
+
+
+class DiffTextSplitter(TextSplitter):
+    """Split a unified diff of a file into chunks of whole hunks.
+
+    Hunks are packed into a chunk until ``chunk_size`` tokens, and every
+    chunk starts with the file header of the diff. A hunk larger than
+    ``chunk_size`` is split by lines under a copy of its hunk header.
+    """
+
+    def __init__(self, chunk_size: int = 1500, **kwargs: Any):
+        kwargs.setdefault("length_function", estimate_tokens)
+        super().__init__(chunk_size=chunk_size, chunk_overlap=0, **kwargs)
+
+    def split_text(self, text: str) -> List[str]:
+        if self._fits(text):
+            return [text]
+        patch = unidiff.PatchSet(io.StringIO(text))[0]
+        header = f"--- {patch.source_file}\n+++ {patch.target_file}\n"
+
+        chunks = []
+        chunk = ""
+        for hunk in patch:
+            for part in self._split_hunk(hunk, header):
+                if chunk and not self._fits(header + chunk + part):
+                    chunks.append(header + chunk)
+                    chunk = ""
+                chunk += part
+        if chunk:
+            chunks.append(header + chunk)
+        return chunks
+
+    def _fits(self, text: str) -> bool:
+        return self._length_function(text) <= self._chunk_size
+
+    def _split_hunk(self, hunk: unidiff.Hunk, header: str) -> List[str]:
+        hunk_text = str(hunk)
+        if self._fits(header + hunk_text):
+            return [hunk_text]
+
+        # Split the large hunk by lines
+        hunk_header = hunk_text.splitlines(keepends=True)[0]
+        parts = []
+        part = hunk_header
+        for line in hunk:
+            line_text = str(line)
+            if part != hunk_header and not self._fits(header + part + line_text):
+                parts.append(part)
+                part = hunk_header
+            part += line_text
+        parts.append(part)
+        return parts
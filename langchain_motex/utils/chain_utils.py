@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import inspect
+from concurrent.futures import ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+from langchain_text_splitters import TextSplitter
+
+
+def sequential_chains(chains: Dict[str, Runnable]) -> Runnable:
+    """Build a runnable that invokes the chains one after another.
+
+    The output of each chain is stored under its key in the returned dict.
+    """
+
+    def _invoke(doc: Document) -> Dict[str, Any]:
+        outputs = {}
+        for key, chain in chains.items():
+            outputs[key] = chain.invoke(doc)
+        return outputs
+
+    async def _ainvoke(doc: Document) -> Dict[str, Any]:
+        outputs = {}
+        for key, chain in chains.items():
+            outputs[key] = await chain.ainvoke(doc)
+        return outputs
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
+
+
+def map_reduce_chain(
+    map_chain: Runnable, reduce_chain: Runnable, text_splitter: TextSplitter
+) -> Runnable:
+    """Build a runnable that splits a document before invoking the chain.
+
+    A document that fits in one chunk is passed to ``map_chain`` as is.
+    Otherwise ``map_chain`` is invoked on each chunk in turn, and the joined
+    outputs are passed to ``reduce_chain`` as the content of the document.
+    """
+
+    def _invoke(doc: Document) -> Any:
+        chunks = text_splitter.split_documents([doc])
+        if len(chunks) <= 1:
+            return map_chain.invoke(doc)
+        outputs = []
+        for i, chunk in enumerate(chunks):
+            output = map_chain.invoke(chunk)
+            outputs.append(f"### {i + 1}/{len(chunks)}\n{output}")
+        return reduce_chain.invoke(
+            Document(page_content="\n\n".join(outputs), metadata=doc.metadata)
+        )
+
+    async def _ainvoke(doc: Document) -> Any:
+        chunks = text_splitter.split_documents([doc])
+        if len(chunks) <= 1:
+            return await map_chain.ainvoke(doc)
+        outputs = []
+        for i, chunk in enumerate(chunks):
+            output = await map_chain.ainvoke(chunk)
+            outputs.append(f"### {i + 1}/{len(chunks)}\n{output}")
+        return await reduce_chain.ainvoke(
+            Document(page_content="\n\n".join(outputs), metadata=doc.metadata)
+        )
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
+
+
+class _TextStreamingHandler(BaseCallbackHandler):
+    def __init__(self, on_text: Callable[[str], None]):
+        self.on_text = on_text
+        self.text = ""
+
+    def on_llm_start(self, *args: Any, **kwargs: Any) -> None:
+        self.text = ""
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.text = ""
+
+    def on_llm_new_token(self, token: str, **kwargs: Any) -> None:
+        self.text += token
+        self.on_text(self.text)
+
+
+def streaming_chain(
+    chain: Runnable, on_text: Callable[[Document, str], None]
+) -> Runnable:
+    """Build a runnable that reports the output of the LLM while it is generated.
+
+    ``on_text`` is called with the document and the text generated so far
+    on every new token. Outputs from the LLM cache are not reported.
+    """
+
+    def _invoke(doc: Document) -> Any:
+        handler = _TextStreamingHandler(lambda text: on_text(doc, text))
+        return chain.invoke(doc, config={"callbacks": [handler]})
+
+    async def _ainvoke(doc: Document) -> Any:
+        handler = _TextStreamingHandler(lambda text: on_text(doc, text))
+        return await chain.ainvoke(doc, config={"callbacks": [handler]})
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
+
+
+def invoke_chains(
+    chain: Runnable,
+    docs: Iterable[Document],
+    max_concurrency: int = 1,
+    on_finish: Optional[Callable[[Document], None]] = None,
+) -> List[Document]:
+    """Invoke the chain on every document with a bounded pool of workers.
+
+    The chain must return a dict, which is merged into the metadata of the
+    document it was invoked on. If the chain raises, the error message is
+    stored in ``metadata["error"]`` and the other documents are processed
+    as usual. The same goes for an error raised by ``on_finish``. The
+    documents are returned in the order they were given.
+    """
+
+    def _invoke(doc: Document) -> Document:
+        try:
+            doc.metadata.update(chain.invoke(doc))
+        except Exception as e:
+            doc.metadata["error"] = f"{type(e).__name__}: {e}"
+        if on_finish is not None:
+            try:
+                on_finish(doc)
+            except Exception as e:
+                doc.metadata["error"] = f"{type(e).__name__}: {e}"
+        return doc
+
+    with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+        futures = [executor.submit(_invoke, doc) for doc in docs]
+        return [future.result() for future in futures]
+
+
+async def ainvoke_chains(
+    chain: Runnable,
+    docs: AsyncIterable[Document],
+    max_concurrency: int = 1,
+    on_finish: Optional[Callable[[Document], Union[Awaitable[None], None]]] = None,
+    queue_size: int = 0,
+) -> List[Document]:
+    """Asynchronous counterpart of invoke_chains as a pipeline of stages.
+
+    A producer takes the documents from ``docs``, ``max_concurrency``
+    workers invoke the chain, and a consumer passes the results to
+    ``on_finish``. The stages are connected by bounded queues, so fetching,
+    LLM calls and write-back overlap without buffering every document.
+    A synchronous ``on_finish`` is run in a thread, so that its blocking
+    calls do not stall the event loop.
+    """
+    max_concurrency = max(1, max_concurrency)
+    queue_size = queue_size or 2 * max_concurrency
+    inputs: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    outputs: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+    ordered_docs: List[Document] = []
+
+    async def _produce() -> None:
+        async for doc in docs:
+            ordered_docs.append(doc)
+            await inputs.put(doc)
+        for _ in range(max_concurrency):
+            await inputs.put(None)
+
+    async def _work() -> None:
+        while (doc := await inputs.get()) is not None:
+            try:
+                doc.metadata.update(await chain.ainvoke(doc))
+            except Exception as e:
+                doc.metadata["error"] = f"{type(e).__name__}: {e}"
+            await outputs.put(doc)
+
+    async def _consume() -> None:
+        while (doc := await outputs.get()) is not None:
+            if on_finish is None:
+                continue
+            try:
+                if inspect.iscoroutinefunction(on_finish):
+                    await on_finish(doc)
+                else:
+                    result = await asyncio.to_thread(on_finish, doc)
+                    if inspect.isawaitable(result):
+                        await result
+            except Exception as e:
+                doc.metadata["error"] = f"{type(e).__name__}: {e}"
+
+    consumer = asyncio.create_task(_consume())
+    await asyncio.gather(_produce(), *(_work() for _ in range(max_concurrency)))
+    await outputs.put(None)
+    await consumer
+    return ordered_docs
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import posixpath
+from typing import AsyncIterable, AsyncIterator, Dict, Iterable, List, Tuple
+
+import unidiff
+from langchain_core.documents import Document
+
+
+def get_hunk_fingerprint(hunk: unidiff.Hunk, file_path: str) -> str:
+    # Only the changed lines without whitespaces, line numbers and the paths
+    names = [file_path, posixpath.basename(file_path)]
+    stem = posixpath.splitext(names[1])[0]
+    if len(stem) >= 3:
+        names.append(stem)
+    lines = []
+    for line in hunk:
+        if not (line.is_added or line.is_removed):
+            continue
+        text = "".join(line.value.split())
+        for name in names:
+            text = text.replace(name, "")
+        lines.append(line.line_type + text)
+    return hashlib.sha256("\n".join(lines).encode("utf_8")).hexdigest()
+
+
+class HunkDeduplicator:
+    """Review the hunks repeated across files only once.
+
+    ``dedup`` returns a document for each group of hunks with the same
+    fingerprint in ``min_files`` files or more, followed by the documents
+    of the files without those hunks. A file consisting only of repeated
+    hunks is not returned. After the documents are invoked, ``attribute``
+    gives the summaries of the groups to their files and returns every
+    file in the original order.
+
+    A hunk is known to be repeated only when every diff is loaded, so
+    ``dedup`` and ``adedup`` collect all the documents before returning
+    the first one. With the deduplication, loading the diffs no longer
+    overlaps with the LLM calls.
+    """
+
+    def __init__(self, min_files: int = 2):
+        self.min_files = min_files
+        self.docs: List[Document] = []
+        self.groups: Dict[str, Document] = {}
+
+    def dedup(self, docs: Iterable[Document]) -> List[Document]:
+        self.docs = list(docs)
+        doc_hunks: Dict[int, List[Tuple[str, unidiff.Hunk]]] = {}
+        files: Dict[str, Dict[int, Document]] = {}
+        for doc in self.docs:
+            try:
+                patch = unidiff.PatchSet(io.StringIO(doc.page_content))[0]
+            except (unidiff.UnidiffParseError, IndexError):
+                continue
+            doc_hunks[id(doc)] = []
+            for hunk in patch:
+                fingerprint = get_hunk_fingerprint(hunk, doc.metadata["file_path"])
+                doc_hunks[id(doc)].append((fingerprint, hunk))
+                files.setdefault(fingerprint, {})[id(doc)] = doc
+
+        # Documents of the groups, from the hunk of the first file
+        for fingerprint, group_docs in files.items():
+            if len(group_docs) < self.min_files:
+                continue
+            first_doc = next(iter(group_docs.values()))
+            hunk = dict(doc_hunks[id(first_doc)])[fingerprint]
+            header = "".join(first_doc.page_content.splitlines(keepends=True)[:2])
+            self.groups[fingerprint] = Document(
+                page_content=header + str(hunk),
+                metadata={
+                    key: value
+                    for key, value in first_doc.metadata.items()
+                    if not key.startswith("dedup_")
+                }
+                | {
+                    "diff_status": "modify",
+                    "add_count": hunk.added,
+                    "delete_count": hunk.removed,
+                    # Tells the group apart from the documents of its first file
+                    "dedup_group": fingerprint,
+                    "dedup_files": [
+                        doc.metadata["file_path"] for doc in group_docs.values()
+                    ],
+                },
+            )
+            for doc in group_docs.values():
+                doc.metadata.setdefault("dedup_groups", []).append(fingerprint)
+
+        # Documents of the files without the hunks of the groups
+        unique_docs = []
+        for doc in self.docs:
+            fingerprints = doc.metadata.get("dedup_groups")
+            if not fingerprints:
+                unique_docs.append(doc)
+                continue
+            unique_hunks = [
+                str(hunk)
+                for fingerprint, hunk in doc_hunks[id(doc)]
+                if fingerprint not in fingerprints
+            ]
+            if not unique_hunks:
+                doc.metadata["dedup_covered"] = True
+                continue
+            header = "".join(doc.page_content.splitlines(keepends=True)[:2])
+            unique_docs.append(
+                Document(
+                    page_content=header + "".join(unique_hunks),
+                    metadata=doc.metadata | {"dedup_document": doc},
+                )
+            )
+        return list(self.groups.values()) + unique_docs
+
+    async def adedup(self, docs: AsyncIterable[Document]) -> AsyncIterator[Document]:
+        # Every diff is fetched before the first group can be known
+        for doc in self.dedup([doc async for doc in docs]):
+            yield doc
+
+    def attribute(self, reviewed_docs: Iterable[Document]) -> List[Document]:
+        # Copy the results of the documents of the unique hunks to their files
+        for reviewed_doc in reviewed_docs:
+            doc = reviewed_doc.metadata.get("dedup_document")
+            if doc is not None:
+                for key in ("summary", "review", "error", "skipped", "triage"):
+                    if key in reviewed_doc.metadata:
+                        doc.metadata[key] = reviewed_doc.metadata[key]
+
+        for doc in self.docs:
+            groups = [self.groups[fp] for fp in doc.metadata.get("dedup_groups", [])]
+            if not groups:
+                continue
+            summaries = [doc.metadata.get("summary", "")]
+            summaries += [group.metadata.get("summary", "") for group in groups]
+            doc.metadata["summary"] = "\n".join(filter(None, summaries))
+            # A file is not fully reviewed when one of its groups failed, so
+            # that the incremental review tries it again
+            for group in groups:
+                if "error" in group.metadata:
+                    doc.metadata.setdefault("error", group.metadata["error"])
+            if not doc.metadata.get("dedup_covered"):
+                continue
+            for group in groups:
+                if "skipped" in group.metadata:
+                    doc.metadata["skipped"] = group.metadata["skipped"]
+            doc.metadata.setdefault(
+                "review",
+                "共通の変更のみのため、"
+                + "、".join(
+                    f"{len(group.metadata['dedup_files'])}ファイルに適用される変更"
+                    for group in groups
+                )
+                + "のレビューを参照してください。",
+            )
+        return self.docs
+
+    def get_groups(self) -> List[Document]:
+        return list(self.groups.values())
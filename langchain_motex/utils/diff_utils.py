@@ -0,0 +1,306 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# A compact model of a unified diff, and a renderer sending fewer tokens to
+# the models: the unchanged context is trimmed, long blocks of added or
+# deleted lines are collapsed, and trailing whitespaces are stripped.
+# The rendered diff is still a valid unified diff.
+
+import os
+import re
+from typing import Dict, List, Optional
+
+HUNK_HEADER = re.compile(r"^@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@ ?(.*)$")
+# Printed by git and GitLab instead of the hunks of a binary file
+BINARY_DIFF = re.compile(r"^(Binary files .* differ|GIT binary patch)$", re.MULTILINE)
+
+
+class DiffLine:
+    __slots__ = ("line_type", "value")
+
+    def __init__(self, line_type: str, value: str):
+        # " " (context), "+" (added) or "-" (deleted)
+        self.line_type = line_type
+        self.value = value
+
+
+class DiffHunk:
+    __slots__ = (
+        "source_start",
+        "source_length",
+        "target_start",
+        "target_length",
+        "section_header",
+        "lines",
+    )
+
+    def __init__(
+        self,
+        source_start: int,
+        source_length: int,
+        target_start: int,
+        target_length: int,
+        section_header: str = "",
+        lines: Optional[List[DiffLine]] = None,
+    ):
+        self.source_start = source_start
+        self.source_length = source_length
+        self.target_start = target_start
+        self.target_length = target_length
+        self.section_header = section_header
+        self.lines = lines if lines is not None else []
+
+    @property
+    def added(self) -> int:
+        return sum(1 for line in self.lines if line.line_type == "+")
+
+    @property
+    def removed(self) -> int:
+        return sum(1 for line in self.lines if line.line_type == "-")
+
+    def __str__(self) -> str:
+        # Like git, the length is omitted when it is 1
+        header = "@@ -{}{} +{}{} @@".format(
+            self.source_start,
+            f",{self.source_length}" if self.source_length != 1 else "",
+            self.target_start,
+            f",{self.target_length}" if self.target_length != 1 else "",
+        )
+        if self.section_header:
+            header += " " + self.section_header
+        return "\n".join(
+            [header] + [line.line_type + line.value for line in self.lines]
+        )
+
+
+class FileDiff:
+    """The hunks of the diff of a file, parsed from the diff of GitLab."""
+
+    __slots__ = ("old_path", "new_path", "hunks")
+
+    def __init__(self, old_path: str, new_path: str, hunks: List[DiffHunk]):
+        self.old_path = old_path
+        self.new_path = new_path
+        self.hunks = hunks
+
+    @classmethod
+    def parse(cls, old_path: str, new_path: str, diff: str) -> "FileDiff":
+        hunks: List[DiffHunk] = []
+        # Not splitlines(), which also splits a line on a form feed and the
+        # other line boundaries allowed in the code
+        lines = diff.split("\n")
+        if lines[-1] == "":
+            lines.pop()
+        for line in lines:
+            match = HUNK_HEADER.match(line)
+            if match:
+                source_start, source_length, target_start, target_length = (
+                    int(value) if value is not None else 1
+                    for value in match.group(1, 2, 3, 4)
+                )
+                hunks.append(
+                    DiffHunk(
+                        source_start,
+                        source_length,
+                        target_start,
+                        target_length,
+                        match.group(5),
+                    )
+                )
+            elif hunks and line[:1] in (" ", "+", "-"):
+                hunks[-1].lines.append(DiffLine(line[0], line[1:]))
+            elif hunks and line == "":
+                # An empty context line whose space has been stripped
+                hunks[-1].lines.append(DiffLine(" ", ""))
+            # "\ No newline at end of file" and the other lines are dropped
+        return cls(old_path, new_path, hunks)
+
+    @property
+    def added(self) -> int:
+        return sum(hunk.added for hunk in self.hunks)
+
+    @property
+    def removed(self) -> int:
+        return sum(hunk.removed for hunk in self.hunks)
+
+    @property
+    def status(self) -> str:
+        # Same as unidiff with the paths in the header of the diff
+        if (
+            len(self.hunks) == 1
+            and self.hunks[0].source_start == 0
+            and self.hunks[0].source_length == 0
+        ):
+            return "add"
+        if (
+            len(self.hunks) == 1
+            and self.hunks[0].target_start == 0
+            and self.hunks[0].target_length == 0
+        ):
+            return "delete"
+        if self.old_path != self.new_path:
+            return "rename"
+        return "modify"
+
+    def header(self) -> str:
+        return f"--- a/{self.old_path}\n+++ b/{self.new_path}\n"
+
+    def __str__(self) -> str:
+        return self.header() + "".join(str(hunk) + "\n" for hunk in self.hunks)
+
+
+def is_binary_diff(diff: str) -> bool:
+    return BINARY_DIFF.search(diff) is not None
+
+
+def get_render_options() -> Dict[str, int]:
+    return {
+        "context_lines": int(os.getenv("CODEREV_CONTEXT_LINES", "2")),
+        "max_deleted_lines": int(os.getenv("CODEREV_MAX_DELETED_LINES", "20")),
+        "max_added_lines": int(os.getenv("CODEREV_MAX_ADDED_LINES", "0")),
+    }
+
+
+def strip_whitespace_changes(lines: List[DiffLine]) -> List[DiffLine]:
+    """Strip the trailing whitespaces of the lines.
+
+    A block of deleted lines followed by the same added lines, but for the
+    trailing whitespaces, becomes context.
+    """
+    lines = [DiffLine(line.line_type, line.value.rstrip()) for line in lines]
+    result: List[DiffLine] = []
+    i = 0
+    while i < len(lines):
+        if lines[i].line_type != "-":
+            result.append(lines[i])
+            i += 1
+            continue
+        j = i
+        while j < len(lines) and lines[j].line_type == "-":
+            j += 1
+        k = j
+        while k < len(lines) and lines[k].line_type == "+":
+            k += 1
+        deleted = [line.value for line in lines[i:j]]
+        added = [line.value for line in lines[j:k]]
+        if deleted == added:
+            result.extend(DiffLine(" ", value) for value in deleted)
+        else:
+            result.extend(lines[i:k])
+        i = k
+    return result
+
+
+def collapse_block(
+    lines: List[DiffLine], line_type: str, max_lines: int
+) -> List[DiffLine]:
+    """Keep the head and the tail of a block longer than ``max_lines``."""
+    if max_lines <= 0 or len(lines) <= max_lines:
+        return lines
+    head = (max_lines + 1) // 2
+    tail = max_lines - head
+    word = "追加" if line_type == "+" else "削除"
+    marker = DiffLine(line_type, f"... ({len(lines) - max_lines}行の{word}を省略)")
+    return lines[:head] + [marker] + (lines[-tail:] if tail else [])
+
+
+def render_hunk(
+    hunk: DiffHunk,
+    context_lines: int = 2,
+    max_deleted_lines: int = 20,
+    max_added_lines: int = 0,
+) -> List[DiffHunk]:
+    """Render a hunk as hunks with at most ``context_lines`` lines of context.
+
+    The context far from the changes splits the hunk. The blocks of added
+    (deleted) lines longer than ``max_added_lines`` (``max_deleted_lines``)
+    are collapsed, unless the value is 0.
+    """
+    lines = strip_whitespace_changes(hunk.lines)
+
+    # Line numbers of each line in the old and the new file
+    numbers = []
+    # An empty side of a hunk starts at the line before it
+    source_line = hunk.source_start + (hunk.source_length == 0)
+    target_line = hunk.target_start + (hunk.target_length == 0)
+    for line in lines:
+        numbers.append((source_line, target_line))
+        if line.line_type != "+":
+            source_line += 1
+        if line.line_type != "-":
+            target_line += 1
+
+    # Keep the changes, and the context close to them
+    changed = [i for i, line in enumerate(lines) if line.line_type != " "]
+    keep = [False] * len(lines)
+    for i in changed:
+        for j in range(
+            max(0, i - context_lines), min(len(lines), i + context_lines + 1)
+        ):
+            keep[j] = True
+
+    hunks: List[DiffHunk] = []
+    i = 0
+    while i < len(lines):
+        if not keep[i]:
+            i += 1
+            continue
+        j = i
+        while j < len(lines) and keep[j]:
+            j += 1
+        rendered: List[DiffLine] = []
+        k = i
+        while k < j:
+            line_type = lines[k].line_type
+            m = k
+            while m < j and lines[m].line_type == line_type:
+                m += 1
+            block = lines[k:m]
+            if line_type == "+":
+                block = collapse_block(block, "+", max_added_lines)
+            elif line_type == "-":
+                block = collapse_block(block, "-", max_deleted_lines)
+            rendered.extend(block)
+            k = m
+        source_start, target_start = numbers[i]
+        source_length = sum(1 for line in rendered if line.line_type != "+")
+        target_length = sum(1 for line in rendered if line.line_type != "-")
+        if source_length == 0:
+            source_start -= 1
+        if target_length == 0:
+            target_start -= 1
+        hunks.append(
+            DiffHunk(
+                source_start,
+                source_length,
+                target_start,
+                target_length,
+                hunk.section_header if not hunks else "",
+                rendered,
+            )
+        )
+        i = j
+    return hunks
+
+
+def render_diff(
+    file_diff: FileDiff,
+    context_lines: int = 2,
+    max_deleted_lines: int = 20,
+    max_added_lines: int = 0,
+) -> str:
+    """Render the diff of a file for the prompts.
+
+    The diff is returned unchanged if it has no change left, e.g. when only
+    trailing whitespaces are changed, so that it is triaged as before.
+    """
+    hunks = [
+        rendered
+        for hunk in file_diff.hunks
+        for rendered in render_hunk(
+            hunk, context_lines, max_deleted_lines, max_added_lines
+        )
+    ]
+    if not hunks:
+        return str(file_diff)
+    return str(FileDiff(file_diff.old_path, file_diff.new_path, hunks))
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import re
+import subprocess
+from typing import Any, Dict, Iterator, List
+
+import unidiff
+
+from langchain_motex.utils.gitlab_utils import get_diff
+
+GIT_DIFF_OPTIONS = ["--no-color", "--no-ext-diff", "--find-renames"]
+GIT_DIFF_HEADER = re.compile(r"^diff --git a/(.*) b/(.*)$", re.MULTILINE)
+GIT_DIFF_MODE = re.compile(
+    r"^(old|new|new file|deleted file) mode (\d+)$", re.MULTILINE
+)
+
+
+def run_git(args: List[str], repo_path: str = ".") -> str:
+    result = subprocess.run(
+        ["git", "-c", "core.quotepath=false", *args],
+        cwd=repo_path,
+        capture_output=True,
+        check=True,
+        encoding="utf_8",
+        errors="replace",
+    )
+    return result.stdout
+
+
+def has_commit(sha: str, repo_path: str = ".") -> bool:
+    # Shallow clones of CI jobs may not have the base of the changes
+    try:
+        run_git(["cat-file", "-e", f"{sha}^{{commit}}"], repo_path)
+    except (OSError, subprocess.CalledProcessError):
+        return False
+    return True
+
+
+def get_merge_base(base_sha: str, head_sha: str, repo_path: str = ".") -> str:
+    return run_git(["merge-base", base_sha, head_sha], repo_path).strip()
+
+
+def iter_diffs_git(
+    base_sha: str, head_sha: str, repo_path: str = "."
+) -> Iterator[Dict[str, Any]]:
+    """Yield the diffs between the commits in the format of get_diff.
+
+    The output of ``git diff`` is read file by file, and each file is
+    converted to the fields of a diff of the GitLab API.
+    """
+    process = subprocess.Popen(
+        [
+            "git",
+            "-c",
+            "core.quotepath=false",
+            "diff",
+            *GIT_DIFF_OPTIONS,
+            base_sha,
+            head_sha,
+        ],
+        cwd=repo_path,
+        stdout=subprocess.PIPE,
+        encoding="utf_8",
+        errors="replace",
+    )
+    lines: List[str] = []
+    for line in process.stdout:
+        if line.startswith("diff --git ") and lines:
+            yield get_diff_git("".join(lines))
+            lines = []
+        lines.append(line)
+    if lines:
+        yield get_diff_git("".join(lines))
+    if process.wait() != 0:
+        raise subprocess.CalledProcessError(process.returncode, process.args)
+
+
+def get_diff_git(diff_content: str) -> Dict[str, Any]:
+    patch_set = unidiff.PatchSet(diff_content)
+    if not patch_set:
+        # Nothing but the header, as for a change of mode with older unidiff
+        match = GIT_DIFF_HEADER.search(diff_content)
+        if match is None:
+            raise ValueError(f"Not a diff of git: {diff_content[:80]!r}")
+        return get_diff(
+            {
+                "old_path": match.group(1),
+                "new_path": match.group(2),
+                "diff": "",
+                **_get_modes(diff_content),
+            }
+        )
+    patch = patch_set[0]
+    old_path = patch.source_file
+    new_path = patch.target_file
+    # Like GitLab, added and deleted files have the same old and new paths
+    if old_path == "/dev/null":
+        old_path = new_path
+    if new_path == "/dev/null":
+        new_path = old_path
+    if patch.is_binary_file:
+        diff = f"Binary files {patch.source_file} and {patch.target_file} differ\n"
+    else:
+        diff = "".join(str(hunk) for hunk in patch)
+    return get_diff(
+        {
+            "old_path": _strip_prefix(old_path),
+            "new_path": _strip_prefix(new_path),
+            "diff": diff,
+            **_get_modes(str(patch.patch_info or "")),
+        }
+    )
+
+
+def _get_modes(header: str) -> Dict[str, str]:
+    # Like GitLab, the mode of the missing side of an added or deleted file is "0"
+    modes = {}
+    for kind, mode in GIT_DIFF_MODE.findall(header):
+        if kind == "new file":
+            modes.update(a_mode="0", b_mode=mode)
+        elif kind == "deleted file":
+            modes.update(a_mode=mode, b_mode="0")
+        else:
+            modes["a_mode" if kind == "old" else "b_mode"] = mode
+    return modes
+
+
+def _strip_prefix(path: str) -> str:
+    return path[2:] if path[:2] in ("a/", "b/") else path
+
+
+def list_blobs(
+    tree: str = "HEAD", repo_path: str = ".", max_size: int = 100_000
+) -> Dict[str, str]:
+    # Map the blob SHAs of the regular files up to max_size bytes to their paths
+    blobs = {}
+    for line in run_git(
+        ["ls-tree", "-r", "-l", "--full-tree", tree], repo_path
+    ).splitlines():
+        info, path = line.split("\t", 1)
+        mode, object_type, sha, size = info.split()
+        if object_type != "blob" or mode == "120000" or int(size) > max_size:
+            continue
+        blobs.setdefault(sha, path)
+    return blobs
+
+
+def read_blobs(shas: List[str], repo_path: str = ".") -> Dict[str, bytes]:
+    # Read the contents of many blobs by one process of git cat-file
+    result = subprocess.run(
+        ["git", "cat-file", "--batch"],
+        cwd=repo_path,
+        input="".join(sha + "\n" for sha in shas).encode("utf_8"),
+        capture_output=True,
+        check=True,
+    )
+    contents = {}
+    output = result.stdout
+    position = 0
+    for sha in shas:
+        end = output.index(b"\n", position)
+        header = output[position:end].split()
+        position = end + 1
+        if header[-1] == b"missing":
+            continue
+        size = int(header[2])
+        contents[sha] = output[position : position + size]
+        position += size + 1
+    return contents
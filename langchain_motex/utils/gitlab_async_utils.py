@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import httpx
+from langchain_core.documents import Document
+
+from langchain_motex.utils.gitlab_utils import DIFFS_PER_PAGE, GitlabContext, get_diff
+
+
+class AsyncGitlabContext:
+    """Asynchronous counterpart of GitlabContext built on httpx.
+
+    It shares the ids of the run with the given GitlabContext, and counts its
+    requests in ``api_calls`` of the GitlabContext.
+    """
+
+    def __init__(self, gitlab_context: GitlabContext, max_connections: int = 10):
+        self.gitlab_context = gitlab_context
+        self.project_id = gitlab_context.project_id
+        self.merge_request_iid = gitlab_context.merge_request_iid
+        self.commit_sha = gitlab_context.commit_sha
+        self._merge_request: Optional[Dict[str, Any]] = None
+
+        gitlab_client = gitlab_context.gitlab_client
+        headers = dict(gitlab_client.headers)
+        if gitlab_client.oauth_token:
+            headers["Authorization"] = f"Bearer {gitlab_client.oauth_token}"
+        elif gitlab_client.private_token:
+            headers["PRIVATE-TOKEN"] = gitlab_client.private_token
+        elif gitlab_client.job_token:
+            headers["JOB-TOKEN"] = gitlab_client.job_token
+        self.client = httpx.AsyncClient(
+            base_url=gitlab_client.api_url,
+            headers=headers,
+            limits=httpx.Limits(max_connections=max_connections),
+            event_hooks={"response": [self._count_api_call]},
+            timeout=60,
+        )
+
+    async def _count_api_call(self, response: httpx.Response) -> None:
+        self.gitlab_context.count_api_call(response)
+
+    async def __aenter__(self) -> "AsyncGitlabContext":
+        return self
+
+    async def __aexit__(self, *args: Any) -> None:
+        await self.client.aclose()
+
+    @property
+    def project_path(self) -> str:
+        return f"/projects/{self.project_id}"
+
+    @property
+    def merge_request_path(self) -> str:
+        return f"{self.project_path}/merge_requests/{self.merge_request_iid}"
+
+    async def get(self, path: str, **params: Any) -> httpx.Response:
+        response = await self.client.get(path, params=params)
+        response.raise_for_status()
+        return response
+
+    async def merge_request(self) -> Dict[str, Any]:
+        if self._merge_request is None:
+            response = await self.get(self.merge_request_path)
+            self._merge_request = response.json()
+        return self._merge_request
+
+    async def paginate(self, path: str, **params: Any) -> AsyncIterator[Any]:
+        # Follow the pages of GitLab until X-Next-Page is empty
+        page = "1"
+        while page:
+            response = await self.get(path, page=page, **params)
+            for item in response.json():
+                yield item
+            page = response.headers.get("X-Next-Page", "")
+
+
+async def aget_body_merge_request(
+    async_gitlab_context: AsyncGitlabContext,
+) -> Dict[str, Any]:
+    body = await async_gitlab_context.merge_request()
+    return {
+        "title": body["title"],
+        "description": body["description"],
+        "author": {"name": body["author"]["name"]},
+    }
+
+
+async def aiter_diffs_merge_request(
+    async_gitlab_context: AsyncGitlabContext,
+) -> AsyncIterator[Dict[str, Any]]:
+    # Page through the diffs of merge request (GitLab 15.7 or later)
+    path = f"{async_gitlab_context.merge_request_path}/diffs"
+    diffs = async_gitlab_context.paginate(path, per_page=DIFFS_PER_PAGE)
+    try:
+        first_diff = await anext(diffs)
+    except StopAsyncIteration:
+        return
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            raise
+        diff_refs = (await async_gitlab_context.merge_request())["diff_refs"]
+        for diff in await aget_diffs_compare(
+            async_gitlab_context, diff_refs["base_sha"], diff_refs["head_sha"]
+        ):
+            yield diff
+        return
+    yield get_diff(first_diff)
+    async for diff in diffs:
+        yield get_diff(diff)
+
+
+async def aiter_diffs_commit(
+    async_gitlab_context: AsyncGitlabContext, commit_sha: str
+) -> AsyncIterator[Dict[str, Any]]:
+    path = f"{async_gitlab_context.project_path}/repository/commits/{commit_sha}/diff"
+    async for diff in async_gitlab_context.paginate(path, per_page=DIFFS_PER_PAGE):
+        yield get_diff(diff)
+
+
+async def aget_diffs_compare(
+    async_gitlab_context: AsyncGitlabContext, from_sha: str, to_sha: str
+) -> List[Dict[str, Any]]:
+    path = f"{async_gitlab_context.project_path}/repository/compare"
+    response = await async_gitlab_context.get(path, **{"from": from_sha, "to": to_sha})
+    return [get_diff(diff) for diff in response.json()["diffs"]]
+
+
+async def aiter_documents(
+    body: Dict[str, Any], diffs: AsyncIterator[Dict[str, Any]]
+) -> AsyncIterator[Document]:
+    async for diff in diffs:
+        metadata = body | diff
+        metadata.pop("diff_content")
+        yield Document(page_content=diff["diff_content"], metadata=metadata)
+
+
+async def aiter_documents_merge_request(
+    async_gitlab_context: AsyncGitlabContext,
+) -> AsyncIterator[Document]:
+    body = await aget_body_merge_request(async_gitlab_context)
+    diffs = aiter_diffs_merge_request(async_gitlab_context)
+    async for doc in aiter_documents(body, diffs):
+        yield doc
+
+
+async def aiter_documents_commit(
+    async_gitlab_context: AsyncGitlabContext,
+    commit_sha: str,
+    base_sha: Optional[str] = None,
+) -> AsyncIterator[Document]:
+    body = await aget_body_merge_request(async_gitlab_context)
+    if base_sha is None:
+        diffs = aiter_diffs_commit(async_gitlab_context, commit_sha)
+    else:
+        diffs = _aiter(
+            await aget_diffs_compare(async_gitlab_context, base_sha, commit_sha)
+        )
+    async for doc in aiter_documents(body, diffs):
+        yield doc
+
+
+async def _aiter(items: List[Any]) -> AsyncIterator[Any]:
+    for item in items:
+        yield item
@@ -1,26 +1,130 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import io
+import base64
+import binascii
 import json
 import mimetypes
 import os
 import re
-from typing import Any, Dict, List, Tuple
+import threading
+import time
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
 
-import unidiff
+import requests
 from dotenv import load_dotenv
-from gitlab import Gitlab
+from gitlab import Gitlab, GitlabHttpError
+from gitlab.v4.objects import Project, ProjectCommit, ProjectMergeRequest
 from langchain_core.documents import Document
 
-
-def get_gitlab_client() -> Tuple[Gitlab, int, int, str]:
-    # Load environment variables
+from langchain_motex.utils.diff_utils import (
+    FileDiff,
+    get_render_options,
+    is_binary_diff,
+    render_diff,
+)
+from langchain_motex.utils.token_utils import estimate_tokens
+
+REVIEW_STATE_MARKER = "coderev:review-state"
+DIFFS_PER_PAGE = 50
+SUMMARY_SECTION_START = "<!-- coderev:summary:start -->"
+SUMMARY_SECTION_END = "<!-- coderev:summary:end -->"
+MR_TYPE_PATTERN = r"\b(feature|fix|refactor|perf|test|doc|ci|style|chore)\b"
+# Line of the classification requested at the end of the MR summary
+MR_TYPE_LINE_PATTERN = r"^\s*分類\s*[:：]\s*" + MR_TYPE_PATTERN + r"\s*$"
+
+
+class MergeRequestNotFoundError(Exception):
+    """The commit has no open merge request to review."""
+
+
+class GitlabContext:
+    """GitLab session of a run with memoized project, merge request and commits.
+
+    All requests go through one pooled HTTP session, and the number of the
+    requests is counted in ``api_calls``.
+    """
+
+    def __init__(
+        self,
+        gitlab_client: Gitlab,
+        project_id: int,
+        merge_request_iid: int,
+        commit_sha: str,
+    ):
+        self.gitlab_client = gitlab_client
+        self.project_id = project_id
+        self.merge_request_iid = merge_request_iid
+        self.commit_sha = commit_sha
+        self.api_calls = 0
+        self._project: Optional[Project] = None
+        self._merge_request: Optional[ProjectMergeRequest] = None
+        self._commits: Dict[str, ProjectCommit] = {}
+        self._user_id: Optional[int] = None
+        self._lock = threading.RLock()
+        gitlab_client.session.hooks["response"].append(self.count_api_call)
+
+    def count_api_call(self, response: requests.Response, *args, **kwargs) -> None:
+        with self._lock:
+            self.api_calls += 1
+
+    @property
+    def project(self) -> Project:
+        with self._lock:
+            if self._project is None:
+                self._project = self.gitlab_client.projects.get(self.project_id)
+            return self._project
+
+    @property
+    def merge_request(self) -> ProjectMergeRequest:
+        with self._lock:
+            if self._merge_request is None:
+                self._merge_request = self.project.mergerequests.get(
+                    self.merge_request_iid
+                )
+            return self._merge_request
+
+    def commit(self, commit_sha: str) -> ProjectCommit:
+        with self._lock:
+            if commit_sha not in self._commits:
+                self._commits[commit_sha] = self.project.commits.get(commit_sha)
+            return self._commits[commit_sha]
+
+    @property
+    def user_id(self) -> int:
+        # The user of the token, who writes the notes of the review
+        with self._lock:
+            if self._user_id is None:
+                self.gitlab_client.auth()
+                self._user_id = self.gitlab_client.user.id
+            return self._user_id
+
+
+def get_gitlab_session(
+    pool_maxsize: int = 10, adapter: Optional[requests.adapters.HTTPAdapter] = None
+) -> requests.Session:
+    # Keep the connections alive and share them between the threads
+    session = requests.Session()
+    if adapter is None:
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_maxsize)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_gitlab_context(
+    project_id: Optional[int] = None,
+    merge_request_iid: Optional[int] = None,
+    commit_sha: Optional[str] = None,
+    adapter: Optional[requests.adapters.HTTPAdapter] = None,
+) -> GitlabContext:
+    # Load environment variables, unless the job is given, e.g. by a webhook
     gitlab_url = os.getenv("CI_SERVER_URL", "https://gitlab.com/")
     oauth_token = os.getenv("GITLAB_PERSONAL_ACCESS_TOKEN", "")
-    project_id = os.getenv("CI_PROJECT_ID", "")
-    commit_sha = os.getenv("CI_COMMIT_SHA", "")
-    merge_request_iid = os.getenv("CI_MERGE_REQUEST_IID", "")
+    project_id = project_id or os.getenv("CI_PROJECT_ID", "")
+    commit_sha = commit_sha or os.getenv("CI_COMMIT_SHA", "")
+    merge_request_iid = merge_request_iid or os.getenv("CI_MERGE_REQUEST_IID", "")
 
     # Initialize the GitLab client
     gitlab_client = Gitlab(
@@ -29,62 +133,73 @@ def get_gitlab_client() -> Tuple[Gitlab, int, int, str]:
         # private_token=os.getenv('"GITLAB_PROJECT_ACCESS_TOKEN', ''),
         oauth_token=oauth_token,
         api_version=4,
+        session=get_gitlab_session(adapter=adapter),
     )
-
-    # Get the current project
-    project = gitlab_client.projects.get(project_id)
+    gitlab_context = GitlabContext(gitlab_client, int(project_id), 0, commit_sha)
 
     # [DEBUG] Get the current commit from merge request
     if commit_sha == "":
-        merge_request = project.mergerequests.get(merge_request_iid)
-        commit = merge_request.commits().next()
-        commit_sha = commit.attributes["id"]
-    # Get the current commit
-    commit = project.commits.get(commit_sha)
+        gitlab_context.merge_request_iid = int(merge_request_iid)
+        commit = gitlab_context.merge_request.commits().next()
+        gitlab_context.commit_sha = commit.attributes["id"]
 
     # If not merge request pipelines,
     # Get the latest merge request iid from commit sha
     if merge_request_iid == "":
+        commit = gitlab_context.commit(gitlab_context.commit_sha)
         merge_requests = commit.merge_requests(
             state="opened", order_by="updated_at", sort="desc"
         )
-        if merge_requests.count == 0:
-            exit()
+        if len(merge_requests) == 0:
+            raise MergeRequestNotFoundError(
+                f"No open merge request has the commit {gitlab_context.commit_sha}"
+            )
         merge_request_iid = merge_requests[0]["iid"]
-    # Get the latest merge request
-    merge_request = project.mergerequests.get(merge_request_iid)
-    return (gitlab_client, int(project_id), int(merge_request_iid), commit_sha)
+    gitlab_context.merge_request_iid = int(merge_request_iid)
+    return gitlab_context
 
 
-def get_documents_merge_request(
-    gitlab_client: Gitlab, project_id: int, merge_request_iid: int
-) -> List[Document]:
-    body = get_body_merge_request(gitlab_client, project_id, merge_request_iid)
-    diffs = get_diffs_merge_request(gitlab_client, project_id, merge_request_iid)
-    docs = []
-    for diff in diffs:
-        metadata = body | diff
-        metadata.pop("diff_content")
-        doc = Document(page_content=diff["diff_content"], metadata=metadata)
-        docs.append(doc)
-    return docs
+def get_documents_merge_request(gitlab_context: GitlabContext) -> List[Document]:
+    return list(iter_documents_merge_request(gitlab_context))
 
 
 def get_documents_commit(
-    gitlab_client: Gitlab, project_id: int, merge_request_iid: int, commit_sha: str
+    gitlab_context: GitlabContext, commit_sha: str, base_sha: Optional[str] = None
 ) -> List[Document]:
-    body = get_body_merge_request(gitlab_client, project_id, merge_request_iid)
-    diffs = get_diffs_commit(gitlab_client, project_id, commit_sha)
-    docs = []
+    return list(iter_documents_commit(gitlab_context, commit_sha, base_sha))
+
+
+def iter_documents_merge_request(gitlab_context: GitlabContext) -> Iterator[Document]:
+    body = get_body_merge_request(gitlab_context)
+    diffs = iter_diffs_merge_request(gitlab_context)
+    return iter_documents(body, diffs)
+
+
+def iter_documents_commit(
+    gitlab_context: GitlabContext, commit_sha: str, base_sha: Optional[str] = None
+) -> Iterator[Document]:
+    body = get_body_merge_request(gitlab_context)
+    if base_sha is None:
+        diffs = iter_diffs_commit(gitlab_context, commit_sha)
+    else:
+        diffs = iter(get_diffs_compare(gitlab_context, base_sha, commit_sha))
+    return iter_documents(body, diffs)
+
+
+def iter_documents(
+    body: Dict[str, Any], diffs: Iterator[Dict[str, Any]]
+) -> Iterator[Document]:
     for diff in diffs:
         metadata = body | diff
         metadata.pop("diff_content")
-        doc = Document(page_content=diff["diff_content"], metadata=metadata)
-        docs.append(doc)
-    return docs
+        yield Document(page_content=diff["diff_content"], metadata=metadata)
 
 
-def get_document_code_summaries(docs: List[Document]) -> Document:
+def get_document_code_summaries(
+    docs: List[Document], body: Optional[Dict[str, Any]] = None
+) -> Document:
+    # The title and the description are taken from the documents, or from
+    # ``body`` of the merge request when no file has been reviewed
     code_summaries = ""
     for doc in docs:
         if doc.metadata["diff_status"] not in ["add", "modify"]:
@@ -98,21 +213,18 @@ def get_document_code_summaries(docs: List[Document]) -> Document:
             diff_summary=doc.metadata["summary"],
         )
 
+    metadata = docs[0].metadata if docs else body or {}
     return Document(
         page_content=code_summaries,
         metadata={
-            "title": docs[0].metadata["title"] or "",
-            "description": docs[0].metadata["description"] or "",
+            "title": metadata.get("title") or "",
+            "description": metadata.get("description") or "",
         },
     )
 
 
-def get_body_merge_request(
-    gitlab_client: Gitlab, project_id: int, merge_request_iid: int
-) -> Dict[str, Any]:
-    project = gitlab_client.projects.get(project_id)
-    merge_request = project.mergerequests.get(merge_request_iid)
-    body = merge_request.attributes
+def get_body_merge_request(gitlab_context: GitlabContext) -> Dict[str, Any]:
+    body = gitlab_context.merge_request.attributes
     return {
         "title": body["title"],
         "description": body["description"],
@@ -121,74 +233,92 @@ def get_body_merge_request(
     }
 
 
-def get_diffs_merge_request(
-    gitlab_client: Gitlab, project_id: int, merge_request_iid: int
+def get_diffs_merge_request(gitlab_context: GitlabContext) -> List[Dict[str, Any]]:
+    # Get diffs from the base of merge request to its latest commit, so that
+    # the changes of the first commit are included
+    diff_refs = gitlab_context.merge_request.diff_refs
+    return get_diffs_compare(
+        gitlab_context, diff_refs["base_sha"], diff_refs["head_sha"]
+    )
+
+
+def get_diffs_commit(
+    gitlab_context: GitlabContext, commit_sha: str
 ) -> List[Dict[str, Any]]:
-    project = gitlab_client.projects.get(project_id)
-    merge_request = project.mergerequests.get(merge_request_iid)
+    return list(iter_diffs_commit(gitlab_context, commit_sha))
 
-    # Get commits of merge request
-    commit_list = merge_request.commits()
-    latest_commit = commit_list.next()
 
-    # Get the sha of the latest/oldest commit
-    latest_commit_sha = latest_commit.attributes["id"]
-    for commit in commit_list:
-        oldest_commit_sha = commit.attributes["id"]
+def iter_diffs_merge_request(gitlab_context: GitlabContext) -> Iterator[Dict[str, Any]]:
+    # Page through the diffs of merge request (GitLab 15.7 or later)
+    path = (
+        f"/projects/{gitlab_context.project_id}"
+        f"/merge_requests/{gitlab_context.merge_request_iid}/diffs"
+    )
+    try:
+        diffs = gitlab_context.gitlab_client.http_list(
+            path, iterator=True, per_page=DIFFS_PER_PAGE
+        )
+    except GitlabHttpError as e:
+        if e.response_code != 404:
+            raise
+        return iter(get_diffs_merge_request(gitlab_context))
+    return iter_diffs(diffs)
 
-    # Get diffs from the oldest commit to the latest commit
-    diffs = project.repository_compare(oldest_commit_sha, latest_commit_sha)
-    return get_diffs(diffs["diffs"])
 
+def iter_diffs_commit(
+    gitlab_context: GitlabContext, commit_sha: str
+) -> Iterator[Dict[str, Any]]:
+    # Page through the diffs of commit without fetching the commit itself
+    commit = gitlab_context.project.commits.get(commit_sha, lazy=True)
+    diffs = commit.diff(iterator=True, per_page=DIFFS_PER_PAGE)
+    return iter_diffs(diffs)
 
-def get_diffs_commit(
-    gitlab_client: Gitlab, project_id: int, commit_sha: str
+
+def get_diffs_compare(
+    gitlab_context: GitlabContext, from_sha: str, to_sha: str
 ) -> List[Dict[str, Any]]:
-    project = gitlab_client.projects.get(project_id)
-    commit = project.commits.get(commit_sha)
-    diffs = commit.diff()
-    return get_diffs(diffs)
+    diffs = gitlab_context.project.repository_compare(from_sha, to_sha)
+    return get_diffs(diffs["diffs"])
 
 
-def get_diffs(diffs: Dict[str, Any]) -> List[Dict[str, Any]]:
+def get_diffs(diffs: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
     # Generate the list of the changed files
-    changed_files = []
+    return list(iter_diffs(diffs))
+
+
+def iter_diffs(diffs: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
     for diff in diffs:
-        # Set the old/new file path at the head of the diff
-        old_path = diff["old_path"]
-        new_path = diff["new_path"]
-        diff_content = f"""--- a/{old_path}\n+++ b/{new_path}\n{diff["diff"]}"""
-        diff_file = io.StringIO(diff_content)
-
-        # Analysis diff file
-        patch = unidiff.PatchSet(diff_file)[0]
-
-        # Get diff status
-        if patch.is_added_file:
-            diff_status = "add"
-        elif patch.is_removed_file:
-            diff_status = "delete"
-        elif patch.is_rename:
-            diff_status = "rename"
-        elif patch.is_modified_file:
-            diff_status = "modify"
-        else:
-            diff_status = "unknown"
-
-        # Get mime types
-        filetype = get_filetype(diff["new_path"])
-
-        # TODO: diff_contentは、一行ごとに配列で持たせたほうがいいかも...?
-        changed_file = {
-            "file_path": diff["new_path"],
-            "diff_status": diff_status,
-            "add_count": patch.added,
-            "delete_count": patch.removed,
-            "diff_content": diff_content,
-            "file_type": filetype,
-        }
-        changed_files.append(changed_file)
-    return changed_files
+        yield get_diff(diff)
+
+
+def get_diff(diff: Dict[str, Any]) -> Dict[str, Any]:
+    # Parse the hunks of the diff, with the old/new file path at the head
+    file_diff = FileDiff.parse(diff["old_path"], diff["new_path"], diff["diff"])
+    raw_content = f"{file_diff.header()}{diff['diff']}"
+
+    # Send the trimmed diff to the models
+    diff_content = render_diff(file_diff, **get_render_options())
+
+    # Get mime types
+    filetype = get_filetype(diff["new_path"])
+
+    # The mode is "0" on the missing side of an added or a deleted file
+    modes = (diff.get("a_mode"), diff.get("b_mode"))
+
+    return {
+        "file_path": diff["new_path"],
+        "diff_status": file_diff.status,
+        "add_count": file_diff.added,
+        "delete_count": file_diff.removed,
+        "diff_content": diff_content,
+        "file_type": filetype,
+        "binary": is_binary_diff(diff["diff"]),
+        # GitLab leaves out the diff of a file over its limits
+        "too_large": bool(diff.get("too_large") or diff.get("collapsed")),
+        "mode_changed": "0" not in modes and modes[0] != modes[1],
+        "raw_diff_tokens": estimate_tokens(raw_content),
+        "diff_tokens": estimate_tokens(diff_content),
+    }
 
 
 def get_filetype(filepath: str) -> str:
@@ -204,61 +334,219 @@ def get_filetype(filepath: str) -> str:
     return mime_type
 
 
-def comment_merge_request_note(
-    gitlab_client: Gitlab, project_id: int, merge_request_iid: int, comment: str
-) -> str:
-    project = gitlab_client.projects.get(project_id)
-    merge_request = project.mergerequests.get(merge_request_iid)
-    merge_request_note = merge_request.notes.create({"body": comment})
+def comment_merge_request_note(gitlab_context: GitlabContext, comment: str) -> str:
+    merge_request_note = gitlab_context.merge_request.notes.create({"body": comment})
     return merge_request_note.to_json()
 
 
+def dump_review_state(commit_sha: str, docs: List[Document]) -> str:
+    # Hide the reviewed sha and the results in a HTML comment of the note.
+    # The failed files are left out, so that they are reviewed again.
+    state = {
+        "sha": commit_sha,
+        "files": [
+            {
+                "file_path": doc.metadata["file_path"],
+                "diff_status": doc.metadata["diff_status"],
+                "summary": doc.metadata["summary"],
+                "review": doc.metadata["review"],
+            }
+            for doc in docs
+            if "error" not in doc.metadata
+        ],
+    }
+    payload = zlib.compress(json.dumps(state, ensure_ascii=False).encode("utf-8"))
+    return f"<!-- {REVIEW_STATE_MARKER} {base64.b64encode(payload).decode()} -->"
+
+
+def load_review_state(comment: str) -> Optional[Dict[str, Any]]:
+    match = re.search(REVIEW_STATE_MARKER + r" ([A-Za-z0-9+/=]+) -->", comment)
+    if match is None:
+        return None
+    try:
+        payload = zlib.decompress(base64.b64decode(match.group(1), validate=True))
+        state = json.loads(payload.decode("utf-8"))
+    except (binascii.Error, zlib.error, ValueError):
+        return None
+    if not isinstance(state, dict) or not {"sha", "files"} <= state.keys():
+        return None
+    return state
+
+
+def get_review_state_merge_request(
+    gitlab_context: GitlabContext,
+) -> Optional[Dict[str, Any]]:
+    # Find the latest note of the reviewer which has the state of the review,
+    # since the notes of the other users may fake it
+    notes = gitlab_context.merge_request.notes.list(
+        order_by="created_at", sort="desc", iterator=True
+    )
+    for note in notes:
+        if (note.attributes.get("author") or {}).get("id") != gitlab_context.user_id:
+            continue
+        state = load_review_state(note.attributes["body"] or "")
+        if state is not None:
+            return state
+    return None
+
+
+def merge_review_state(
+    review_state: Optional[Dict[str, Any]], docs: List[Document]
+) -> List[Document]:
+    # Carry over the results of the files which are not changed since the state
+    if review_state is None:
+        return docs
+    reviewed_docs = {doc.metadata["file_path"]: doc for doc in docs}
+    body = docs[0].metadata if docs else {}
+    merged_docs = []
+    for file in review_state["files"]:
+        doc = reviewed_docs.pop(file["file_path"], None)
+        if doc is None:
+            metadata = {
+                "title": body.get("title", ""),
+                "description": body.get("description", ""),
+                "author": body.get("author", {}),
+            }
+            metadata |= file
+            metadata["carried_over"] = True
+            doc = Document(page_content="", metadata=metadata)
+        merged_docs.append(doc)
+    merged_docs.extend(reviewed_docs.values())
+    return merged_docs
+
+
 def update_merge_request_body(
-    gitlab_client: Gitlab,
-    project_id: int,
-    merge_request_iid: int,
-    title: str,
-    description: str,
+    gitlab_context: GitlabContext, title: str, description: str
 ) -> str:
-    project = gitlab_client.projects.get(project_id)
-    merge_request = project.mergerequests.get(merge_request_iid)
-    # TODO: 以下のコードは動かない
-    # merge_request.attributes["title"] = title
-    # merge_request.attributes["description"] = description
-    # merge_request.save()
+    merge_request = gitlab_context.merge_request
+    # Attributes must be set on the object to be sent by save()
+    merge_request.title = title
+    merge_request.description = description
+    merge_request.save()
     return merge_request.to_json()
 
 
+def update_merge_request_summary(
+    gitlab_context: GitlabContext, summary: str, code_summaries: str
+) -> str:
+    # Replace the generated section of the description, or append it
+    merge_request = gitlab_context.merge_request
+    description = merge_request.attributes["description"] or ""
+    section = (
+        f"{SUMMARY_SECTION_START}\n## MR要約\n\n{summary}\n\n"
+        f"## コード要約\n\n{code_summaries}\n{SUMMARY_SECTION_END}"
+    )
+    pattern = re.escape(SUMMARY_SECTION_START) + ".*" + re.escape(SUMMARY_SECTION_END)
+    if re.search(pattern, description, flags=re.DOTALL):
+        description = re.sub(pattern, lambda _: section, description, flags=re.DOTALL)
+    else:
+        description = (description + "\n\n" + section).strip()
+
+    # Prefix the title with the type of the merge request, only if the
+    # summary has the classification line
+    title = merge_request.attributes["title"]
+    matches = re.findall(MR_TYPE_LINE_PATTERN, summary, flags=re.MULTILINE)
+    if matches and not re.match(MR_TYPE_PATTERN + ":", title):
+        title = f"{matches[-1]}: {title}"
+    return update_merge_request_body(gitlab_context, title, description)
+
+
+class ProgressiveNote:
+    """Note of the merge request edited in place while the review progresses.
+
+    A placeholder note is created up front, and the sections of the files
+    are rendered into it as they are updated. ``update`` only records the
+    section, since it is called from the callbacks of the streamed tokens,
+    and a background thread writes the latest sections at most once per
+    ``min_interval`` seconds. ``finish`` stops the thread and writes the
+    final body. A failed edit is reported and retried with the next one, so
+    that it never stops the review. ``on_save`` is given the seconds of
+    each edit of the thread.
+    """
+
+    def __init__(
+        self,
+        gitlab_context: GitlabContext,
+        header: str,
+        min_interval: float = 10,
+        on_save: Optional[Callable[[float], None]] = None,
+    ):
+        self.header = header
+        self.min_interval = min_interval
+        self.on_save = on_save
+        self.sections: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._updated = threading.Event()
+        self._finished = threading.Event()
+        self.note = gitlab_context.merge_request.notes.create(
+            {"body": header + "レビュー中です..."}
+        )
+        self._thread = threading.Thread(target=self._flush, daemon=True)
+        self._thread.start()
+
+    def update(self, key: str, section: str) -> None:
+        with self._lock:
+            self.sections[key] = section
+        self._updated.set()
+
+    def finish(self, body: str) -> str:
+        self._finished.set()
+        self._updated.set()
+        self._thread.join()
+        self._save(body)
+        return self.note.to_json()
+
+    def _flush(self) -> None:
+        while True:
+            self._updated.wait()
+            if self._finished.is_set():
+                return
+            self._updated.clear()
+            with self._lock:
+                body = self.header + "\n\n".join(self.sections.values())
+            started_at = time.monotonic()
+            if not self._save(body):
+                self._updated.set()
+            if self.on_save is not None:
+                self.on_save(time.monotonic() - started_at)
+            # The updates of the interval are written together by the next edit
+            self._finished.wait(self.min_interval)
+
+    def _save(self, body: str) -> bool:
+        self.note.body = body
+        try:
+            self.note.save()
+        except Exception as e:
+            print(f"Failed: updating the note: {type(e).__name__}: {e}")
+            return False
+        return True
+
+
 if __name__ == "__main__":
     if os.path.isfile(".env"):
         load_dotenv()
 
-    print("\033[32m" + "# " + get_gitlab_client.__name__ + "\033[0m")
-    (gitlab_client, project_id, merge_request_iid, commit_sha) = get_gitlab_client()
-    print("- project_id: " + str(project_id))
-    print("- merge_request_iid: " + str(merge_request_iid))
-    print("- commit_sha: " + str(commit_sha))
+    print("\033[32m" + "# " + get_gitlab_context.__name__ + "\033[0m")
+    gitlab_context = get_gitlab_context()
+    print("- project_id: " + str(gitlab_context.project_id))
+    print("- merge_request_iid: " + str(gitlab_context.merge_request_iid))
+    print("- commit_sha: " + str(gitlab_context.commit_sha))
     print()
 
     print("\033[32m" + "# " + get_body_merge_request.__name__ + "\033[0m")
-    merge_request_dict = get_body_merge_request(
-        gitlab_client, project_id, merge_request_iid
-    )
+    merge_request_dict = get_body_merge_request(gitlab_context)
     print()
 
     print("\033[32m" + "# " + get_diffs_merge_request.__name__ + "\033[0m")
-    merge_request_diffs = get_diffs_merge_request(
-        gitlab_client, project_id, merge_request_iid
-    )
+    merge_request_diffs = get_diffs_merge_request(gitlab_context)
     print(json.dumps(merge_request_diffs, indent=2))
     print()
 
     print("\033[32m" + "# " + get_diffs_commit.__name__ + "\033[0m")
-    diffs = get_diffs_commit(gitlab_client, project_id, commit_sha)
+    diffs = get_diffs_commit(gitlab_context, gitlab_context.commit_sha)
     print(json.dumps(diffs, indent=2))
 
     print("\033[32m" + "# " + update_merge_request_body.__name__ + "\033[0m")
-    body = update_merge_request_body(
-        gitlab_client, project_id, merge_request_iid, ":sparkles: 開発中", "開発中WIP"
-    )
+    body = update_merge_request_body(gitlab_context, ":sparkles: 開発中", "開発中WIP")
     print(json.dumps(body, indent=2))
+    print("- api_calls: " + str(gitlab_context.api_calls))
@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List
+
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+
+# Upper bounds (seconds) of the buckets of the latency histogram
+LATENCY_BUCKETS = [1, 2, 5, 10, 30, 60, 120, 300]
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile / 100))]
+
+
+def get_latency_histogram(latencies: List[float]) -> Dict[str, Any]:
+    if not latencies:
+        return {"count": 0}
+    buckets: Dict[str, int] = {}
+    for latency in latencies:
+        bound = next((b for b in LATENCY_BUCKETS if latency <= b), None)
+        key = f"<={bound}s" if bound is not None else f">{LATENCY_BUCKETS[-1]}s"
+        buckets[key] = buckets.get(key, 0) + 1
+    return {
+        "count": len(latencies),
+        "p50": get_percentile(latencies, 50),
+        "p90": get_percentile(latencies, 90),
+        "p99": get_percentile(latencies, 99),
+        "max": max(latencies),
+        "buckets": buckets,
+    }
+
+
+class RunReport:
+    """Wall time of the stages and the files of a run.
+
+    ``stage`` measures a block, and ``timed_iter`` the time spent in a lazy
+    loader, which overlaps the chains consuming it. The latency of each
+    file is added by ``timed_chain``.
+    """
+
+    def __init__(self) -> None:
+        self.started_at = time.monotonic()
+        self.stages: Dict[str, float] = {}
+        self.files: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_time(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, stage: str) -> Iterator[None]:
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.monotonic() - started_at)
+
+    def timed_iter(self, items: Iterable[Any], stage: str) -> Iterator[Any]:
+        iterator = iter(items)
+        while True:
+            with self.stage(stage):
+                item = next(iterator, StopIteration)
+            if item is StopIteration:
+                return
+            yield item
+
+    async def atimed_iter(
+        self, items: AsyncIterable[Any], stage: str
+    ) -> AsyncIterator[Any]:
+        iterator = aiter(items)
+        while True:
+            with self.stage(stage):
+                item = await anext(iterator, StopAsyncIteration)
+            if item is StopAsyncIteration:
+                return
+            yield item
+
+    def add_file(
+        self, file_path: str, seconds: float, error: bool, **values: Any
+    ) -> None:
+        with self._lock:
+            self.files.append(
+                {"file_path": file_path, "seconds": round(seconds, 3), "error": error}
+                | values
+            )
+
+    def summary(self, histogram: bool = False) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            "wall_time": round(time.monotonic() - self.started_at, 3),
+            "stages": {k: round(v, 3) for k, v in self.stages.items()},
+            "files": len(self.files),
+        }
+        if histogram:
+            summary["file_latency"] = get_latency_histogram(
+                [file["seconds"] for file in self.files]
+            )
+        return summary
+
+    def write(
+        self,
+        log_dir: str,
+        records: Iterable[Dict[str, Any]],
+        totals: Dict[str, Any],
+        histogram: bool = False,
+    ) -> None:
+        """Write the records of the calls and the files, and the summary."""
+        os.makedirs(log_dir, exist_ok=True)
+        with open(
+            os.path.join(log_dir, "run_report.jsonl"), mode="w", encoding="utf_8"
+        ) as f:
+            for record in records:
+                f.write(json.dumps({"type": "llm"} | record, ensure_ascii=False))
+                f.write("\n")
+            for file in self.files:
+                f.write(json.dumps({"type": "file"} | file, ensure_ascii=False))
+                f.write("\n")
+        with open(
+            os.path.join(log_dir, "run_report.json"), mode="w", encoding="utf_8"
+        ) as f:
+            json.dump(self.summary(histogram) | totals, f, ensure_ascii=False, indent=2)
+
+
+def timed_chain(chain: Runnable, report: RunReport) -> Runnable:
+    """Build a runnable that records the latency of each document.
+
+    The path of the document is given as ``file_path`` in the metadata of
+    the run, so that the LLM calls can be attributed to it.
+    """
+
+    def _get_config(doc: Document) -> Dict[str, Any]:
+        return {"metadata": {"file_path": doc.metadata.get("file_path")}}
+
+    def _get_values(doc: Document) -> Dict[str, Any]:
+        # Tokens of the diff before and after it is trimmed
+        return {
+            key: doc.metadata[key]
+            for key in ("raw_diff_tokens", "diff_tokens")
+            if key in doc.metadata
+        }
+
+    def _invoke(doc: Document) -> Dict[str, Any]:
+        started_at = time.monotonic()
+        failed = True
+        try:
+            output = chain.invoke(doc, config=_get_config(doc))
+            failed = False
+            return output
+        finally:
+            report.add_file(
+                doc.metadata.get("file_path", ""),
+                time.monotonic() - started_at,
+                failed,
+                **_get_values(doc),
+            )
+
+    async def _ainvoke(doc: Document) -> Dict[str, Any]:
+        started_at = time.monotonic()
+        failed = True
+        try:
+            output = await chain.ainvoke(doc, config=_get_config(doc))
+            failed = False
+            return output
+        finally:
+            report.add_file(
+                doc.metadata.get("file_path", ""),
+                time.monotonic() - started_at,
+                failed,
+                **_get_values(doc),
+            )
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
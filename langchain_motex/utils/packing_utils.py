@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+)
+
+from langchain_core.documents import Document
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from langchain_motex.utils.token_utils import estimate_tokens
+
+PACKED_FILE = """### ファイル: {file_path}
+```{file_type}
+{content}
+```
+"""
+
+
+def is_packed_document(doc: Document) -> bool:
+    return "documents" in doc.metadata
+
+
+def get_packed_document(docs: List[Document]) -> Document:
+    content = "\n".join(
+        PACKED_FILE.format(
+            file_path=doc.metadata["file_path"],
+            file_type=doc.metadata["file_type"],
+            content=doc.page_content,
+        )
+        for doc in docs
+    )
+    return Document(
+        page_content=content,
+        metadata={
+            "file_path": ", ".join(doc.metadata["file_path"] for doc in docs),
+            "documents": docs,
+        },
+    )
+
+
+class DocumentPacker:
+    """Group small documents into packed documents up to the token budget.
+
+    A document larger than a quarter of the budget, or one rejected by
+    ``can_pack``, is passed through as is. The documents of a pack are kept
+    in ``metadata["documents"]`` of the packed document.
+    """
+
+    def __init__(
+        self,
+        token_budget: int,
+        can_pack: Callable[[Document], bool] = lambda doc: True,
+    ):
+        self.token_budget = token_budget
+        self.can_pack = can_pack
+        self.pack: List[Document] = []
+        self.pack_tokens = 0
+
+    def add(self, doc: Document) -> List[Document]:
+        # Return the documents which are ready to be processed
+        tokens = estimate_tokens(doc.page_content)
+        if tokens > self.token_budget // 4 or not self.can_pack(doc):
+            return [doc]
+        ready_docs = []
+        if self.pack and self.pack_tokens + tokens > self.token_budget:
+            ready_docs = self.flush()
+        self.pack.append(doc)
+        self.pack_tokens += tokens
+        return ready_docs
+
+    def flush(self) -> List[Document]:
+        pack = self.pack
+        self.pack, self.pack_tokens = [], 0
+        if len(pack) <= 1:
+            return pack
+        return [get_packed_document(pack)]
+
+
+def pack_documents(
+    docs: Iterable[Document],
+    token_budget: int,
+    can_pack: Callable[[Document], bool] = lambda doc: True,
+) -> Iterator[Document]:
+    packer = DocumentPacker(token_budget, can_pack)
+    for doc in docs:
+        yield from packer.add(doc)
+    yield from packer.flush()
+
+
+async def apack_documents(
+    docs: AsyncIterable[Document],
+    token_budget: int,
+    can_pack: Callable[[Document], bool] = lambda doc: True,
+) -> AsyncIterator[Document]:
+    packer = DocumentPacker(token_budget, can_pack)
+    async for doc in docs:
+        for ready_doc in packer.add(doc):
+            yield ready_doc
+    for ready_doc in packer.flush():
+        yield ready_doc
+
+
+def unpack_documents(docs: Iterable[Document]) -> List[Document]:
+    unpacked_docs = []
+    for doc in docs:
+        if not is_packed_document(doc):
+            unpacked_docs.append(doc)
+            continue
+        for packed_doc in doc.metadata["documents"]:
+            for key in ("error", "skipped"):
+                if key in doc.metadata and "summary" not in packed_doc.metadata:
+                    packed_doc.metadata[key] = doc.metadata[key]
+            unpacked_docs.append(packed_doc)
+    return unpacked_docs
+
+
+def packed_chain(pack_chain: Runnable, chain: Runnable) -> Runnable:
+    """Build a runnable that summarizes and reviews a packed document at once.
+
+    ``pack_chain`` must return ``{"files": [{"file_path", "summary",
+    "review"}]}``. The results are stored in the metadata of the packed
+    documents, and a document missing from the results is passed to
+    ``chain`` on its own.
+    """
+
+    def _get_results(output: Optional[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        files = (output or {}).get("files", [])
+        return {
+            file["file_path"]: file
+            for file in files
+            if isinstance(file, dict)
+            and isinstance(file.get("file_path"), str)
+            and isinstance(file.get("summary"), str)
+            and isinstance(file.get("review"), str)
+        }
+
+    def _invoke(doc: Document) -> Dict[str, Any]:
+        try:
+            results = _get_results(pack_chain.invoke(doc))
+        except OutputParserException:
+            results = {}
+        for packed_doc in doc.metadata["documents"]:
+            result = results.get(packed_doc.metadata["file_path"])
+            try:
+                if result is None:
+                    packed_doc.metadata.update(chain.invoke(packed_doc))
+                else:
+                    packed_doc.metadata["summary"] = result["summary"]
+                    packed_doc.metadata["review"] = result["review"]
+            except Exception as e:
+                packed_doc.metadata["error"] = f"{type(e).__name__}: {e}"
+        return {}
+
+    async def _ainvoke(doc: Document) -> Dict[str, Any]:
+        try:
+            results = _get_results(await pack_chain.ainvoke(doc))
+        except OutputParserException:
+            results = {}
+        for packed_doc in doc.metadata["documents"]:
+            result = results.get(packed_doc.metadata["file_path"])
+            try:
+                if result is None:
+                    packed_doc.metadata.update(await chain.ainvoke(packed_doc))
+                else:
+                    packed_doc.metadata["summary"] = result["summary"]
+                    packed_doc.metadata["review"] = result["review"]
+            except Exception as e:
+                packed_doc.metadata["error"] = f"{type(e).__name__}: {e}"
+        return {}
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import math
+import re
+from typing import Any, Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from langchain_motex.utils.schedule_utils import get_category
+from langchain_motex.utils.token_utils import estimate_tokens
+
+# Keywords of branches, loops, exceptions and definitions in common languages
+CONTROL_FLOW_PATTERN = re.compile(
+    r"\b(if|elif|else|for|foreach|while|do|switch|case|match|try|except|catch"
+    r"|finally|raise|throw|return|yield|break|continue|goto|def|class|func"
+    r"|function|fn|lambda|async|await|with|defer|go|select)\b|=>|&&|\|\|"
+)
+# Lines only with a comment, or a literal optionally assigned to a name or key
+LITERAL_LINE_PATTERN = re.compile(
+    r"(#|//|/\*|\*|--|<!--).*"
+    r"|([\w.\[\]\"'-]+\s*[:=]\s*)?"
+    r"(\".*\"|'.*'|`.*`|[-+]?[\d_.]+|true|false|True|False|None|null|nil)?"
+    r"\s*[,;)\]}]*"
+)
+
+
+def get_changed_lines(diff_content: str) -> List[str]:
+    return [
+        line[1:]
+        for line in diff_content.splitlines()
+        if line[:1] in ("+", "-") and not line.startswith(("+++ ", "--- "))
+    ]
+
+
+def get_route_features(doc: Document) -> Dict[str, Any]:
+    changed_lines = get_changed_lines(doc.page_content)
+    return {
+        "tokens": estimate_tokens(doc.page_content),
+        "hunks": doc.page_content.count("\n@@ "),
+        "category": get_category(doc),
+        "control_flow": any(
+            CONTROL_FLOW_PATTERN.search(line) for line in changed_lines
+        ),
+        "literal_only": all(
+            LITERAL_LINE_PATTERN.fullmatch(line.strip()) for line in changed_lines
+        ),
+    }
+
+
+def get_complexity(features: Dict[str, Any]) -> float:
+    # Changes of configs, documents, strings and constants are simple
+    if features["category"] != "source" or features["literal_only"]:
+        return 0.0
+    complexity = math.log2(1 + features["tokens"] / 100)
+    complexity += 0.5 * max(0, features["hunks"] - 1)
+    if features["control_flow"]:
+        complexity += 2.0
+    return complexity
+
+
+class ModelRouter:
+    """Choose the model of a document from the complexity of its diff.
+
+    Documents up to ``threshold`` go to ``fast``, and the others to
+    ``strong``. Every decision is kept in ``decisions`` to tune the
+    threshold for throughput versus quality.
+    """
+
+    def __init__(
+        self, threshold: float = 4.0, fast: str = "fast", strong: str = "strong"
+    ):
+        self.threshold = threshold
+        self.fast = fast
+        self.strong = strong
+        self.decisions: List[Dict[str, Any]] = []
+
+    def select(self, doc: Document) -> str:
+        features = get_route_features(doc)
+        complexity = get_complexity(features)
+        model = self.fast if complexity <= self.threshold else self.strong
+        self.decisions.append(
+            {
+                "file_path": doc.metadata["file_path"],
+                "model": model,
+                "complexity": round(complexity, 3),
+                **features,
+            }
+        )
+        return model
+
+    def counts(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for decision in self.decisions:
+            counts[decision["model"]] = counts.get(decision["model"], 0) + 1
+        return counts
+
+
+def routing_chain(chain: Runnable, router: ModelRouter, fields: List[str]) -> Runnable:
+    """Build a runnable that invokes the chain with the model of the router.
+
+    The models of the chain must be configurable alternatives, and the
+    chosen key is set to each of the configurable ``fields``.
+    """
+
+    def _config(doc: Document) -> Dict[str, Any]:
+        model = router.select(doc)
+        return {"configurable": {field: model for field in fields}}
+
+    def _invoke(doc: Document) -> Any:
+        return chain.invoke(doc, config=_config(doc))
+
+    async def _ainvoke(doc: Document) -> Any:
+        return await chain.ainvoke(doc, config=_config(doc))
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
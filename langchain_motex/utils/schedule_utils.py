@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+import posixpath
+import re
+import threading
+import time
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+
+from langchain_motex.utils.gitlab_utils import get_filetype
+from langchain_motex.utils.token_utils import estimate_tokens
+
+# Weights of the kinds of files, source files are reviewed first
+CATEGORY_WEIGHTS = {"source": 4.0, "config": 2.0, "test": 1.5, "document": 1.0}
+CONFIG_FILE_TYPES = {"json", "toml", "yaml", "xml", "ini", "sh"}
+CONFIG_FILE_NAMES = {"Dockerfile", "Makefile", "requirements.txt", "setup.cfg"}
+DOCUMENT_FILE_TYPES = {"markdown", "text", "rst", "html", "csv"}
+TEST_PATH_PATTERN = re.compile(
+    r"(^|/)(tests?|specs?|__tests__)/"
+    r"|(^|/)test_[^/]*$|_test\.[^/]*$|\.(spec|test)\.[^/]*$"
+)
+
+
+def get_category(doc: Document) -> str:
+    file_path = doc.metadata["file_path"]
+    file_type = doc.metadata.get("file_type") or get_filetype(file_path)
+    if TEST_PATH_PATTERN.search(file_path):
+        return "test"
+    if (
+        file_type in CONFIG_FILE_TYPES
+        or posixpath.basename(file_path) in CONFIG_FILE_NAMES
+    ):
+        return "config"
+    if file_type in DOCUMENT_FILE_TYPES:
+        return "document"
+    return "source"
+
+
+def get_priority(doc: Document) -> float:
+    # The weight of the kind of file, scaled by the size of the change
+    changed_lines = doc.metadata["add_count"] + doc.metadata["delete_count"]
+    return CATEGORY_WEIGHTS[get_category(doc)] * (1 + math.log1p(changed_lines))
+
+
+class _ScheduleWindow:
+    # Heap of the documents waiting to be scheduled, the first one given
+    # wins the ties like in a stable sort
+    def __init__(self) -> None:
+        self.heap: List[Tuple[Tuple[float, int, int], Document]] = []
+        self.count = 0
+
+    def push(self, doc: Document) -> None:
+        key = (-get_priority(doc), -estimate_tokens(doc.page_content), self.count)
+        heapq.heappush(self.heap, (key, doc))
+        self.count += 1
+
+    def pop(self) -> Document:
+        return heapq.heappop(self.heap)[1]
+
+
+def schedule_documents(
+    docs: Iterable[Document], window: int = 32
+) -> Iterator[Document]:
+    """Order the documents by priority, then longest job first.
+
+    The priority grows with the size of the change, and ties are broken by
+    the estimated tokens of the diff, so the parallel workers start on the
+    longest jobs and finish with the short ones.
+
+    The documents are scheduled on the fly: at most ``window`` documents are
+    buffered, and the best of them is yielded for each new one, so the
+    reviews start before every diff is fetched. With a window as large as
+    the number of documents, they are fully sorted.
+    """
+    pending = _ScheduleWindow()
+    for doc in docs:
+        pending.push(doc)
+        if len(pending.heap) > window:
+            yield pending.pop()
+    while pending.heap:
+        yield pending.pop()
+
+
+async def aschedule_documents(
+    docs: AsyncIterable[Document], window: int = 32
+) -> AsyncIterator[Document]:
+    pending = _ScheduleWindow()
+    async for doc in docs:
+        pending.push(doc)
+        if len(pending.heap) > window:
+            yield pending.pop()
+    while pending.heap:
+        yield pending.pop()
+
+
+class Deadline:
+    """Time budget of the run, measured from its creation.
+
+    ``reserve`` seconds are kept for the steps after the reviews of the
+    files, e.g. the summary of the merge request and the note. The
+    deadline also expires at once when ``cancel_event`` is set.
+    """
+
+    def __init__(
+        self,
+        time_budget: float,
+        reserve: float = 60,
+        cancel_event: Optional[threading.Event] = None,
+    ):
+        self.time_budget = time_budget
+        self.reserve = reserve
+        self.cancel_event = cancel_event
+        self.started_at = time.monotonic()
+
+    def remaining(self) -> float:
+        return self.time_budget - (time.monotonic() - self.started_at)
+
+    def expired(self) -> bool:
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            return True
+        return self.remaining() <= self.reserve
+
+
+def deadline_chain(chain: Runnable, deadline: Deadline) -> Runnable:
+    """Build a runnable that skips the chain once the deadline is near.
+
+    A document dispatched after the deadline is returned with ``skipped``
+    instead of invoking the chain, so the results so far can be posted.
+    """
+
+    def _invoke(doc: Document) -> Dict[str, Any]:
+        if deadline.expired():
+            return {"skipped": True}
+        return chain.invoke(doc)
+
+    async def _ainvoke(doc: Document) -> Dict[str, Any]:
+        if deadline.expired():
+            return {"skipped": True}
+        return await chain.ainvoke(doc)
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
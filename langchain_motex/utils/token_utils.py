@@ -0,0 +1,8 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly 4 characters per token for ASCII, 1 token per character otherwise
+    ascii_count = sum(1 for char in text if char.isascii())
+    return (ascii_count + 3) // 4 + (len(text) - ascii_count)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import fnmatch
+import json
+import posixpath
+from typing import Any, Dict, List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.runnables import Runnable, RunnableLambda
+
+# A rule matches a document when all of the given conditions hold:
+# - globs: the file path (or its basename) matches one of the globs
+# - diff_status: the diff status is one of the statuses
+# - max_add_count / max_delete_count: the number of lines is at most the value
+# - min_changed_lines: the number of added and deleted lines is at least the value
+# - binary / too_large / mode_changed: the loader flagged the diff as a binary
+#   file / as left out by GitLab / as changing the file mode
+# - no_hunks / whitespace_only: the diff has no hunks / changes only whitespaces
+DEFAULT_TRIAGE_RULES: List[Dict[str, Any]] = [
+    {
+        "name": "deleted",
+        "diff_status": ["delete"],
+        "summary": "このファイルは削除されました。",
+        "review": "ファイルの削除のみのため、レビューを省略しました。",
+    },
+    {
+        "name": "renamed",
+        "diff_status": ["rename"],
+        "max_add_count": 0,
+        "max_delete_count": 0,
+        "summary": "このファイルは内容を変更せずに移動されました。",
+        "review": "ファイルの移動のみのため、レビューを省略しました。",
+    },
+    {
+        "name": "binary",
+        "binary": True,
+        "summary": "このファイルはバイナリファイルです。",
+        "review": "バイナリファイルのため、レビューを省略しました。",
+    },
+    {
+        "name": "too_large",
+        "too_large": True,
+        "summary": "このファイルの差分は大きすぎるため、GitLabから取得できませんでした。",
+        "review": "差分が大きすぎるため、レビューを省略しました。",
+    },
+    {
+        "name": "mode_changed",
+        "mode_changed": True,
+        "no_hunks": True,
+        "summary": "このファイルはモード(実行権限など)のみが変更されました。",
+        "review": "ファイルのモードの変更のみのため、レビューを省略しました。",
+    },
+    {
+        "name": "empty",
+        "no_hunks": True,
+        "summary": "このファイルには内容の変更がありません。",
+        "review": "内容の変更がないため、レビューを省略しました。",
+    },
+    {
+        "name": "generated",
+        "globs": [
+            "*.lock",
+            "package-lock.json",
+            "pnpm-lock.yaml",
+            "go.sum",
+            "*.min.js",
+            "*.min.css",
+            "*.map",
+            "*_pb2.py",
+            "*.pb.go",
+            "vendor/*",
+            "node_modules/*",
+            "third_party/*",
+        ],
+        "summary": "このファイルは自動生成または外部のファイルです。",
+        "review": "自動生成または外部のファイルのため、レビューを省略しました。",
+    },
+    {
+        "name": "whitespace",
+        "whitespace_only": True,
+        "summary": "このファイルでは空白文字のみが変更されました。",
+        "review": "空白文字のみの変更のため、レビューを省略しました。",
+    },
+]
+
+
+def load_triage_rules(path: str = "") -> List[Dict[str, Any]]:
+    # Use the default rules unless the JSON file of the rules is given
+    if not path:
+        return DEFAULT_TRIAGE_RULES
+    with open(path, encoding="utf_8") as f:
+        return json.load(f)
+
+
+def has_hunks(diff_content: str) -> bool:
+    return "\n@@ " in diff_content
+
+
+def is_whitespace_only_diff(diff_content: str) -> bool:
+    added = []
+    removed = []
+    for line in diff_content.splitlines()[2:]:
+        if line.startswith("+"):
+            added.append(line[1:])
+        elif line.startswith("-"):
+            removed.append(line[1:])
+    if not added and not removed:
+        return False
+    # Compare line by line, ignoring the blank lines and the trailing spaces.
+    # The indentation and the spaces within a line may be significant, in
+    # Python, YAML or a string literal.
+    return [line.rstrip() for line in added if line.strip()] == [
+        line.rstrip() for line in removed if line.strip()
+    ]
+
+
+def match_triage_rule(
+    doc: Document, rules: List[Dict[str, Any]]
+) -> Optional[Dict[str, Any]]:
+    metadata = doc.metadata
+    file_path = metadata["file_path"]
+    for rule in rules:
+        if "globs" in rule and not any(
+            fnmatch.fnmatch(file_path, glob)
+            or fnmatch.fnmatch(posixpath.basename(file_path), glob)
+            for glob in rule["globs"]
+        ):
+            continue
+        if "diff_status" in rule and metadata["diff_status"] not in rule["diff_status"]:
+            continue
+        if "max_add_count" in rule and metadata["add_count"] > rule["max_add_count"]:
+            continue
+        if (
+            "max_delete_count" in rule
+            and metadata["delete_count"] > rule["max_delete_count"]
+        ):
+            continue
+        if "min_changed_lines" in rule and (
+            metadata["add_count"] + metadata["delete_count"] < rule["min_changed_lines"]
+        ):
+            continue
+        if any(
+            rule.get(flag) and not metadata.get(flag)
+            for flag in ("binary", "too_large", "mode_changed")
+        ):
+            continue
+        if rule.get("no_hunks") and has_hunks(doc.page_content):
+            continue
+        if rule.get("whitespace_only") and not is_whitespace_only_diff(
+            doc.page_content
+        ):
+            continue
+        return rule
+    return None
+
+
+def triage_chain(chain: Runnable, rules: List[Dict[str, Any]]) -> Runnable:
+    """Build a runnable that skips the chain for trivial diffs.
+
+    If a rule matches the document, the canned summary and review of the
+    rule are returned without invoking the chain, together with the name
+    of the rule under ``triage``.
+    """
+
+    def _invoke(doc: Document) -> Dict[str, Any]:
+        rule = match_triage_rule(doc, rules)
+        if rule is None:
+            return chain.invoke(doc)
+        return {
+            "summary": rule.get("summary", ""),
+            "review": rule.get("review", ""),
+            "triage": rule.get("name", ""),
+        }
+
+    async def _ainvoke(doc: Document) -> Dict[str, Any]:
+        if match_triage_rule(doc, rules) is None:
+            return await chain.ainvoke(doc)
+        return _invoke(doc)
+
+    return RunnableLambda(_invoke, afunc=_ainvoke)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# A long-running worker reviewing the changes notified by GitLab webhooks.
+# LangChain, the HTTP connections to GitLab, the LLM cache and the Ollama
+# pool are kept between the jobs, so a job only fetches the diffs and calls
+# the models.
+
+import hmac
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from langchain_motex.cli import DEFAULT_MODEL, STRONG_MODEL, get_flag, review
+from langchain_motex.utils.gitlab_utils import (
+    MergeRequestNotFoundError,
+    get_gitlab_context,
+)
+
+# Commit SHA of the "after" of a push deleting a branch
+NULL_SHA = "0" * 40
+
+
+def parse_webhook(event: str, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Get the job of a webhook, or None if it is not reviewed.
+
+    Jobs with the same ``key`` review the same changes, so a newer job
+    supersedes the older ones. A job with ``cancel`` only supersedes them,
+    e.g. when the merge request is closed.
+    """
+    if event == "Merge Request Hook":
+        attributes = payload["object_attributes"]
+        job = {
+            "kind": "mr",
+            "project_id": attributes["target_project_id"],
+            "merge_request_iid": attributes["iid"],
+            "commit_sha": attributes["last_commit"]["id"],
+            "key": f"{attributes['target_project_id']}:mr:{attributes['iid']}",
+        }
+        if attributes.get("action") in ("close", "merge"):
+            return job | {"cancel": True}
+        # Updates without new commits, e.g. of the description by the review
+        if attributes.get("action") == "update" and "oldrev" not in attributes:
+            return None
+        if attributes.get("action") not in ("open", "reopen", "update"):
+            return None
+        return job
+    if event == "Push Hook":
+        if not payload["ref"].startswith("refs/heads/"):
+            return None
+        job = {
+            "kind": "commit",
+            "project_id": payload["project_id"],
+            "merge_request_iid": None,
+            "commit_sha": payload["after"],
+            "key": f"{payload['project_id']}:push:{payload['ref']}",
+        }
+        if payload["after"] == NULL_SHA:
+            return job | {"cancel": True}
+        return job
+    return None
+
+
+class JobQueue:
+    """Queue of the review jobs in a SQLite database.
+
+    The jobs survive a restart of the worker: the jobs which were running
+    are queued again.
+    """
+
+    def __init__(self, database_path: str = ".cache/coderev/jobs.db"):
+        dirname = os.path.dirname(database_path)
+        if dirname:
+            os.makedirs(dirname, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(database_path, check_same_thread=False)
+        self._connection.row_factory = sqlite3.Row
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                key TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                project_id INTEGER NOT NULL,
+                merge_request_iid INTEGER,
+                commit_sha TEXT NOT NULL,
+                status TEXT NOT NULL,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id)"
+        )
+        self._connection.execute(
+            "UPDATE jobs SET status = 'pending' WHERE status = 'running'"
+        )
+        self._connection.commit()
+
+    def enqueue(self, job: Dict[str, Any]) -> Optional[int]:
+        """Queue the job in place of the pending jobs with the same key."""
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = 'superseded', finished_at = ? "
+                "WHERE key = ? AND status = 'pending'",
+                (time.time(), job["key"]),
+            )
+            job_id = None
+            if not job.get("cancel"):
+                job_id = self._connection.execute(
+                    "INSERT INTO jobs (key, kind, project_id, merge_request_iid,"
+                    " commit_sha, status, created_at)"
+                    " VALUES (?, ?, ?, ?, ?, 'pending', ?)",
+                    (
+                        job["key"],
+                        job["kind"],
+                        job["project_id"],
+                        job["merge_request_iid"],
+                        job["commit_sha"],
+                        time.time(),
+                    ),
+                ).lastrowid
+            self._connection.commit()
+            return job_id
+
+    def take(self, running: Dict[int, int], max_project_jobs: int) -> Optional[Dict]:
+        """Start the oldest job of the project with the fewest running jobs.
+
+        ``running`` is the number of running jobs of each project, and a
+        project does not run more than ``max_project_jobs`` jobs at once.
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM jobs WHERE id IN ("
+                " SELECT MIN(id) FROM jobs WHERE status = 'pending'"
+                " GROUP BY project_id)"
+            ).fetchall()
+            rows = [
+                row
+                for row in rows
+                if running.get(row["project_id"], 0) < max_project_jobs
+            ]
+            if not rows:
+                return None
+            row = min(
+                rows, key=lambda row: (running.get(row["project_id"], 0), row["id"])
+            )
+            self._connection.execute(
+                "UPDATE jobs SET status = 'running', started_at = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            self._connection.commit()
+            return dict(row)
+
+    def finish(self, job_id: int, status: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self._connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, error, time.time(), job_id),
+            )
+            self._connection.commit()
+
+    def list_jobs(self, limit: int = 100) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT * FROM jobs ORDER BY id DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class ReviewWorker:
+    """Run the jobs of the queue on ``max_jobs`` threads.
+
+    Each project runs at most ``max_project_jobs`` jobs at once, so that a
+    busy project does not hold back the others. A running job superseded by
+    a newer one is cancelled: its remaining files are skipped and its
+    results are not posted.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        max_jobs: int = 2,
+        max_project_jobs: int = 1,
+        log_dir: str = "./logs/jobs",
+    ):
+        self.queue = queue
+        self.max_jobs = max_jobs
+        self.max_project_jobs = max_project_jobs
+        self.log_dir = log_dir
+        self.running: Dict[int, int] = {}
+        self.cancel_events: Dict[str, threading.Event] = {}
+        self._condition = threading.Condition()
+        # The connections to GitLab are kept alive between the jobs
+        self.adapter = requests.adapters.HTTPAdapter(pool_maxsize=10 * max_jobs)
+
+    def submit(self, job: Dict[str, Any]) -> Optional[int]:
+        with self._condition:
+            job_id = self.queue.enqueue(job)
+            cancel_event = self.cancel_events.get(job["key"])
+            if cancel_event is not None:
+                print(f"Worker: cancelling the running job of {job['key']}")
+                cancel_event.set()
+            self._condition.notify()
+        return job_id
+
+    def start(self) -> None:
+        for _ in range(self.max_jobs):
+            threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self) -> None:
+        while True:
+            with self._condition:
+                job = self.queue.take(self.running, self.max_project_jobs)
+                while job is None:
+                    self._condition.wait()
+                    job = self.queue.take(self.running, self.max_project_jobs)
+                project_id = job["project_id"]
+                self.running[project_id] = self.running.get(project_id, 0) + 1
+                cancel_event = threading.Event()
+                self.cancel_events[job["key"]] = cancel_event
+            try:
+                self.queue.finish(job["id"], self._process(job, cancel_event))
+            except Exception:
+                traceback.print_exc()
+                self.queue.finish(job["id"], "failed", traceback.format_exc())
+            finally:
+                with self._condition:
+                    self.running[project_id] -= 1
+                    if self.cancel_events.get(job["key"]) is cancel_event:
+                        del self.cancel_events[job["key"]]
+                    self._condition.notify_all()
+
+    def _process(self, job: Dict[str, Any], cancel_event: threading.Event) -> str:
+        print(f"Worker: job {job['id']}: {job['key']} at {job['commit_sha'][:8]}")
+        try:
+            gitlab_context = get_gitlab_context(
+                job["project_id"],
+                job["merge_request_iid"],
+                job["commit_sha"],
+                adapter=self.adapter,
+            )
+        except MergeRequestNotFoundError:
+            # The commit of the push has no open merge request
+            return "skipped"
+        review(
+            merge_request=job["kind"] == "mr",
+            gitlab_context=gitlab_context,
+            log_dir=os.path.join(self.log_dir, str(job["id"])),
+            cancel_event=cancel_event,
+        )
+        return "cancelled" if cancel_event.is_set() else "done"
+
+
+def get_webhook_handler(worker: ReviewWorker, token: str) -> type:
+    class WebhookHandler(BaseHTTPRequestHandler):
+        def _send(self, status: int, body: Any) -> None:
+            data = json.dumps(body, ensure_ascii=False).encode("utf_8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self) -> None:
+            if self.path == "/healthz":
+                return self._send(200, {"status": "ok"})
+            if self.path == "/jobs":
+                return self._send(200, worker.queue.list_jobs())
+            self._send(404, {"error": "not found"})
+
+        def do_POST(self) -> None:
+            if self.path != "/webhook":
+                return self._send(404, {"error": "not found"})
+            if token and not hmac.compare_digest(
+                self.headers.get("X-Gitlab-Token", ""), token
+            ):
+                return self._send(401, {"error": "invalid token"})
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                payload = json.loads(self.rfile.read(length))
+                job = parse_webhook(self.headers.get("X-Gitlab-Event", ""), payload)
+            except (ValueError, KeyError, TypeError) as e:
+                return self._send(400, {"error": f"{type(e).__name__}: {e}"})
+            if job is None:
+                return self._send(200, {"status": "ignored"})
+            job_id = worker.submit(job)
+            self._send(202, {"status": "queued", "job_id": job_id})
+
+    return WebhookHandler
+
+
+def serve(
+    host: str = "0.0.0.0",
+    port: int = 8080,
+    max_jobs: int = 2,
+    database_path: str = ".cache/coderev/jobs.db",
+    insecure: bool = False,
+) -> None:
+    """Receive the webhooks of GitLab, and review the changes in the background.
+
+    Anyone reaching the port could queue reviews, so the webhooks must carry
+    ``CODEREV_WEBHOOK_TOKEN``, unless ``insecure`` accepts them all.
+    """
+    token = os.getenv("CODEREV_WEBHOOK_TOKEN", "")
+    if not token:
+        if not insecure:
+            raise ValueError(
+                "CODEREV_WEBHOOK_TOKEN is not set, "
+                "use --insecure to accept the webhooks without a token"
+            )
+        print("Worker: CODEREV_WEBHOOK_TOKEN is not set, webhooks are not verified")
+    # The jobs are not checked out, so the working directory of the worker
+    # must not be diffed or indexed
+    for name, value in [("CODEREV_LOCAL_DIFF", "false"), ("CODEREV_CONTEXT_K", "0")]:
+        if os.getenv(name, value) != value:
+            print(f"Worker: {name} is not supported, and disabled")
+        os.environ[name] = value
+
+    # Keep the models loaded between the jobs
+    from langchain_motex.chat_models import OllamaEndpointPool
+
+    ollama_urls = os.getenv("OLLAMA_URL", "http://localhost:11434").split(",")
+    os.environ.setdefault("OLLAMA_KEEP_ALIVE", "24h")
+    models = [DEFAULT_MODEL] + ([STRONG_MODEL] if get_flag("CODEREV_ROUTING") else [])
+    OllamaEndpointPool(ollama_urls).warmup(models, os.environ["OLLAMA_KEEP_ALIVE"])
+
+    worker = ReviewWorker(
+        JobQueue(database_path),
+        max_jobs,
+        int(os.getenv("CODEREV_WORKER_PROJECT_JOBS", "1")),
+    )
+    worker.start()
+    server = ThreadingHTTPServer((host, port), get_webhook_handler(worker, token))
+    print(f"Worker: listening on {host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
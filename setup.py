@@ -1,4 +1,4 @@
-from setuptools import setup
+from setuptools import find_packages, setup
 
 
 def get_requirements_from_file():
@@ -13,6 +13,8 @@ setup(
     author="k5-mot",
     author_email="34744243+k5-mot@users.noreply.github.com",
     description="LangChain Extensions for me",
-    package_dir={"": "langchain_motex"},
+    packages=find_packages(include=["langchain_motex", "langchain_motex.*"]),
+    python_requires=">=3.10",
     install_requires=get_requirements_from_file(),
+    entry_points={"console_scripts": ["coderev=langchain_motex.cli:main"]},
 )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.documents import Document
+
+from benchmarks.fake_gitlab import (
+    BASE_SHA,
+    COMMIT_SHA,
+    MERGE_REQUEST_IID,
+    PROJECT_ID,
+    FakeGitlabServer,
+    make_diffs,
+)
+
+
+@pytest.fixture
+def gitlab_server(monkeypatch):
+    """Fake GitLab with 5 changed files, set in the CI variables."""
+    server = FakeGitlabServer(make_diffs(files=5), per_page_limit=2).start()
+    monkeypatch.setenv("CI_SERVER_URL", server.url)
+    monkeypatch.setenv("CI_PROJECT_ID", str(PROJECT_ID))
+    monkeypatch.setenv("CI_MERGE_REQUEST_IID", str(MERGE_REQUEST_IID))
+    monkeypatch.setenv("CI_COMMIT_SHA", COMMIT_SHA)
+    monkeypatch.setenv("GITLAB_PERSONAL_ACCESS_TOKEN", "test")
+    yield server
+    server.stop()
+
+
+def git(repo_path, *args) -> str:
+    return subprocess.run(
+        ["git", *args], cwd=repo_path, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@pytest.fixture
+def git_repo(tmp_path):
+    """Repository with a base commit, and a head commit changing its files."""
+    git(tmp_path, "init", "-q")
+    git(tmp_path, "config", "user.email", "test@example.com")
+    git(tmp_path, "config", "user.name", "test")
+    (tmp_path / "app.py").write_text("".join(f"x{i} = {i}\n" for i in range(10)))
+    (tmp_path / "old.py").write_text("".join(f"y{i} = {i}\n" for i in range(10)))
+    (tmp_path / "gone.md").write_text("# Gone\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "base")
+    base_sha = git(tmp_path, "rev-parse", "HEAD")
+    (tmp_path / "app.py").write_text(
+        "".join(f"x{i} = {i * 2 if i == 5 else i}\n" for i in range(10))
+    )
+    git(tmp_path, "mv", "old.py", "new.py")
+    git(tmp_path, "rm", "-q", "gone.md")
+    (tmp_path / "added.py").write_text("z = 1\n")
+    git(tmp_path, "add", ".")
+    git(tmp_path, "commit", "-q", "-m", "head")
+    return tmp_path, base_sha, git(tmp_path, "rev-parse", "HEAD")
+
+
+@pytest.fixture
+def make_doc():
+    """Factory of documents like the loaders yield, counting the changed lines."""
+
+    def _make_doc(file_path: str = "app.py", diff: str = "", **metadata) -> Document:
+        lines = [
+            line for line in diff.splitlines() if not line.startswith(("--- ", "+++ "))
+        ]
+        return Document(
+            page_content=diff,
+            metadata={
+                "file_path": file_path,
+                "diff_status": "modify",
+                "add_count": sum(1 for line in lines if line.startswith("+")),
+                "delete_count": sum(1 for line in lines if line.startswith("-")),
+            }
+            | metadata,
+        )
+
+    return _make_doc
+
+
+@pytest.fixture
+def make_docs(make_doc):
+    """Factory of a document per file path, with the same metadata."""
+
+    def _make_docs(*file_paths: str, **metadata) -> list:
+        return [make_doc(file_path, **metadata) for file_path in file_paths]
+
+    return _make_docs
+
+
+@pytest.fixture
+def get_paths():
+    def _get_paths(docs) -> list:
+        return [doc.metadata["file_path"] for doc in docs]
+
+    return _get_paths
+
+
+@pytest.fixture
+def make_context():
+    """Factory of stand-ins of GitlabContext, with the notes of the merge request."""
+
+    def _make_context(
+        notes=(),
+        user_id: int = 1,
+        base_sha: str = BASE_SHA,
+        commit_sha: str = COMMIT_SHA,
+    ) -> SimpleNamespace:
+        notes = [SimpleNamespace(attributes=note) for note in notes]
+        merge_request = SimpleNamespace(
+            attributes={
+                "title": "Title",
+                "description": "Description",
+                "author": {"name": "author"},
+            },
+            diff_refs={"base_sha": base_sha},
+            notes=SimpleNamespace(list=lambda **kwargs: iter(notes)),
+        )
+        return SimpleNamespace(
+            merge_request=merge_request, user_id=user_id, commit_sha=commit_sha
+        )
+
+    return _make_context
@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from types import SimpleNamespace
+
+import pytest
+from langchain_core.outputs import Generation
+
+from langchain_motex import caches
+from langchain_motex.caches import SQLiteLRUCache
+
+LLM_STRING = "llama3.1:8b"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Clock of the cache, advanced by 1 second at every reading."""
+    now = [1000.0]
+
+    def _time():
+        now[0] += 1
+        return now[0]
+
+    monkeypatch.setattr(caches, "time", SimpleNamespace(time=_time))
+    return now
+
+
+def make_cache(tmp_path, **kwargs) -> SQLiteLRUCache:
+    return SQLiteLRUCache(str(tmp_path / "cache" / "llm_cache.db"), **kwargs)
+
+
+def get_text(cache: SQLiteLRUCache, prompt: str):
+    return_val = cache.lookup(prompt, LLM_STRING)
+    return return_val[0].text if return_val is not None else None
+
+
+def test_lookup_and_update(tmp_path, clock):
+    cache = make_cache(tmp_path)
+    assert get_text(cache, "a") is None
+    cache.update("a", LLM_STRING, [Generation(text="output of a")])
+    assert get_text(cache, "a") == "output of a"
+    # The model and its parameters are part of the key
+    assert cache.lookup("a", "deepseek-coder-v2:16b") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_least_recently_read_entries_are_evicted(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.update("a", LLM_STRING, [Generation(text="output of a")])
+    cache.update("b", LLM_STRING, [Generation(text="output of b")])
+    # Reading a makes b the least recently used entry
+    assert get_text(cache, "a") == "output of a"
+    cache.update("c", LLM_STRING, [Generation(text="output of c")])
+    assert get_text(cache, "b") is None
+    assert get_text(cache, "a") == "output of a"
+    assert get_text(cache, "c") == "output of c"
+
+
+def test_entries_are_kept_up_to_max_entries(tmp_path, clock):
+    cache = make_cache(tmp_path, max_entries=3)
+    for i in range(10):
+        cache.update(f"prompt {i}", LLM_STRING, [Generation(text=str(i))])
+    texts = [get_text(cache, f"prompt {i}") for i in range(10)]
+    assert texts == [None] * 7 + ["7", "8", "9"]
+
+
+def test_entries_persist_and_expire(tmp_path, clock):
+    cache = make_cache(tmp_path, max_age=100)
+    cache.update("a", LLM_STRING, [Generation(text="output of a")])
+    cache._connection.close()
+    cache = make_cache(tmp_path, max_age=100)
+    assert get_text(cache, "a") == "output of a"
+    clock[0] += 100
+    assert get_text(cache, "a") is None
+    # Expired entries are dropped when the cache is opened
+    make_cache(tmp_path, max_age=100)._connection.close()
+    count = cache._connection.execute("SELECT COUNT(*) FROM llm_cache").fetchone()
+    assert count == (0,)
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from langchain_motex.callbacks import OllamaMetricsCallbackHandler
+from langchain_motex.chat_models import OllamaEndpointPool, PooledChatOllama
+
+# Nothing listens on the discard port, so the connection is refused
+DEAD_URL = "http://127.0.0.1:9"
+
+
+@pytest.fixture
+def ollama_server():
+    server = FakeOllamaServer(token_latency=0, response_tokens=5).start()
+    yield server
+    server.stop()
+
+
+def make_llm(ollama_server, metrics) -> PooledChatOllama:
+    # The dead host comes first, so every request fails over once
+    return PooledChatOllama(
+        model="m",
+        pool=OllamaEndpointPool([DEAD_URL, ollama_server.url], cooldown=0),
+        timeout=5,
+        callbacks=[metrics],
+    )
+
+
+def test_failover_is_counted_as_a_retry(ollama_server):
+    metrics = OllamaMetricsCallbackHandler()
+    llm = make_llm(ollama_server, metrics)
+    config = {"metadata": {"stage": "code_review"}}
+    assert llm.invoke("hello", config=config).content
+    assert asyncio.run(llm.ainvoke("hello", config=config)).content
+    stats = metrics.summary()["code_review"]
+    assert stats["calls"] == 2
+    assert stats["errors"] == 0
+    assert stats["retries"] == 2
+    assert llm.pool.summary()[DEAD_URL]["errors"] == 2
+
+
+def test_every_host_failing_raises():
+    metrics = OllamaMetricsCallbackHandler()
+    llm = PooledChatOllama(
+        model="m", pool=OllamaEndpointPool([DEAD_URL]), callbacks=[metrics]
+    )
+    with pytest.raises(Exception):
+        llm.invoke("hello", config={"metadata": {"stage": "code_review"}})
+    stats = metrics.summary()["code_review"]
+    assert stats["errors"] == 1
+    assert stats["retries"] == 0
+
+
+def make_prompts(name: str, content: str):
+    from langchain_core.messages import HumanMessage
+
+    from langchain_motex.templates import (
+        TEMPLATE_CODE_REVIEW_PREFIXED,
+        TEMPLATE_CODE_SUMMARY_PREFIXED,
+    )
+
+    return [
+        [HumanMessage(content=template.format(name=name, language="", content=content))]
+        for template in (TEMPLATE_CODE_SUMMARY_PREFIXED, TEMPLATE_CODE_REVIEW_PREFIXED)
+    ]
+
+
+def test_summary_and_review_of_a_file_go_to_the_same_host():
+    servers = [FakeOllamaServer(token_latency=0, response_tokens=5).start()]
+    servers.append(FakeOllamaServer(token_latency=0, response_tokens=5).start())
+    try:
+        llm = PooledChatOllama(
+            model="m",
+            pool=OllamaEndpointPool([server.url for server in servers]),
+            affinity_chars=1024,
+        )
+        # The diffs are shorter than affinity_chars, so the instructions
+        # after them would be hashed too
+        for i in range(4):
+            summary, review = make_prompts(f"file{i}.py", f"+value = {i}")
+            assert llm._get_affinity(summary) == llm._get_affinity(review)
+            hosts = []
+            for messages in (summary, review):
+                calls = [server.llm_calls for server in servers]
+                llm.invoke(messages)
+                hosts.append([s.llm_calls - n for s, n in zip(servers, calls)])
+            assert hosts[0] == hosts[1]
+        assert len(llm.pool.affinities) == 4
+    finally:
+        for server in servers:
+            server.stop()
+
+
+def test_affinities_are_evicted_at_max_affinities(monkeypatch):
+    monkeypatch.setattr(OllamaEndpointPool, "max_affinities", 2)
+    pool = OllamaEndpointPool(["http://a", "http://b"])
+    for affinity in ("x", "y", "x", "z"):
+        pool.release(pool.acquire(affinity=affinity), 0.1)
+    # y is the least recently used key
+    assert list(pool.affinities) == ["x", "z"]
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+
+from langchain_motex.utils.dedup_utils import HunkDeduplicator
+
+SHARED_HUNK = (
+    "@@ -1,2 +1,2 @@\n import {name}\n-LICENSE = 'MIT'\n+LICENSE = 'Apache-2.0'\n"
+)
+UNIQUE_HUNK = "@@ -20,1 +20,1 @@\n-x = 1\n+x = {n}\n"
+
+
+@pytest.fixture
+def docs(make_doc):
+    """alpha.py with the shared hunk, beta.py with both hunks, gamma.py unique."""
+    docs = []
+    for file_path, hunks in [
+        ("alpha.py", [SHARED_HUNK]),
+        ("beta.py", [SHARED_HUNK, UNIQUE_HUNK]),
+        ("gamma.py", [UNIQUE_HUNK]),
+    ]:
+        name = file_path[: -len(".py")]
+        diff = f"--- a/{file_path}\n+++ b/{file_path}\n" + "".join(
+            hunk.format(name=name, n=len(file_path)) for hunk in hunks
+        )
+        docs.append(make_doc(file_path, diff))
+    return docs
+
+
+def review(docs) -> list:
+    for doc in docs:
+        doc.metadata["summary"] = "summary of " + doc.metadata["file_path"]
+        doc.metadata["review"] = "review of " + doc.metadata["file_path"]
+    return docs
+
+
+def test_repeated_hunks_are_reviewed_once(docs):
+    deduplicator = HunkDeduplicator()
+    deduped = deduplicator.dedup(docs)
+    # The group, then the unique hunks of beta.py and gamma.py
+    assert [doc.metadata["file_path"] for doc in deduped] == [
+        "alpha.py",
+        "beta.py",
+        "gamma.py",
+    ]
+    group = deduped[0]
+    assert group.metadata["dedup_files"] == ["alpha.py", "beta.py"]
+    # The group has its own key, apart from the file it is taken from
+    assert group.metadata["dedup_group"] not in ("alpha.py", "beta.py")
+    assert "dedup_group" not in deduped[1].metadata
+    assert group.metadata["add_count"] == group.metadata["delete_count"] == 1
+    assert "LICENSE" not in deduped[1].page_content
+    assert "x = 7" in deduped[1].page_content
+    assert len(deduplicator.get_groups()) == 1
+
+
+def test_results_are_attributed_to_the_files(docs):
+    deduplicator = HunkDeduplicator()
+    docs = deduplicator.attribute(review(deduplicator.dedup(docs)))
+    assert [doc.metadata["file_path"] for doc in docs] == [
+        "alpha.py",
+        "beta.py",
+        "gamma.py",
+    ]
+    alpha, beta, gamma = docs
+    assert alpha.metadata["dedup_covered"]
+    assert alpha.metadata["summary"] == "summary of alpha.py"
+    assert "2ファイルに適用される変更" in alpha.metadata["review"]
+    # The summary of the unique hunks, then the summary of the group
+    assert beta.metadata["summary"] == "summary of beta.py\nsummary of alpha.py"
+    assert beta.metadata["review"] == "review of beta.py"
+    assert gamma.metadata["summary"] == "summary of gamma.py"
+
+
+def test_errors_of_the_group_are_attributed(docs):
+    deduplicator = HunkDeduplicator()
+    deduped = review(deduplicator.dedup(docs))
+    deduped[0].metadata["error"] = "TimeoutError: timed out"
+    alpha, beta, gamma = deduplicator.attribute(deduped)
+    assert alpha.metadata["error"] == "TimeoutError: timed out"
+    # beta.py keeps its own review of the unique hunks, but is not fully
+    # reviewed, so the incremental review tries it again
+    assert beta.metadata["review"] == "review of beta.py"
+    assert beta.metadata["error"] == "TimeoutError: timed out"
+    assert "error" not in gamma.metadata
+
+
+def test_nothing_is_grouped_below_min_files(docs):
+    contents = [doc.page_content for doc in docs]
+
+    async def _docs():
+        for doc in docs:
+            yield doc
+
+    async def _dedup():
+        deduplicator = HunkDeduplicator(min_files=3)
+        return [doc async for doc in deduplicator.adedup(_docs())]
+
+    deduped = asyncio.run(_dedup())
+    assert [doc.page_content for doc in deduped] == contents
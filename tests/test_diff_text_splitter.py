@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import io
+
+import unidiff
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.text_splitters.diff_text_splitter import DiffTextSplitter
+from langchain_motex.utils.chain_utils import map_reduce_chain
+from langchain_motex.utils.token_utils import estimate_tokens
+
+HEADER = "--- a/app.py\n+++ b/app.py\n"
+
+
+def make_diff(hunks: int, lines: int) -> str:
+    diff = HEADER
+    for i in range(hunks):
+        start = 1 + 100 * i
+        diff += f"@@ -{start},{lines} +{start},{lines} @@\n"
+        diff += "".join(f"-old_{i}_{j} = {j}\n" for j in range(lines))
+        diff += "".join(f"+new_{i}_{j} = {j}\n" for j in range(lines))
+    return diff
+
+
+def hunk_headers(text: str) -> list:
+    return [line for line in text.splitlines() if line.startswith("@@")]
+
+
+def test_small_diff_is_not_split():
+    diff = make_diff(2, 2)
+    assert DiffTextSplitter(chunk_size=1000).split_text(diff) == [diff]
+
+
+def test_hunks_are_kept_whole():
+    diff = make_diff(4, 5)
+    chunks = DiffTextSplitter(chunk_size=80).split_text(diff)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith(HEADER)
+        assert estimate_tokens(chunk) <= 80
+        # Every chunk is still a valid diff
+        unidiff.PatchSet(io.StringIO(chunk))
+    headers = [header for chunk in chunks for header in hunk_headers(chunk)]
+    assert headers == hunk_headers(diff)
+
+
+def test_large_hunk_is_split_by_lines():
+    diff = make_diff(1, 40)
+    chunks = DiffTextSplitter(chunk_size=100).split_text(diff)
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk.startswith(HEADER + hunk_headers(diff)[0])
+    lines = [
+        line
+        for chunk in chunks
+        for line in chunk.splitlines()[3:]
+        if not line.startswith("@@")
+    ]
+    assert lines == diff.splitlines()[3:]
+
+
+def test_map_reduce_chain():
+    calls = []
+
+    def _map(doc):
+        calls.append("map")
+        return str(len(hunk_headers(doc.page_content)))
+
+    def _reduce(doc):
+        calls.append("reduce")
+        return doc.page_content
+
+    chain = map_reduce_chain(
+        RunnableLambda(_map), RunnableLambda(_reduce), DiffTextSplitter(chunk_size=80)
+    )
+    doc = Document(page_content=make_diff(4, 5), metadata={"file_path": "app.py"})
+    output = chain.invoke(doc)
+    assert calls[-1] == "reduce"
+    assert output.startswith("### 1/")
+    assert asyncio.run(chain.ainvoke(doc)) == output
+
+    calls.clear()
+    small_doc = Document(page_content=make_diff(1, 1), metadata={})
+    assert chain.invoke(small_doc) == "1"
+    assert calls == ["map"]
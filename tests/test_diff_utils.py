@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from langchain_motex.utils.diff_utils import FileDiff, render_diff
+
+
+def make_diff(lines: list, start: int = 1) -> str:
+    old_length = sum(1 for line in lines if line[:1] != "+")
+    new_length = sum(1 for line in lines if line[:1] != "-")
+    return f"@@ -{start},{old_length} +{start},{new_length} @@ def f():\n" + "".join(
+        line + "\n" for line in lines
+    )
+
+
+def test_parse():
+    diff = make_diff([" a", "-b", "+c", "+d", ""]) + "\\ No newline at end of file\n"
+    file_diff = FileDiff.parse("old.py", "new.py", diff)
+    assert file_diff.status == "rename"
+    assert (file_diff.added, file_diff.removed) == (2, 1)
+    hunk = file_diff.hunks[0]
+    assert hunk.section_header == "def f():"
+    # The stripped empty context line is kept, the marker is dropped
+    assert [line.line_type + line.value for line in hunk.lines] == [
+        " a",
+        "-b",
+        "+c",
+        "+d",
+        " ",
+    ]
+    assert FileDiff.parse("a.py", "a.py", "@@ -0,0 +1,2 @@\n+x\n+y\n").status == "add"
+    assert FileDiff.parse("a.py", "a.py", "@@ -1 +0,0 @@\n-x\n").status == "delete"
+
+
+def test_far_context_splits_the_hunk():
+    lines = [" c0", "-x", "+y"] + [f" c{i}" for i in range(1, 11)] + ["-z", "+w"]
+    file_diff = FileDiff.parse("a.py", "a.py", make_diff(lines, start=10))
+    assert render_diff(file_diff, context_lines=2) == (
+        "--- a/a.py\n+++ b/a.py\n"
+        "@@ -10,4 +10,4 @@ def f():\n c0\n-x\n+y\n c1\n c2\n"
+        "@@ -20,3 +20,3 @@\n c9\n c10\n-z\n+w\n"
+    )
+
+
+def test_long_blocks_are_collapsed():
+    lines = [f"-old{i}" for i in range(10)] + [f"+new{i}" for i in range(3)]
+    file_diff = FileDiff.parse("a.py", "a.py", make_diff(lines))
+    rendered = render_diff(file_diff, max_deleted_lines=4, max_added_lines=0)
+    assert rendered.splitlines()[2:] == [
+        "@@ -1,5 +1,3 @@ def f():",
+        "-old0",
+        "-old1",
+        "-... (6行の削除を省略)",
+        "-old8",
+        "-old9",
+        "+new0",
+        "+new1",
+        "+new2",
+    ]
+
+
+def test_trailing_whitespace_changes():
+    file_diff = FileDiff.parse("a.py", "a.py", make_diff([" a", "-b  ", "+b", " c"]))
+    # Nothing is left to review, so the diff is returned as is
+    assert render_diff(file_diff) == str(file_diff)
+    file_diff = FileDiff.parse(
+        "a.py", "a.py", make_diff(["-b  ", "+b", "-x", "+y", " c"])
+    )
+    assert render_diff(file_diff, context_lines=0).splitlines()[2:] == [
+        "@@ -2 +2 @@ def f():",
+        "-x",
+        "+y",
+    ]
+
+
+def test_parse_keeps_a_line_with_a_form_feed():
+    file_diff = FileDiff.parse("a.py", "a.py", make_diff(["-a", "+b\x0cc", " d"]))
+    assert [line.line_type + line.value for line in file_diff.hunks[0].lines] == [
+        "-a",
+        "+b\x0cc",
+        " d",
+    ]
+    assert (file_diff.added, file_diff.removed) == (1, 1)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from langchain_motex.document_loaders.git_diff_loader import GitDiffLoader
+from langchain_motex.utils.git_utils import (
+    get_diff_git,
+    get_merge_base,
+    has_commit,
+    iter_diffs_git,
+)
+
+
+def test_diffs_in_the_format_of_gitlab(git_repo):
+    repo_path, base_sha, head_sha = git_repo
+    diffs = {
+        diff["file_path"]: diff
+        for diff in iter_diffs_git(base_sha, head_sha, repo_path)
+    }
+    assert {path: diff["diff_status"] for path, diff in diffs.items()} == {
+        "added.py": "add",
+        "app.py": "modify",
+        "gone.md": "delete",
+        "new.py": "rename",
+    }
+    assert diffs["app.py"]["add_count"] == diffs["app.py"]["delete_count"] == 1
+    assert diffs["app.py"]["diff_content"].startswith("--- a/app.py\n+++ b/app.py\n")
+    assert "-x5 = 5\n+x5 = 10\n" in diffs["app.py"]["diff_content"]
+
+
+def test_loader_uses_the_base_of_the_merge_request(git_repo, make_context, monkeypatch):
+    repo_path, base_sha, head_sha = git_repo
+    monkeypatch.delenv("CI_MERGE_REQUEST_DIFF_BASE_SHA", raising=False)
+    loader = GitDiffLoader(
+        make_context(base_sha=base_sha, commit_sha=head_sha), repo_path=repo_path
+    )
+    assert loader.is_available()
+    assert get_merge_base(base_sha, head_sha, repo_path) == base_sha
+    docs = list(loader.lazy_load())
+    assert sorted(doc.metadata["file_path"] for doc in docs) == [
+        "added.py",
+        "app.py",
+        "gone.md",
+        "new.py",
+    ]
+    assert all(doc.metadata["title"] == "Title" for doc in docs)
+
+
+def test_missing_commits_are_not_available(git_repo, make_context):
+    repo_path, base_sha, head_sha = git_repo
+    assert not has_commit("0" * 40, repo_path)
+    loader = GitDiffLoader(
+        make_context(base_sha="0" * 40, commit_sha=head_sha),
+        base_sha="0" * 40,
+        repo_path=repo_path,
+    )
+    assert not loader.is_available()
+
+
+def test_diffs_without_hunks():
+    mode_only = "diff --git a/run.sh b/run.sh\nold mode 100644\nnew mode 100755\n"
+    diff = get_diff_git(mode_only)
+    assert (diff["file_path"], diff["diff_status"]) == ("run.sh", "modify")
+    assert diff["mode_changed"] and not diff["binary"]
+    binary = (
+        "diff --git a/logo.png b/logo.png\n"
+        "index 88768ef..3e3315e 100644\n"
+        "Binary files a/logo.png and b/logo.png differ\n"
+    )
+    diff = get_diff_git(binary)
+    assert diff["file_path"] == "logo.png"
+    assert diff["binary"] and not diff["mode_changed"]
+    rename = (
+        "diff --git a/old.py b/new.py\n"
+        "similarity index 100%\n"
+        "rename from old.py\n"
+        "rename to new.py\n"
+    )
+    diff = get_diff_git(rename)
+    assert (diff["file_path"], diff["diff_status"]) == ("new.py", "rename")
+    assert diff["add_count"] == diff["delete_count"] == 0
+    # A header which unidiff does not parse is an empty diff of the file
+    diff = get_diff_git("diff --git a/a.py b/a.py\n")
+    assert (diff["file_path"], diff["add_count"]) == ("a.py", 0)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+
+from benchmarks.fake_gitlab import COMMIT_SHA, MERGE_REQUEST_IID, PROJECT_ID
+from langchain_motex.utils.gitlab_utils import (
+    MergeRequestNotFoundError,
+    get_gitlab_context,
+)
+
+
+def test_context_of_the_ci_variables(gitlab_server):
+    gitlab_context = get_gitlab_context()
+    assert gitlab_context.project_id == PROJECT_ID
+    assert gitlab_context.merge_request_iid == MERGE_REQUEST_IID
+    assert gitlab_context.commit_sha == COMMIT_SHA
+    assert gitlab_context.api_calls == 0
+
+
+def test_objects_are_fetched_once(gitlab_server):
+    gitlab_context = get_gitlab_context()
+    for _ in range(3):
+        assert gitlab_context.project.id == PROJECT_ID
+        assert gitlab_context.merge_request.iid == MERGE_REQUEST_IID
+        assert gitlab_context.commit(COMMIT_SHA).id == COMMIT_SHA
+    # The project, the merge request and the commit
+    assert gitlab_context.api_calls == 3
+    assert gitlab_server.api_calls == 3
+
+
+def test_merge_request_of_the_commit(gitlab_server, monkeypatch):
+    monkeypatch.delenv("CI_MERGE_REQUEST_IID")
+    gitlab_context = get_gitlab_context()
+    assert gitlab_context.merge_request_iid == MERGE_REQUEST_IID
+
+
+def test_commit_without_an_open_merge_request(gitlab_server, monkeypatch):
+    monkeypatch.delenv("CI_MERGE_REQUEST_IID")
+    gitlab_server.merge_request["state"] = "merged"
+    with pytest.raises(MergeRequestNotFoundError):
+        get_gitlab_context()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from benchmarks.fake_gitlab import BASE_SHA, COMMIT_SHA
+from langchain_motex.document_loaders.gitlab_commit_loader import GitlabCommitLoader
+from langchain_motex.document_loaders.gitlab_merge_request_loader import (
+    GitlabMergeRequestLoader,
+)
+from langchain_motex.utils.gitlab_utils import get_gitlab_context
+
+
+def test_documents_are_streamed_page_by_page(gitlab_server):
+    gitlab_context = get_gitlab_context()
+    docs = GitlabCommitLoader(gitlab_context).lazy_load()
+    first_doc = next(docs)
+    # The project, the merge request and the first page of 2 diffs
+    calls = gitlab_server.api_calls
+    assert calls == 3
+    assert first_doc.metadata["file_path"] == gitlab_server.diffs[0]["new_path"]
+    assert first_doc.metadata["title"] == gitlab_server.merge_request["title"]
+    assert first_doc.page_content.startswith("--- a/")
+    rest = list(docs)
+    assert len(rest) == len(gitlab_server.diffs) - 1
+    # 2 more pages of diffs
+    assert gitlab_server.api_calls == calls + 2
+
+
+def test_merge_request_loader(gitlab_server):
+    docs = GitlabMergeRequestLoader(get_gitlab_context()).load()
+    assert [doc.metadata["file_path"] for doc in docs] == [
+        diff["new_path"] for diff in gitlab_server.diffs
+    ]
+    assert all(doc.metadata["diff_status"] == "modify" for doc in docs)
+
+
+def test_async_loader_yields_the_same_documents(gitlab_server):
+    async def _load():
+        loader = GitlabMergeRequestLoader(get_gitlab_context())
+        return [doc async for doc in loader.alazy_load()]
+
+    sync_docs = GitlabMergeRequestLoader(get_gitlab_context()).load()
+    async_docs = asyncio.run(_load())
+    assert [doc.page_content for doc in async_docs] == [
+        doc.page_content for doc in sync_docs
+    ]
+
+
+def test_merge_request_diffs_before_gitlab_15_7(gitlab_server):
+    gitlab_server.merge_request_diffs_api = False
+    for commits in [[COMMIT_SHA], [COMMIT_SHA, "1" * 40, "2" * 40]]:
+        gitlab_server.commits = commits
+        gitlab_server.comparisons.clear()
+        docs = GitlabMergeRequestLoader(get_gitlab_context()).load()
+        assert len(docs) == len(gitlab_server.diffs)
+        # From the base of the merge request, with the changes of every commit
+        assert gitlab_server.comparisons == [(BASE_SHA, COMMIT_SHA)]
+
+
+def test_async_merge_request_diffs_before_gitlab_15_7(gitlab_server):
+    async def _load():
+        loader = GitlabMergeRequestLoader(get_gitlab_context())
+        return [doc async for doc in loader.alazy_load()]
+
+    gitlab_server.merge_request_diffs_api = False
+    gitlab_server.commits = [COMMIT_SHA, "1" * 40]
+    assert len(asyncio.run(_load())) == len(gitlab_server.diffs)
+    assert gitlab_server.comparisons == [(BASE_SHA, COMMIT_SHA)]
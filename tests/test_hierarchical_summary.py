@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.document_transformers.hierarchical_summary import (
+    HierarchicalSummaryTransformer,
+)
+
+
+@pytest.fixture
+def make_summarized_docs(make_docs):
+    """Factory of summarized documents of a merge request."""
+
+    def _make_summarized_docs(*file_paths: str) -> list:
+        return make_docs(*file_paths, summary="s" * 40, title="Title", description=None)
+
+    return _make_summarized_docs
+
+
+def reduce_directory(doc: Document) -> str:
+    entries = doc.page_content.count("- ")
+    return f"summary of {doc.metadata['directory']} ({entries} entries)"
+
+
+def test_summaries_fitting_in_the_budget_are_joined(make_summarized_docs):
+    transformer = HierarchicalSummaryTransformer(
+        RunnableLambda(reduce_directory), token_budget=1000
+    )
+    (doc,) = transformer.transform_documents(make_summarized_docs("a/x.py", "y.py"))
+    assert "a/x.py" in doc.page_content and "y.py" in doc.page_content
+    assert doc.metadata["title"] == "Title"
+    assert doc.metadata["description"] == ""
+    assert doc.metadata["directory_summaries"] == {}
+
+
+def test_summaries_of_every_level_are_kept(make_summarized_docs):
+    docs = make_summarized_docs(
+        *(
+            f"{directory}/{name}.py"
+            for directory in ["a/b", "a/b/c", "a/b/d", "e"]
+            for name in ["x", "y"]
+        )
+    )
+    transformer = HierarchicalSummaryTransformer(
+        RunnableLambda(reduce_directory), token_budget=50
+    )
+    (doc,) = transformer.transform_documents(docs)
+    assert doc.metadata["directory_summaries"] == {
+        # Reduced with its files, then with its subdirectories
+        "a/b": "summary of a/b (2 entries)\nsummary of a/b (2 entries)",
+        "a/b/c": "summary of a/b/c (2 entries)",
+        "a/b/d": "summary of a/b/d (2 entries)",
+        "e": "summary of e (2 entries)",
+    }
+    assert doc.page_content == (
+        "- ディレクトリ: a\nsummary of a/b (2 entries)\n"
+        "- ディレクトリ: a/b\nsummary of a/b (2 entries)\n"
+        "- ディレクトリ: /\nsummary of e (2 entries)\n"
+    )
+
+
+def test_no_documents():
+    transformer = HierarchicalSummaryTransformer(RunnableLambda(reduce_directory))
+    body = {"title": "MR title", "description": None}
+    (doc,) = transformer.transform_documents([], body=body)
+    assert doc.page_content == ""
+    assert doc.metadata["title"] == "MR title"
+    assert doc.metadata["description"] == ""
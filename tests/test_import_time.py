@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import subprocess
+import sys
+
+# Modules the CLI must not import until a subcommand runs
+HEAVY_MODULES = ["langchain_core", "langchain_community", "gitlab", "httpx"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+started_at = time.perf_counter()
+import langchain_motex.cli
+elapsed = time.perf_counter() - started_at
+heavy = [m for m in {heavy_modules!r} if m in sys.modules]
+print(json.dumps({{"elapsed": elapsed, "heavy": heavy}}))
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cli_is_imported_quickly():
+    # A fresh interpreter, so that no module is imported by the other tests
+    output = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT.format(heavy_modules=HEAVY_MODULES)],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    result = json.loads(output)
+    assert result["heavy"] == []
+    assert result["elapsed"] < float(os.getenv("IMPORT_TIME_BUDGET", "0.5"))
+
+
+def test_help_runs():
+    subprocess.run(
+        [sys.executable, "-m", "langchain_motex.cli", "--help"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+    )
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.utils.chain_utils import ainvoke_chains, invoke_chains
+
+
+def invoke(doc: Document) -> dict:
+    if doc.metadata["file_path"] == "1.py":
+        raise ValueError("chain failed")
+    return {"output": doc.page_content}
+
+
+def on_finish(doc: Document) -> None:
+    if doc.metadata["file_path"] == "2.py":
+        raise RuntimeError("write-back failed")
+
+
+def test_errors_are_recorded_on_the_documents(make_docs):
+    docs = invoke_chains(
+        RunnableLambda(invoke),
+        make_docs("0.py", "1.py", "2.py", diff="x = 1"),
+        2,
+        on_finish=on_finish,
+    )
+    assert [doc.metadata.get("error") for doc in docs] == [
+        None,
+        "ValueError: chain failed",
+        "RuntimeError: write-back failed",
+    ]
+    assert docs[2].metadata["output"] == "x = 1"
+
+
+def test_async_errors_are_recorded_on_the_documents(make_docs):
+    async def _docs():
+        for doc in make_docs("0.py", "1.py", "2.py"):
+            yield doc
+
+    docs = asyncio.run(
+        ainvoke_chains(RunnableLambda(invoke), _docs(), 2, on_finish=on_finish)
+    )
+    assert [doc.metadata.get("error") for doc in docs] == [
+        None,
+        "ValueError: chain failed",
+        "RuntimeError: write-back failed",
+    ]
+
+
+def test_sync_callbacks_run_off_the_event_loop(make_docs):
+    threads = []
+
+    async def _run():
+        async def _docs():
+            for doc in make_docs("0.py", "1.py"):
+                yield doc
+
+        await ainvoke_chains(
+            RunnableLambda(lambda doc: {}),
+            _docs(),
+            on_finish=lambda doc: threads.append(threading.current_thread()),
+        )
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(_run())
+    assert len(threads) == 2
+    assert loop_thread not in threads
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+import time
+from types import SimpleNamespace
+
+from langchain_motex.utils.gitlab_utils import (
+    ProgressiveNote,
+    get_gitlab_context,
+    update_merge_request_summary,
+)
+
+
+def test_title_is_prefixed_with_the_classification(gitlab_server):
+    summary = "This feature fixes the tests.\n\n分類: fix"
+    update_merge_request_summary(get_gitlab_context(), summary, "- a.py")
+    merge_request = gitlab_server.merge_request
+    assert merge_request["title"] == "fix: Synthetic merge request"
+    assert summary in merge_request["description"]
+
+
+def test_title_is_unchanged_without_the_classification(gitlab_server):
+    summary = "This feature fixes the tests.\n\n分類はfixです。"
+    update_merge_request_summary(get_gitlab_context(), summary, "- a.py")
+    assert gitlab_server.merge_request["title"] == "Synthetic merge request"
+
+
+class FailingNote:
+    def __init__(self):
+        self.body = ""
+        self.saved = []
+        self.threads = []
+        self.failures = 1
+
+    def save(self):
+        self.threads.append(threading.current_thread())
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("GitLab is down")
+        self.saved.append(self.body)
+
+    def to_json(self):
+        return self.body
+
+
+def make_progressive_note(note: FailingNote, min_interval: float) -> ProgressiveNote:
+    notes = SimpleNamespace(create=lambda data: note)
+    context = SimpleNamespace(merge_request=SimpleNamespace(notes=notes))
+    return ProgressiveNote(context, "## Review\n\n", min_interval=min_interval)
+
+
+def wait_for(condition) -> None:
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_note_is_edited_off_the_calling_thread():
+    note = FailingNote()
+    progressive_note = make_progressive_note(note, min_interval=0)
+    progressive_note.update("a.py", "- a.py")
+    progressive_note.update("b.py", "- b.py")
+    # The failed edit is retried with the latest sections
+    wait_for(lambda: "## Review\n\n- a.py\n\n- b.py" in note.saved)
+    assert threading.current_thread() not in note.threads
+    assert progressive_note.finish("done") == "done"
+    assert note.saved[-1] == "done"
+
+
+def test_note_edits_are_throttled():
+    note = FailingNote()
+    note.failures = 0
+    progressive_note = make_progressive_note(note, min_interval=60)
+    progressive_note.update("a.py", "- a.py")
+    wait_for(lambda: note.saved)
+    for i in range(100):
+        progressive_note.update("b.py", f"- b.py {i}")
+    # The final body is written without waiting for the interval
+    started_at = time.monotonic()
+    progressive_note.finish("done")
+    assert time.monotonic() - started_at < 5
+    assert note.saved == ["## Review\n\n- a.py", "done"]
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.output_parsers import JsonKeysOutputParser, JsonObjectOutputParser
+
+
+def test_json_object_in_text():
+    parser = JsonObjectOutputParser()
+    assert parser.parse('{"a": 1}') == {"a": 1}
+    assert parser.parse('```json\n{"a": 1}\n```') == {"a": 1}
+    assert parser.parse('Here is the JSON: {"a": {"b": 2}} Done.') == {"a": {"b": 2}}
+    with pytest.raises(OutputParserException):
+        parser.parse("[1, 2]")
+    with pytest.raises(OutputParserException):
+        parser.parse("no JSON")
+
+
+def test_json_keys():
+    parser = JsonKeysOutputParser(keys=["summary", "review"])
+    output = parser.parse('{"summary": "s", "review": "r", "extra": 1}')
+    assert output == {"summary": "s", "review": "r"}
+    for text in ['{"summary": "s"}', '{"summary": "s", "review": ["r"]}']:
+        with pytest.raises(OutputParserException):
+            parser.parse(text)
+
+
+def test_combined_call_falls_back_to_two_calls():
+    parser = JsonKeysOutputParser(keys=["summary", "review"])
+    combined = RunnableLambda(lambda _: '{"summary": "s"}') | parser
+    separate = RunnableLambda(lambda _: {"summary": "S", "review": "R"})
+    chain = combined.with_fallbacks([separate])
+    assert chain.invoke("diff") == {"summary": "S", "review": "R"}
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+import pytest
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.utils.packing_utils import (
+    apack_documents,
+    is_packed_document,
+    pack_documents,
+    packed_chain,
+    unpack_documents,
+)
+
+
+@pytest.fixture
+def make_python_docs(make_docs):
+    """Factory of python documents of 10 tokens."""
+
+    def _make_python_docs(*file_paths: str) -> list:
+        return make_docs(*file_paths, diff="x" * 40, file_type="python")
+
+    return _make_python_docs
+
+
+@pytest.fixture
+def docs(make_doc, make_python_docs):
+    """5 small documents, and a large one."""
+    large = make_doc("large.py", "x" * 240, file_type="python")
+    return make_python_docs(*(f"{i}.py" for i in range(5))) + [large]
+
+
+def test_small_documents_are_packed_up_to_the_budget(docs, get_paths):
+    packed = list(pack_documents(docs, token_budget=40))
+    assert get_paths(packed) == ["0.py, 1.py, 2.py, 3.py", "large.py", "4.py"]
+    assert [is_packed_document(doc) for doc in packed] == [True, False, False]
+    assert "### ファイル: 0.py\n```python\n" in packed[0].page_content
+    assert get_paths(unpack_documents(packed)) == [
+        "0.py",
+        "1.py",
+        "2.py",
+        "3.py",
+        "large.py",
+        "4.py",
+    ]
+
+
+def test_async_packing_and_can_pack(docs, get_paths):
+    async def _docs():
+        for doc in docs:
+            yield doc
+
+    async def _pack():
+        return [
+            doc
+            async for doc in apack_documents(
+                _docs(), 40, can_pack=lambda doc: doc.metadata["file_path"] != "1.py"
+            )
+        ]
+
+    packed = asyncio.run(_pack())
+    assert get_paths(packed) == ["1.py", "large.py", "0.py, 2.py, 3.py, 4.py"]
+
+
+def test_packed_chain_falls_back_for_missing_files(make_python_docs):
+    def _pack(doc):
+        return {"files": [{"file_path": "0.py", "summary": "s0", "review": "r0"}]}
+
+    def _chain(doc):
+        if doc.metadata["file_path"] == "2.py":
+            raise ValueError("failed")
+        return {"summary": "S", "review": "R"}
+
+    packed = next(pack_documents(make_python_docs("0.py", "1.py", "2.py"), 40))
+    chain = packed_chain(RunnableLambda(_pack), RunnableLambda(_chain))
+    chain.invoke(packed)
+    docs = unpack_documents([packed])
+    assert [doc.metadata.get("summary") for doc in docs] == ["s0", "S", None]
+    assert docs[2].metadata["error"] == "ValueError: failed"
+
+
+def test_packed_chain_with_an_invalid_response(make_python_docs):
+    def _pack(doc):
+        raise OutputParserException("not JSON")
+
+    packed = next(pack_documents(make_python_docs("0.py", "1.py"), 40))
+    chain = packed_chain(
+        RunnableLambda(_pack), RunnableLambda(lambda doc: {"summary": "S"})
+    )
+    asyncio.run(chain.ainvoke(packed))
+    docs = unpack_documents([packed])
+    assert [doc.metadata["summary"] for doc in docs] == ["S", "S"]
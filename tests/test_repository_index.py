@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from benchmarks.fake_ollama import FakeOllamaServer
+from langchain_motex.cli import review
+from langchain_motex.indexes.repository_index import (
+    RepositoryIndex,
+    format_repository_context,
+    get_diff_query,
+)
+
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    model: str = "fake"
+    texts: int = 0
+
+    def embed_documents(self, texts):
+        self.texts += len(texts)
+        return super().embed_documents(texts)
+
+
+def test_only_changed_blobs_are_embedded(git_repo, tmp_path_factory):
+    repo_path, base_sha, head_sha = git_repo
+    index_path = str(tmp_path_factory.mktemp("index"))
+    embeddings = CountingEmbeddings(size=8)
+    index = RepositoryIndex(index_path, embeddings)
+    assert index.update(repo_path, base_sha) == {"added": 3, "removed": 0}
+    assert embeddings.texts == 3
+    # old.py is renamed as is, so only app.py and added.py are new blobs
+    assert index.update(repo_path, head_sha) == {"added": 2, "removed": 2}
+    assert embeddings.texts == 5
+    assert index.update(repo_path, head_sha) == {"added": 0, "removed": 0}
+
+    # The index is reused by the next run
+    reloaded = RepositoryIndex(index_path, embeddings)
+    assert reloaded.blobs == index.blobs
+    assert reloaded.update(repo_path, head_sha) == {"added": 0, "removed": 0}
+    assert embeddings.texts == 5
+    paths = {
+        doc.metadata["file_path"]
+        for doc in reloaded.search("x5 = 10", k=3, exclude_path="app.py")
+    }
+    assert paths == {"added.py", "new.py"}
+
+
+def test_index_of_another_model_is_not_loaded(git_repo, tmp_path_factory):
+    repo_path, base_sha, _ = git_repo
+    index_path = str(tmp_path_factory.mktemp("index"))
+    RepositoryIndex(index_path, CountingEmbeddings(size=8)).update(repo_path, base_sha)
+    other = RepositoryIndex(index_path, CountingEmbeddings(size=8, model="other"))
+    assert other.blobs == {}
+    assert other.search("x5") == []
+    # Nor is the index of another project
+    other = RepositoryIndex(index_path, CountingEmbeddings(size=8), project="2")
+    assert other.blobs == {}
+
+
+def test_review_goes_on_without_the_index(gitlab_server, tmp_path, monkeypatch):
+    # The working directory is not a repository, so the index is not built
+    monkeypatch.chdir(tmp_path)
+    ollama_server = FakeOllamaServer(token_latency=0, response_tokens=5).start()
+    monkeypatch.setenv("OLLAMA_URL", ollama_server.url)
+    monkeypatch.setenv("CODEREV_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("CODEREV_CONTEXT_K", "2")
+    try:
+        review(False, log_dir=str(tmp_path / "logs"))
+    finally:
+        ollama_server.stop()
+    assert ollama_server.embedding_calls == 0
+    assert "## コードレビュー" in gitlab_server.notes[-1]["body"]
+
+
+def test_diff_query_and_context():
+    diff = "--- a/app.py\n+++ b/app.py\n@@ -1,2 +1,2 @@\n x = 1\n-y = 2\n+y = 3\n"
+    assert get_diff_query(diff) == "x = 1\ny = 3"
+    assert format_repository_context([]) == "なし"
+    doc = Document(page_content="z = 1", metadata={"file_path": "z.py"})
+    assert format_repository_context([doc]) == "### z.py\n```\nz = 1\n```\n"
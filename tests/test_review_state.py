@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import base64
+import zlib
+
+import pytest
+
+from benchmarks.fake_gitlab import COMMIT_SHA
+from benchmarks.fake_ollama import FakeOllamaServer
+from langchain_motex.cli import review
+from langchain_motex.utils.gitlab_utils import (
+    REVIEW_STATE_MARKER,
+    dump_review_state,
+    get_review_state_merge_request,
+    load_review_state,
+    merge_review_state,
+)
+
+
+@pytest.fixture
+def make_reviewed_doc(make_doc):
+    """Factory of documents with a summary and a review."""
+
+    def _make_reviewed_doc(file_path: str, **metadata):
+        metadata = {
+            "summary": f"summary of {file_path}",
+            "review": f"review of {file_path}",
+        } | metadata
+        return make_doc(file_path, **metadata)
+
+    return _make_reviewed_doc
+
+
+def test_round_trip(make_reviewed_doc):
+    comment = "## Review\n\n" + dump_review_state("abc", [make_reviewed_doc("a.py")])
+    state = load_review_state(comment)
+    assert state["sha"] == "abc"
+    assert state["files"] == [
+        {
+            "file_path": "a.py",
+            "diff_status": "modify",
+            "summary": "summary of a.py",
+            "review": "review of a.py",
+        }
+    ]
+
+
+def test_failed_files_are_not_saved(make_reviewed_doc):
+    docs = [
+        make_reviewed_doc("a.py"),
+        make_reviewed_doc("b.py", error="TimeoutError: timed out"),
+    ]
+    state = load_review_state(dump_review_state("abc", docs))
+    assert [file["file_path"] for file in state["files"]] == ["a.py"]
+
+
+def test_malformed_markers_are_ignored():
+    not_zlib = base64.b64encode(b"not compressed").decode()
+    not_state = base64.b64encode(zlib.compress(b"[1, 2]")).decode()
+    for payload in ["abc", not_zlib, not_state]:
+        assert load_review_state(f"<!-- {REVIEW_STATE_MARKER} {payload} -->") is None
+    assert load_review_state("no marker") is None
+
+
+def test_only_notes_of_the_reviewer_are_trusted(make_reviewed_doc, make_context):
+    fake = dump_review_state("fake", [make_reviewed_doc("a.py")])
+    real = dump_review_state("real", [make_reviewed_doc("a.py")])
+    broken = f"<!-- {REVIEW_STATE_MARKER} abc -->"
+    context = make_context(
+        [
+            {"body": fake, "author": {"id": 2}},
+            {"body": broken, "author": {"id": 1}},
+            {"body": real, "author": {"id": 1}},
+        ]
+    )
+    assert get_review_state_merge_request(context)["sha"] == "real"
+    assert get_review_state_merge_request(make_context([], user_id=1)) is None
+
+
+def test_merge_carries_over_unchanged_files(make_reviewed_doc, get_paths):
+    state = load_review_state(
+        dump_review_state("abc", [make_reviewed_doc("a.py"), make_reviewed_doc("b.py")])
+    )
+    reviewed = make_reviewed_doc("b.py", summary="new summary", title="T")
+    docs = merge_review_state(state, [reviewed, make_reviewed_doc("c.py")])
+    assert get_paths(docs) == ["a.py", "b.py", "c.py"]
+    assert docs[0].metadata["carried_over"]
+    assert docs[0].metadata["review"] == "review of a.py"
+    assert docs[1] is reviewed
+
+
+def test_incremental_run_after_a_full_run(gitlab_server, tmp_path, monkeypatch):
+    ollama_server = FakeOllamaServer(token_latency=0, response_tokens=5).start()
+    monkeypatch.setenv("OLLAMA_URL", ollama_server.url)
+    monkeypatch.setenv("CODEREV_CACHE_DIR", "")
+    try:
+        review(False, log_dir=str(tmp_path / "full"))
+        # Only the diff of the commit is reviewed, so no state is left
+        assert REVIEW_STATE_MARKER not in gitlab_server.notes[-1]["body"]
+        monkeypatch.setenv("CODEREV_INCREMENTAL", "true")
+        review(False, log_dir=str(tmp_path / "incremental"))
+    finally:
+        ollama_server.stop()
+    state = load_review_state(gitlab_server.notes[-1]["body"])
+    assert state["sha"] == COMMIT_SHA
+    assert len(state["files"]) == 5
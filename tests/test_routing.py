@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from langchain_core.language_models import FakeListLLM
+from langchain_core.runnables import ConfigurableField
+
+from langchain_motex.utils.routing_utils import (
+    ModelRouter,
+    get_complexity,
+    get_route_features,
+    routing_chain,
+)
+
+
+def make_diff(lines: list) -> str:
+    return "@@ -1,1 +1,1 @@\n" + "".join(line + "\n" for line in lines)
+
+
+def test_features(make_doc):
+    doc = make_doc("app.py", make_diff(["-x = 1", "+if x:", "+    return y"]))
+    features = get_route_features(doc)
+    assert features["category"] == "source"
+    assert features["control_flow"]
+    assert not features["literal_only"]
+    assert features["hunks"] == 0
+
+
+def test_literal_and_config_changes_are_simple(make_doc):
+    constants = make_doc(
+        "app.py", make_diff(['-NAME = "a"', '+NAME = "b"', "+# comment"])
+    )
+    assert get_route_features(constants)["literal_only"]
+    assert get_complexity(get_route_features(constants)) == 0.0
+    config = make_doc("config.yaml", make_diff(["-if: 1", "+if: 2"]))
+    assert get_complexity(get_route_features(config)) == 0.0
+
+
+def test_router_chooses_the_model_by_complexity(make_doc):
+    router = ModelRouter(threshold=1.0)
+    simple = make_doc("app.py", make_diff(["-x = 1", "+x = 2"]))
+    branch = make_doc("app.py", make_diff(["-x = 1", "+if x:", "+    return y"]))
+    assert router.select(simple) == "fast"
+    assert router.select(branch) == "strong"
+    assert router.counts() == {"fast": 1, "strong": 1}
+    assert [decision["model"] for decision in router.decisions] == ["fast", "strong"]
+    assert router.decisions[1]["complexity"] > 1.0
+
+
+def test_routing_chain_configures_the_model(make_doc):
+    llm = FakeListLLM(responses=["fast"]).configurable_alternatives(
+        ConfigurableField(id="llm_code"),
+        default_key="fast",
+        strong=FakeListLLM(responses=["strong"]),
+    )
+    chain = routing_chain(
+        (lambda doc: doc.page_content) | llm, ModelRouter(threshold=1.0), ["llm_code"]
+    )
+    assert chain.invoke(make_doc("app.py", make_diff(["-x = 1", "+x = 2"]))) == "fast"
+    assert (
+        chain.invoke(make_doc("app.py", make_diff(["+if x:", "+    return y"])))
+        == "strong"
+    )
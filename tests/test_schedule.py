@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import asyncio
+import threading
+
+import pytest
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.utils.schedule_utils import (
+    Deadline,
+    aschedule_documents,
+    deadline_chain,
+    get_category,
+    schedule_documents,
+)
+
+
+@pytest.fixture
+def docs(make_doc):
+    """Documents of each category, with their changed lines and tokens."""
+    return [
+        make_doc(file_path, "x" * (4 * tokens), add_count=changed_lines)
+        for file_path, changed_lines, tokens in [
+            ("README.md", 100, 10),
+            ("tests/test_app.py", 100, 10),
+            ("src/small.py", 1, 10),
+            ("src/large.py", 100, 10),
+            ("src/short.py", 1, 1),
+            ("setup.cfg", 100, 10),
+        ]
+    ]
+
+
+def test_categories(docs):
+    assert [get_category(doc) for doc in docs] == [
+        "document",
+        "test",
+        "source",
+        "source",
+        "source",
+        "config",
+    ]
+
+
+def test_documents_are_sorted_within_the_window(docs, get_paths):
+    assert get_paths(schedule_documents(docs)) == [
+        "src/large.py",
+        "setup.cfg",
+        "tests/test_app.py",
+        "src/small.py",
+        "src/short.py",
+        "README.md",
+    ]
+    # Only 2 documents are buffered before the first one is yielded
+    assert get_paths(schedule_documents(docs, window=2)) == [
+        "tests/test_app.py",
+        "src/large.py",
+        "src/small.py",
+        "setup.cfg",
+        "src/short.py",
+        "README.md",
+    ]
+
+
+def test_async_scheduling_is_the_same(docs, get_paths):
+    async def _schedule(window):
+        async def _docs():
+            for doc in docs:
+                yield doc
+
+        return [doc async for doc in aschedule_documents(_docs(), window)]
+
+    for window in [1, 2, 32]:
+        assert get_paths(asyncio.run(_schedule(window))) == get_paths(
+            schedule_documents(docs, window)
+        )
+
+
+def test_scheduling_is_lazy(docs):
+    fetched = []
+
+    def _docs():
+        for doc in docs:
+            fetched.append(doc)
+            yield doc
+
+    scheduled = schedule_documents(_docs(), window=2)
+    next(scheduled)
+    assert len(fetched) == 3
+
+
+def test_deadline_skips_the_chain(make_doc):
+    chain = RunnableLambda(lambda doc: {"review": "ok"})
+    doc = make_doc("src/app.py", "@@ -1 +1 @@\n-x = 1\n+x = 2\n")
+    assert deadline_chain(chain, Deadline(100, reserve=10)).invoke(doc) == {
+        "review": "ok"
+    }
+    assert deadline_chain(chain, Deadline(100, reserve=100)).invoke(doc) == {
+        "skipped": True
+    }
+    cancel_event = threading.Event()
+    deadline = Deadline(100, reserve=0, cancel_event=cancel_event)
+    cancel_event.set()
+    assert asyncio.run(deadline_chain(chain, deadline).ainvoke(doc)) == {
+        "skipped": True
+    }
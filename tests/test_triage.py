@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from langchain_core.documents import Document
+from langchain_core.runnables import RunnableLambda
+
+from langchain_motex.utils.gitlab_utils import get_diff
+from langchain_motex.utils.triage_utils import (
+    DEFAULT_TRIAGE_RULES,
+    is_whitespace_only_diff,
+    match_triage_rule,
+    triage_chain,
+)
+
+HEADER = "--- a/app.py\n+++ b/app.py\n"
+
+
+@pytest.fixture
+def make_diff_doc(make_doc):
+    """Factory of documents of app.py, changing a line by default."""
+
+    def _make_diff_doc(
+        diff: str = "@@ -1 +1 @@\n-a = 1\n+a = 2\n",
+        file_path: str = "app.py",
+        **metadata
+    ) -> Document:
+        return make_doc(file_path, HEADER + diff, **metadata)
+
+    return _make_diff_doc
+
+
+def get_rule_name(doc: Document):
+    rule = match_triage_rule(doc, DEFAULT_TRIAGE_RULES)
+    return rule["name"] if rule is not None else None
+
+
+def test_default_rules(make_diff_doc):
+    assert get_rule_name(make_diff_doc()) is None
+    assert get_rule_name(make_diff_doc(diff_status="delete")) == "deleted"
+    assert get_rule_name(make_diff_doc("", diff_status="rename")) == "renamed"
+    assert get_rule_name(make_diff_doc(diff_status="rename")) is None
+    assert get_rule_name(make_diff_doc("", binary=True)) == "binary"
+    assert get_rule_name(make_diff_doc("", too_large=True)) == "too_large"
+    assert get_rule_name(make_diff_doc("", mode_changed=True)) == "mode_changed"
+    assert get_rule_name(make_diff_doc("")) == "empty"
+    # A changed mode with changed lines is reviewed
+    assert get_rule_name(make_diff_doc(mode_changed=True)) is None
+    assert (
+        get_rule_name(make_diff_doc(file_path="web/package-lock.json")) == "generated"
+    )
+    assert get_rule_name(make_diff_doc(file_path="vendor/lib/a.go")) == "generated"
+
+
+def test_whitespace_only_changes(make_diff_doc):
+    trailing = "@@ -1,2 +1,2 @@\n-a = 1  \n+a = 1\n b = 2\n"
+    blank_line = "@@ -1,2 +1,3 @@\n a = 1\n+\n b = 2\n"
+    for diff in [trailing, blank_line]:
+        assert is_whitespace_only_diff(HEADER + diff)
+        assert get_rule_name(make_diff_doc(diff)) == "whitespace"
+
+
+def test_significant_whitespace_is_reviewed(make_diff_doc):
+    indent = (
+        "@@ -1,2 +1,3 @@\n"
+        "+if enabled:\n"
+        "-do_this()\n"
+        "-do_that()\n"
+        "+    do_this()\n"
+        "+    do_that()\n"
+    )
+    reindent = "@@ -1 +1 @@\n-    do_this()\n+do_this()\n"
+    joined = "@@ -1 +1 @@\n-    return x\n+    returnx\n"
+    # The spaces within a string literal are a change
+    spaces = '@@ -1 +1 @@\n-a = "x  y"\n+a = "x y"\n'
+    for diff in [indent, reindent, joined, spaces]:
+        assert not is_whitespace_only_diff(HEADER + diff)
+        assert get_rule_name(make_diff_doc(diff)) is None
+
+
+def test_triage_chain_skips_the_llm(make_diff_doc):
+    calls = []
+    chain = triage_chain(
+        RunnableLambda(lambda doc: calls.append(doc) or {"review": "LLM"}),
+        DEFAULT_TRIAGE_RULES,
+    )
+    output = chain.invoke(make_diff_doc(diff_status="delete"))
+    assert output["triage"] == "deleted"
+    assert calls == []
+    assert chain.invoke(make_diff_doc()) == {"review": "LLM"}
+    assert len(calls) == 1
+
+
+def test_flags_of_the_gitlab_diffs():
+    def _get_flags(diff: str, **fields) -> dict:
+        diff = get_diff(
+            {"old_path": "a.bin", "new_path": "a.bin", "diff": diff} | fields
+        )
+        return {flag: diff[flag] for flag in ("binary", "too_large", "mode_changed")}
+
+    binary = "Binary files a/a.bin and b/a.bin differ\n"
+    assert _get_flags(binary, a_mode="100644", b_mode="100644") == {
+        "binary": True,
+        "too_large": False,
+        "mode_changed": False,
+    }
+    assert _get_flags("", too_large=True)["too_large"]
+    assert _get_flags("", collapsed=True)["too_large"]
+    assert _get_flags("", a_mode="100644", b_mode="100755")["mode_changed"]
+    # The mode of an added file is not a change of mode
+    assert not _get_flags("", a_mode="0", b_mode="100644")["mode_changed"]
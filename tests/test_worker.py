@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import http.client
+import json
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from benchmarks.fake_gitlab import COMMIT_SHA, PROJECT_ID
+from langchain_motex.worker import (
+    NULL_SHA,
+    JobQueue,
+    ReviewWorker,
+    get_webhook_handler,
+    parse_webhook,
+    serve,
+)
+
+
+def make_job(project_id: int, key: str, **job) -> dict:
+    return {
+        "kind": "commit",
+        "project_id": project_id,
+        "merge_request_iid": None,
+        "commit_sha": COMMIT_SHA,
+        "key": f"{project_id}:{key}",
+    } | job
+
+
+def make_mr_hook(action: str, **attributes) -> dict:
+    return {
+        "object_attributes": {
+            "action": action,
+            "target_project_id": 1,
+            "iid": 2,
+            "last_commit": {"id": "abc"},
+        }
+        | attributes
+    }
+
+
+def test_webhooks():
+    job = parse_webhook("Merge Request Hook", make_mr_hook("open"))
+    assert job == {
+        "kind": "mr",
+        "project_id": 1,
+        "merge_request_iid": 2,
+        "commit_sha": "abc",
+        "key": "1:mr:2",
+    }
+    assert parse_webhook("Merge Request Hook", make_mr_hook("merge"))["cancel"]
+    # An edit of the description has no new commit
+    assert parse_webhook("Merge Request Hook", make_mr_hook("update")) is None
+    assert parse_webhook("Merge Request Hook", make_mr_hook("update", oldrev="a"))
+    push = {"project_id": 1, "ref": "refs/heads/main", "after": "abc"}
+    assert parse_webhook("Push Hook", push)["key"] == "1:push:refs/heads/main"
+    assert parse_webhook("Push Hook", push | {"after": NULL_SHA})["cancel"]
+    assert parse_webhook("Push Hook", push | {"ref": "refs/tags/v1"}) is None
+    assert parse_webhook("Note Hook", {}) is None
+
+
+def test_newer_jobs_supersede_the_pending_ones(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    old_id = queue.enqueue(make_job(1, "a", commit_sha="old"))
+    new_id = queue.enqueue(make_job(1, "a", commit_sha="new"))
+    assert queue.enqueue(make_job(2, "b", cancel=True)) is None
+    statuses = {job["id"]: job["status"] for job in queue.list_jobs()}
+    assert statuses == {old_id: "superseded", new_id: "pending"}
+    assert queue.take({}, 1)["commit_sha"] == "new"
+    # A cancel supersedes the pending jobs without a new one
+    queue.enqueue(make_job(1, "c"))
+    assert queue.enqueue(make_job(1, "c", cancel=True)) is None
+    assert queue.take({}, 1) is None
+
+
+def test_projects_take_turns(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.db"))
+    for i in range(3):
+        queue.enqueue(make_job(1, f"busy{i}"))
+    queue.enqueue(make_job(2, "quiet"))
+    running = {}
+    taken = []
+    for _ in range(3):
+        job = queue.take(running, max_project_jobs=2)
+        running[job["project_id"]] = running.get(job["project_id"], 0) + 1
+        taken.append(job["key"])
+    # The quiet project is not held back by the busy one
+    assert taken == ["1:busy0", "2:quiet", "1:busy1"]
+    assert queue.take(running, max_project_jobs=2) is None
+
+
+def test_running_jobs_are_queued_again_after_a_restart(tmp_path):
+    database_path = str(tmp_path / "jobs.db")
+    queue = JobQueue(database_path)
+    job_id = queue.enqueue(make_job(1, "a"))
+    assert queue.take({}, 1)["id"] == job_id
+    assert JobQueue(database_path).take({}, 1)["id"] == job_id
+
+
+def test_commit_without_a_merge_request_is_skipped(
+    gitlab_server, tmp_path, monkeypatch
+):
+    monkeypatch.delenv("CI_MERGE_REQUEST_IID")
+    gitlab_server.merge_request["state"] = "merged"
+    worker = ReviewWorker(
+        JobQueue(str(tmp_path / "jobs.db")), log_dir=str(tmp_path / "logs")
+    )
+    job = make_job(PROJECT_ID, "push", id=1)
+    assert worker._process(job, threading.Event()) == "skipped"
+
+
+def post_webhook(server, body: bytes, headers: dict):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=5)
+    connection.putrequest("POST", "/webhook")
+    for key, value in headers.items():
+        connection.putheader(key, value)
+    connection.endheaders(body)
+    response = connection.getresponse()
+    status = response.status, json.loads(response.read())
+    connection.close()
+    return status
+
+
+def test_webhook_requests_are_checked(tmp_path):
+    worker = ReviewWorker(JobQueue(str(tmp_path / "jobs.db")))
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", 0), get_webhook_handler(worker, "secret")
+    )
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        body = json.dumps(make_mr_hook("open")).encode("utf_8")
+        headers = {
+            "X-Gitlab-Token": "secret",
+            "X-Gitlab-Event": "Merge Request Hook",
+            "Content-Length": str(len(body)),
+        }
+        status, _ = post_webhook(server, body, headers | {"X-Gitlab-Token": "bad"})
+        assert status == 401
+        status, response = post_webhook(
+            server, body, headers | {"Content-Length": "abc"}
+        )
+        assert status == 400
+        assert response["error"].startswith("ValueError")
+        status, response = post_webhook(server, body, headers)
+        assert (status, response["status"]) == (202, "queued")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_worker_does_not_start_without_a_token(monkeypatch):
+    monkeypatch.delenv("CODEREV_WEBHOOK_TOKEN", raising=False)
+    with pytest.raises(ValueError, match="--insecure"):
+        serve()